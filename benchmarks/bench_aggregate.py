@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+Benchmark reading a whole deployment from the per-segment merged files in qc_queue (open every file and
+concatenate) compared with the deployment timeseries file built by ruglider_processing.aggregate (one open).
+Also times building the timeseries file from scratch, appending one more segment to it and re-merging a
+segment in the middle of it (same number of rows, written over its own slice).
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import xarray as xr
+from ruglider_processing.aggregate import update_store
+from ruglider_processing.ncwrite import build_dataset_encoding
+
+
+def make_segment(outdir, i, rows, nvars):
+    # synthetic merged segment file, one hour per segment
+    t0 = 1.7e9 + i * 3600
+    t = (t0 + np.arange(rows) * 3600 / rows).astype('datetime64[ms]')
+    ds = xr.Dataset({f'var{v:02d}': ('time', np.random.default_rng(i + v).normal(size=rows)) for v in range(nvars)},
+                    coords={'time': t})
+    filepath = os.path.join(outdir, f'seg{i:05d}_stbd.nc')
+    ds.to_netcdf(filepath, encoding=build_dataset_encoding(ds))
+
+    return filepath
+
+
+def main(args):
+    workdir = tempfile.mkdtemp()
+    try:
+        manifest = dict(segments=dict())
+        for i in range(args.segments):
+            manifest['segments'][f'seg{i:05d}'] = dict(output=make_segment(workdir, i, args.rows, args.nvars),
+                                                       merged='2025-01-01T00:00:00Z')
+        files = sorted(entry['output'] for entry in manifest['segments'].values())
+        store = os.path.join(workdir, 'deployment-rt-timeseries.nc')
+
+        t = time.perf_counter()
+        update_store(store, manifest, 'deployment')
+        t_build = time.perf_counter() - t
+
+        manifest['segments']['next'] = dict(output=make_segment(workdir, args.segments, args.rows, args.nvars),
+                                            merged='2025-01-01T00:00:00Z')
+        t = time.perf_counter()
+        update_store(store, manifest, 'deployment')
+        t_append = time.perf_counter() - t
+
+        remerged = f'seg{args.segments // 2:05d}'
+        manifest['segments'][remerged]['merged'] = '2025-01-02T00:00:00Z'
+        t = time.perf_counter()
+        update_store(store, manifest, 'deployment')
+        t_remerge = time.perf_counter() - t
+
+        t = time.perf_counter()
+        datasets = [xr.open_dataset(f) for f in files]
+        merged = xr.concat([ds.load() for ds in datasets], dim='time')
+        for ds in datasets:
+            ds.close()
+        t_files = time.perf_counter() - t
+
+        t = time.perf_counter()
+        with xr.open_dataset(store) as ds:
+            aggregated = ds.drop_dims('segment').load()
+        t_store = time.perf_counter() - t
+
+        nrows = merged.sizes['time']
+        assert np.array_equal(aggregated['var00'].values[:nrows], merged['var00'].values)
+
+        print(f'{args.segments} segments x {args.rows} rows x {args.nvars} variables')
+        print(f'{"build timeseries file":<36}{t_build:>10.3f} s')
+        print(f'{"append one segment":<36}{t_append:>10.3f} s')
+        print(f'{"re-merge one segment":<36}{t_remerge:>10.3f} s')
+        print(f'{"read: open every segment file":<36}{t_files:>10.3f} s')
+        print(f'{"read: timeseries file":<36}{t_store:>10.3f} s  ({t_files / t_store:.1f}x)')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-s', '--segments',
+                            help='Number of merged segment files',
+                            type=int,
+                            default=500)
+
+    arg_parser.add_argument('-r', '--rows',
+                            help='Rows per segment',
+                            type=int,
+                            default=2000)
+
+    arg_parser.add_argument('-n', '--nvars',
+                            help='Number of variables',
+                            type=int,
+                            default=20)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""
+Benchmark ruglider_processing.common.convert_epoch_ts (vectorized for seconds since 1970-01-01) compared with
+converting every timestamp with netCDF4.num2date and pd.to_datetime, and check that the results are identical.
+"""
+
+import argparse
+import sys
+import time
+import numpy as np
+import pandas as pd
+import xarray as xr
+from netCDF4 import num2date
+from ruglider_processing.common import convert_epoch_ts, EPOCH_UNITS
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    print(f'{"timestamps":>12}{"num2date":>14}{"vectorized":>14}{"speedup":>10}')
+    for n in args.sizes:
+        # glider times: about a year of seconds with sub-second resolution and some missing values
+        values = 1.7e9 + np.sort(rng.uniform(0, 3.2e7, n))
+        values[rng.integers(0, n, n // 1000)] = np.nan
+        data = xr.DataArray(values, dims='time', attrs=dict(units=EPOCH_UNITS))
+
+        t = time.perf_counter()
+        expected = pd.to_datetime(num2date(data.values, data.units, only_use_cftime_datetimes=False))
+        t_num2date = time.perf_counter() - t
+
+        t = time.perf_counter()
+        result = convert_epoch_ts(data)
+        t_vectorized = time.perf_counter() - t
+
+        assert result.equals(expected) and result.dtype == expected.dtype
+
+        print(f'{n:>12}{t_num2date:>12.3f} s{t_vectorized:>12.3f} s{t_num2date / t_vectorized:>9.0f}x')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-n', '--sizes',
+                            help='Numbers of timestamps',
+                            type=int,
+                            nargs='+',
+                            default=[1000000, 10000000])
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
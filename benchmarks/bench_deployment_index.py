@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""
+Benchmark finding the deployments with queued files: looking up every deployment with
+find_glider_deployment_location and listing its queue directories, compared with building the cached deployments
+index from scratch and updating an unchanged index. Builds a synthetic deployments root in a temporary directory
+unless one is given.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import ruglider_processing.paths as paths
+from ruglider_processing.deployindex import update_index, active_deployments, index_path, queued_files, \
+    MTIME_SETTLE_SECONDS
+
+
+def build_tree(root, n, active_every):
+    # n deployments spread over years, every active_every-th one with queued rt files
+    for i in range(n):
+        year = 2015 + i % 10
+        deployment = f'ru{i:03d}-{year}0101T{i % 24:02d}00'
+        location = os.path.join(root, str(year), deployment)
+        for d in ['binary/queue', 'rawnc/queue', 'rawnc/stbd', 'rawnc/debd']:
+            os.makedirs(os.path.join(location, 'data', 'in', d))
+        if i % active_every == 0:
+            for s in ['sbd', 'tbd']:
+                open(os.path.join(location, 'data', 'in', 'binary', 'queue', f'ru{i:03d}-{year}-001-0-0.{s}'), 'w').close()
+
+    # let the directory mtimes settle so they can be cached
+    time.sleep(MTIME_SETTLE_SECONDS)
+
+
+def scan_each(logger, deployments_root, mode):
+    # the lookup every deployment needs without the index
+    active = []
+    for deployment in paths.find_deployments(deployments_root):
+        location = paths.find_glider_deployment_location(logger, deployment, deployments_root)
+        queued = sum(queued_files(os.path.join(location, 'data', 'in', q, 'queue'))[mode] for q in ['binary', 'rawnc'])
+        if queued > 0:
+            active.append(deployment)
+
+    return active
+
+
+def main(args):
+    logger = logging.getLogger('bench')
+    logger.disabled = True
+    tmpdir = None
+    deployments_root = args.deployments_root
+    if deployments_root is None:
+        tmpdir = tempfile.mkdtemp(prefix='bench_deployment_index-')
+        deployments_root = tmpdir
+        build_tree(deployments_root, args.deployments, args.active_every)
+
+    try:
+        if os.path.isfile(index_path(deployments_root)):
+            os.remove(index_path(deployments_root))
+
+        t = time.perf_counter()
+        expected = scan_each(logger, deployments_root, 'rt')
+        t_scan = time.perf_counter() - t
+
+        t = time.perf_counter()
+        active = active_deployments(update_index(logger, deployments_root), 'rt')
+        t_cold = time.perf_counter() - t
+        assert active == expected
+
+        t = time.perf_counter()
+        active = active_deployments(update_index(logger, deployments_root), 'rt')
+        t_warm = time.perf_counter() - t
+        assert active == expected
+
+        print(f'{len(active)} active deployments found')
+        print(f'{"per-deployment lookup":<24}{t_scan:>10.3f} s')
+        print(f'{"index (cold)":<24}{t_cold:>10.3f} s')
+        print(f'{"index (unchanged)":<24}{t_warm:>10.3f} s')
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-r', '--deployments_root',
+                            help='Existing deployments root to index (its index file is rebuilt)',
+                            type=str,
+                            default=None)
+
+    arg_parser.add_argument('-n', '--deployments',
+                            help='Number of synthetic deployments',
+                            type=int,
+                            default=500)
+
+    arg_parser.add_argument('--active_every',
+                            help='Every Nth synthetic deployment has queued files',
+                            type=int,
+                            default=20)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the directory scans and segment lookups in the rt staging/pairing step of convert_binary_to_raw_nc.py
+Compares the original repeated os.listdir scans with the scanned-once ruglider_processing.dirindex
+index and segment-keyed pairing on a synthetic deployment tree (rawnc/stbd with --files raw netcdf files and a rawnc/queue
+holding the newest --queued segments, sbd halves only).
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from ruglider_processing.dirindex import index_directory, files_with_suffix, count_suffix, pair_segments
+
+
+def make_tree(root, nfiles, nqueued):
+    rawncdir = os.path.join(root, 'stbd')
+    queuedir = os.path.join(root, 'queue')
+    os.makedirs(rawncdir)
+    os.makedirs(queuedir)
+    segments = [f'ru44-2025-{day:03d}-{mission}-{seg}' for day in range(1, 366) for mission in range(10)
+                for seg in range(20)][:nfiles // 2]
+    for seg in segments:
+        for suffix in ['sbd.nc', 'tbd.nc']:
+            open(os.path.join(rawncdir, f'{seg}.{suffix}'), 'w').close()
+    for seg in segments[-nqueued:]:
+        open(os.path.join(queuedir, f'{seg}.sbd.nc'), 'w').close()
+
+    return rawncdir, queuedir
+
+
+def listdir_pairing(rawncdir, queuedir):
+    # original implementation
+    pairs = []
+    oscicount = len([f for f in os.listdir(queuedir) if f.endswith('.tbd.nc')])
+    if oscicount == 0:
+        oscicount = len([f for f in os.listdir(queuedir) if f.endswith('.TBD.nc')])
+    oflightcount = len([f for f in os.listdir(queuedir) if f.endswith('.sbd.nc')])
+    for f in os.listdir(queuedir):
+        seg = f.split('.')[0]
+        rawncmatch = [filename for filename in os.listdir(rawncdir) if seg in filename and filename.endswith('.nc')]
+        queued_files = set(os.listdir(queuedir))
+        for rnm in rawncmatch:
+            if rnm not in queued_files:
+                pairs.append(rnm)
+    return oscicount, oflightcount, sorted(pairs)
+
+
+def index_pairing(rawncdir, queuedir):
+    out_index = index_directory(queuedir)
+    rawnc_index = index_directory(rawncdir)
+    oscicount = count_suffix(out_index, 'tbd.nc')
+    oflightcount = count_suffix(out_index, 'sbd.nc')
+    pairs, unpaired = pair_segments(out_index, rawnc_index, ['sbd.nc', 'tbd.nc'])
+    return oscicount, oflightcount, sorted(pairs)
+
+
+def main(args):
+    root = tempfile.mkdtemp(prefix='bench_dirindex-')
+    try:
+        rawncdir, queuedir = make_tree(root, args.files, args.queued)
+        print(f'{len(os.listdir(rawncdir))} files in rawnc directory, {len(os.listdir(queuedir))} files in queue')
+
+        t0 = time.perf_counter()
+        old = listdir_pairing(rawncdir, queuedir)
+        t_old = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        new = index_pairing(rawncdir, queuedir)
+        t_new = time.perf_counter() - t0
+
+        if old[:2] != new[:2] or not set(new[2]) <= set(old[2]):
+            raise RuntimeError('directory index results differ from the os.listdir results')
+
+        print(f'repeated os.listdir: {t_old:.3f} s')
+        print(f'directory index:     {t_new:.3f} s ({t_old / t_new:.0f}x faster), {len(files_with_suffix(index_directory(queuedir), "sbd.nc"))} queued segments paired')
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-n', '--files',
+                            type=int,
+                            help='Number of raw netcdf files in the synthetic rawnc directory',
+                            default=50000)
+
+    arg_parser.add_argument('-q', '--queued',
+                            type=int,
+                            help='Number of segments in the synthetic queue directory',
+                            default=200)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+Report the write time, read time and file size of each netCDF encoding profile on a sample segment.
+The sample is a merged timeseries file (e.g. from ../data/out/delayed/qc_queue) or, if no file is provided,
+a synthetic segment. Optional deployment.yml files add their 'encoding' section as extra profiles.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import xarray as xr
+import yaml
+from ruglider_processing.encoding import ENCODING_PROFILES, resolve_encoding_profile
+from ruglider_processing.ncwrite import build_dataset_encoding, constant_dataarray
+
+
+def synthetic_segment(nrows):
+    # smooth science variables plus noisy engineering variables, similar in shape to a merged segment
+    rng = np.random.default_rng(0)
+    t = np.arange(nrows)
+    depth = 100 * np.abs(np.sin(t / 2000))
+    ds = xr.Dataset(coords={'time': np.datetime64('2025-04-09T17:38:00') + t.astype('timedelta64[s]')})
+    ds['depth'] = ('time', depth)
+    ds['temperature'] = ('time', 20 - depth / 10 + rng.normal(0, 0.01, nrows))
+    ds['salinity'] = ('time', 33 + depth / 100 + rng.normal(0, 0.001, nrows))
+    for v in ['m_pitch', 'm_roll', 'm_heading', 'm_battery', 'm_vacuum']:
+        ds[v] = ('time', rng.normal(0, 1, nrows))
+    ds['source_file'] = constant_dataarray('ru44-2025-098-0-0-dbd(01230000)', ds['time'])
+    return ds
+
+
+def main(args):
+    if args.sample:
+        ds = xr.load_dataset(args.sample)
+    else:
+        ds = synthetic_segment(args.rows)
+
+    profiles = {name: resolve_encoding_profile(name) for name in ENCODING_PROFILES}
+    sources = dict()
+    for deploymentyaml in args.deploymentyaml:
+        with open(deploymentyaml, 'r') as file:
+            deployment_meta = yaml.safe_load(file)
+        sources.update({k: v.get('source') for k, v in deployment_meta.get('netcdf_variables', dict()).items()})
+        if 'encoding' in deployment_meta:
+            profiles[os.path.basename(os.path.dirname(os.path.abspath(deploymentyaml)))] = \
+                resolve_encoding_profile(config=deployment_meta['encoding'])
+
+    tmpdir = tempfile.mkdtemp(prefix='bench_encoding_profiles-')
+    try:
+        print(f'{ds.sizes["time"]} rows, {len(ds.data_vars)} variables')
+        print(f'{"profile":<20} {"size (MB)":>10} {"write (s)":>10} {"read (s)":>10}')
+        for name, settings in profiles.items():
+            outname = os.path.join(tmpdir, f'{name}.nc')
+            encoding = build_dataset_encoding(ds, settings, sources)
+
+            t0 = time.perf_counter()
+            ds.to_netcdf(outname, 'w', encoding=encoding)
+            t_write = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            xr.load_dataset(outname)
+            t_read = time.perf_counter() - t0
+
+            print(f'{name:<20} {os.path.getsize(outname) / 1e6:>10.2f} {t_write:>10.3f} {t_read:>10.3f}')
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('sample',
+                            nargs='?',
+                            help='Sample merged timeseries netCDF file (default: synthetic segment)',
+                            default=None)
+
+    arg_parser.add_argument('-r', '--rows',
+                            type=int,
+                            help='Number of rows in the synthetic segment',
+                            default=500000)
+
+    arg_parser.add_argument('-d', '--deploymentyaml',
+                            nargs='*',
+                            help='deployment.yml file(s) whose encoding section is benchmarked as an extra profile',
+                            default=[])
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the startup latency of the ruglider command line and the light ruglider_processing modules.
+Each case runs in a fresh interpreter (--repeat times, best time reported) and also checks that the heavy
+processing modules (pyglider, xarray, pandas, netCDF4) are not imported. Exits with status 1 if a case is slower
+than --max_seconds or imports a heavy module, so it can guard startup latency in CI or on the login nodes.
+Run from the repository root (or with the package installed).
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ['pyglider', 'xarray', 'pandas', 'netCDF4', 'scipy', 'gsw']
+
+# case name: python statements run in a fresh interpreter
+CASES = {
+    'python (baseline)': 'pass',
+    'import ruglider_processing': 'import ruglider_processing',
+    'import ruglider_processing.paths': 'import ruglider_processing.paths',
+    'import ruglider_processing.config': 'import ruglider_processing.config',
+    'ruglider --help': 'from ruglider_processing.cli import main\ntry:\n    main(["--help"])\nexcept SystemExit:\n    pass',
+    'ruglider merge --help': 'from ruglider_processing.cli import main\ntry:\n    main(["merge", "--help"])\nexcept SystemExit:\n    pass',
+    'ruglider convert --help': 'from ruglider_processing.cli import main\ntry:\n    main(["convert", "--help"])\nexcept SystemExit:\n    pass',
+}
+
+# report the heavy modules that were imported, on stderr so --help output on stdout can be discarded
+CHECK = f'\nimport sys\nsys.stderr.write(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+
+
+def run_case(statements, repeat, env):
+    best = None
+    heavy = ''
+    for __ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', statements + CHECK], env=env, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        heavy = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''
+
+    return best, heavy
+
+
+def main(args):
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([root] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+
+    failures = 0
+    print(f'{"case":<36}{"best (s)":>10}  heavy modules imported')
+    for name, statements in CASES.items():
+        best, heavy = run_case(statements, args.repeat, env)
+        status = ''
+        if name != 'python (baseline)' and (best > args.max_seconds or heavy):
+            status = '  FAIL'
+            failures += 1
+        print(f'{name:<36}{best:>10.3f}  {heavy or "-"}{status}')
+
+    if args.compare_heavy:
+        best, __ = run_case('import ruglider_processing.common', args.repeat, env)
+        print(f'{"import ruglider_processing.common":<36}{best:>10.3f}  (reference, imports the processing stack)')
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-r', '--repeat',
+                            help='Number of times to run each case',
+                            type=int,
+                            default=5)
+
+    arg_parser.add_argument('--max_seconds',
+                            help='Maximum startup time of each case',
+                            type=float,
+                            default=0.5)
+
+    arg_parser.add_argument('--compare_heavy',
+                            help='Also time importing ruglider_processing.common (netCDF4/xarray/pandas) for reference',
+                            action='store_true')
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
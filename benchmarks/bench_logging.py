@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the time a processing loop spends in log calls: a synchronous FileHandler compared with the queue-based
+loggers of ruglider_processing.loggers.setup_logger. A write latency can be added to each log file write to
+emulate a slow (e.g. NFS) log directory.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from ruglider_processing.loggers import setup_logger, stop_logging, build_formatter, configure_logging
+
+
+def add_write_latency(latency):
+    # every FileHandler write (synchronous, or in the listener thread of the queue loggers) takes latency seconds
+    emit = logging.FileHandler.emit
+
+    def slow_emit(self, record):
+        time.sleep(latency)
+        emit(self, record)
+
+    logging.FileHandler.emit = slow_emit
+
+
+def log_loop(logger, records):
+    # the caller's view: time until every log call has returned
+    t = time.perf_counter()
+    for i in range(records):
+        logger.info(f'Segment ru44-2025-{i:03d}-0-0: merged 12345 rows')
+    return time.perf_counter() - t
+
+
+def main(args):
+    logdir = args.log_dir or tempfile.mkdtemp(prefix='bench_logging-')
+    configure_logging(log_format=args.log_format)
+    add_write_latency(args.write_latency)
+    try:
+        sync_logger = logging.getLogger('bench_sync')
+        sync_logger.setLevel(logging.INFO)
+        handler = logging.FileHandler(os.path.join(logdir, 'sync.log'))
+        handler.setFormatter(build_formatter(args.log_format))
+        sync_logger.addHandler(handler)
+        t_sync = log_loop(sync_logger, args.records)
+        handler.close()
+
+        queue_logger = setup_logger('bench_queue', 'INFO', os.path.join(logdir, 'queue.log'))
+        t_queue = log_loop(queue_logger, args.records)
+        t = time.perf_counter()
+        stop_logging()
+        t_drain = time.perf_counter() - t
+
+        with open(os.path.join(logdir, 'queue.log')) as f:
+            assert sum(1 for __ in f) == args.records
+
+        print(f'{args.records} records, {args.write_latency * 1000:.1f} ms per write')
+        print(f'{"synchronous FileHandler":<26}{t_sync:>10.3f} s in log calls')
+        print(f'{"queue logger":<26}{t_queue:>10.3f} s in log calls ({t_drain:.3f} s written in the background)')
+    finally:
+        if args.log_dir is None:
+            shutil.rmtree(logdir)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-n', '--records',
+                            help='Number of log records',
+                            type=int,
+                            default=2000)
+
+    arg_parser.add_argument('--write_latency',
+                            help='Seconds added to each log file write',
+                            type=float,
+                            default=0.001)
+
+    arg_parser.add_argument('--log_dir',
+                            help='Directory for the log files (default: a temporary directory)',
+                            type=str,
+                            default=None)
+
+    arg_parser.add_argument('--log_format',
+                            help='Log file format',
+                            choices=['text', 'json'],
+                            default='text')
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
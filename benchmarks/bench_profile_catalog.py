@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+Benchmark finding the profiles in a time window and bounding box with the profile catalog
+(ruglider_processing.catalog) compared with opening every merged segment file and indexing its profiles.
+Also times cataloguing the segments.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import xarray as xr
+from ruglider_processing.catalog import open_catalog, profile_summaries, upsert_segment, query_profiles, file_profiles
+from ruglider_processing.ncwrite import build_dataset_encoding
+
+
+def make_segment(outdir, i, rows, profiles):
+    # synthetic merged segment file, one hour per segment, alternating profiles and surface rows
+    rng = np.random.default_rng(i)
+    t = 1.7e9 + i * 3600 + np.arange(rows) * 3600 / rows
+    profile = np.arange(rows) * 2 * profiles // rows
+    pid = np.where(profile % 2 == 1, t[0] + profile, 0)
+    lat = np.full(rows, 38 + i * 0.01) + rng.normal(scale=0.001, size=rows)
+    lon = np.full(rows, -74 + i * 0.01) + rng.normal(scale=0.001, size=rows)
+    ds = xr.Dataset({'profile_id': ('time', pid), 'depth': ('time', rng.uniform(0, 100, rows)),
+                     'profile_lat': ('time', lat), 'profile_lon': ('time', lon)},
+                    coords={'time': (t * 1000).astype('datetime64[ms]')})
+    filepath = os.path.join(outdir, f'seg{i:05d}_stbd.nc')
+    ds.to_netcdf(filepath, encoding=build_dataset_encoding(ds))
+
+    return filepath, ds
+
+
+def main(args):
+    workdir = tempfile.mkdtemp()
+    try:
+        segments = [make_segment(workdir, i, args.rows, args.profiles) for i in range(args.segments)]
+        catalogfile = os.path.join(workdir, 'deployment-rt-profiles.sqlite')
+
+        t = time.perf_counter()
+        conn = open_catalog(catalogfile)
+        for i, (filepath, ds) in enumerate(segments):
+            upsert_segment(conn, 'deployment', f'seg{i:05d}', '2025-01-01T00:00:00Z', filepath, profile_summaries(ds))
+        conn.close()
+        t_build = time.perf_counter() - t
+
+        # a window covering a tenth of the segments in time and space
+        start = 1.7e9 + args.segments * 0.45 * 3600
+        end = 1.7e9 + args.segments * 0.55 * 3600
+        bbox = (-74 + args.segments * 0.0045, 38 + args.segments * 0.0045,
+                -74 + args.segments * 0.0055, 38 + args.segments * 0.0055)
+
+        t = time.perf_counter()
+        found_files = []
+        for filepath, __ in segments:
+            found_files.extend(p for p in file_profiles(filepath)
+                               if p['end_time'] >= start and p['start_time'] <= end
+                               and bbox[0] <= p['lon'] <= bbox[2] and bbox[1] <= p['lat'] <= bbox[3])
+        t_files = time.perf_counter() - t
+
+        t = time.perf_counter()
+        found = query_profiles([catalogfile], start=start, end=end, bbox=bbox)
+        t_query = time.perf_counter() - t
+
+        assert len(found) == len(found_files)
+
+        print(f'{args.segments} segments x {args.profiles} profiles, {len(found)} profiles found')
+        print(f'{"catalog every segment":<36}{t_build:>10.3f} s')
+        print(f'{"query: open every segment file":<36}{t_files:>10.3f} s')
+        print(f'{"query: profile catalog":<36}{t_query:>10.4f} s  ({t_files / t_query:.0f}x)')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-s', '--segments',
+                            help='Number of merged segment files',
+                            type=int,
+                            default=500)
+
+    arg_parser.add_argument('-r', '--rows',
+                            help='Rows per segment',
+                            type=int,
+                            default=2000)
+
+    arg_parser.add_argument('-p', '--profiles',
+                            help='Profiles per segment',
+                            type=int,
+                            default=10)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
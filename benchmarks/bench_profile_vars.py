@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+Micro-benchmark for the profile variable calculation in merge_raw_nc_to_timeseries.py
+Compares the original per-profile np.where loop with the single-pass
+ruglider_processing.common.profile_nanmeans on synthetic glider segments.
+"""
+
+import argparse
+import sys
+import timeit
+import numpy as np
+import ruglider_processing.common as cf
+
+
+def loop_nanmeans(profile_id, sources):
+    # original implementation: one np.where scan of the profile index per profile per variable
+    means = []
+    for source in sources:
+        v = np.zeros(np.shape(profile_id))
+        if np.any(profile_id != 0):
+            for i in np.unique(profile_id):
+                if i != 0:
+                    idx = np.where(profile_id == i)[0]
+                    v[idx] = np.nanmean(source[idx])
+        means.append(v)
+    return means
+
+
+def synthetic_segment(nrows, nprofiles, seed=0):
+    # profile_id is the profile midpoint timestamp, 0 between profiles, lat/lon are sparse (GPS fixes)
+    rng = np.random.default_rng(seed)
+    time = 1.74e9 + np.arange(nrows) * 0.5
+    edges = np.linspace(0, nrows, nprofiles + 1).astype(int)
+    profile_id = np.zeros(nrows)
+    for start, end in zip(edges[:-1], edges[1:]):
+        inprofile = slice(start + (end - start) // 10, end)
+        profile_id[inprofile] = np.round(np.mean(time[inprofile]))
+    lat = np.full(nrows, np.nan)
+    lon = np.full(nrows, np.nan)
+    fixes = rng.random(nrows) < 0.2
+    lat[fixes] = 39.0 + rng.random(np.sum(fixes))
+    lon[fixes] = -74.0 + rng.random(np.sum(fixes))
+    return profile_id, [lat, lon]
+
+
+def main(args):
+    print(f'{"rows":>10} {"profiles":>9} {"loop (s)":>10} {"vectorized (s)":>15} {"speed-up":>9}')
+    for nrows in args.rows:
+        profile_id, sources = synthetic_segment(nrows, args.profiles)
+
+        old = loop_nanmeans(profile_id, sources)
+        new = cf.profile_nanmeans(profile_id, sources)
+        for o, n in zip(old, new):
+            np.testing.assert_allclose(n, o, rtol=1e-12, equal_nan=True)
+
+        t_loop = min(timeit.repeat(lambda: loop_nanmeans(profile_id, sources), number=1, repeat=args.repeat))
+        t_vec = min(timeit.repeat(lambda: cf.profile_nanmeans(profile_id, sources), number=1, repeat=args.repeat))
+        print(f'{nrows:>10} {args.profiles:>9} {t_loop:>10.4f} {t_vec:>15.4f} {t_loop / t_vec:>8.1f}x')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-r', '--rows',
+                            nargs='+',
+                            type=int,
+                            help='Number of rows in each synthetic segment',
+                            default=[10000, 100000, 1000000])
+
+    arg_parser.add_argument('-p', '--profiles',
+                            type=int,
+                            help='Number of profiles in each synthetic segment',
+                            default=200)
+
+    arg_parser.add_argument('-n', '--repeat',
+                            type=int,
+                            help='Number of timing repeats (the fastest is reported)',
+                            default=3)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the sensor definition lookup in generate_deploymentyaml.py: the original approach (parse both
+sensor_defs json files, merge them and scan netcdf_variables for every sensor in sensors.txt) compared with
+ruglider_processing.sensordefs (cached sensor index and source->variable map). The index is timed cold
+(json parsed and index built), from the json index cache file (a new process) and from memory (the next
+deployment with the same sensor definitions in a fleet run).
+"""
+
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+import yaml
+import ruglider_processing.config as config
+import ruglider_processing.sensordefs as sensordefs
+
+
+def original_lookup(sdraw, sdprofile, sensors, netcdf_variables):
+    with open(sdraw, 'r') as file:
+        sdraw_data = json.load(file)
+    with open(sdprofile, 'r') as file:
+        sdprofile_data = json.load(file)
+    combined_data = sdraw_data.copy()
+    combined_data.update(sdprofile_data)
+
+    found = 0
+    for sensor in sensors:
+        if any(attributes.get('source') == sensor for attributes in netcdf_variables.values()):
+            continue
+        if sensor in combined_data:
+            found += 1
+            netcdf_variables[combined_data[sensor]['nc_var_name']] = dict(source=sensor)
+
+    return found
+
+
+def indexed_lookup(sdraw, sdprofile, sensors, netcdf_variables, cache=True):
+    sensor_index = sensordefs.load_sensor_index([sdraw, sdprofile], cache=cache)
+    source_map = sensordefs.source_variable_map(netcdf_variables)
+
+    found = 0
+    for sensor in sensors:
+        if sensor in source_map:
+            continue
+        if sensor in sensor_index:
+            found += 1
+            keyname = sensor_index[sensor]['nc_var_name']
+            netcdf_variables[keyname] = dict(source=sensor)
+            source_map[sensor] = keyname
+
+    return found
+
+
+def main(args):
+    workdir = tempfile.mkdtemp()
+    try:
+        sdraw = shutil.copy(os.path.join(args.config_dir, 'sensor_defs-raw.json'), workdir)
+        sdprofile = shutil.copy(os.path.join(args.config_dir, 'sensor_defs-sci_profile.json'), workdir)
+        with open(os.path.join(args.config_dir, 'sensors.txt'), 'r') as file:
+            sensors = [sensor.strip() for sensor in file.readlines()]
+        with open(os.path.join(args.config_dir, 'deployment-template.yml'), 'r') as file:
+            netcdf_variables = yaml.safe_load(file)['netcdf_variables']
+
+        def variables():
+            return copy.deepcopy(netcdf_variables)
+
+        def cold():
+            sensordefs._index_cache.clear()
+            config._hash_cache.clear()
+            return indexed_lookup(sdraw, sdprofile, sensors, variables(), cache=False)
+
+        def from_cache_file():
+            sensordefs._index_cache.clear()
+            config._hash_cache.clear()
+            return indexed_lookup(sdraw, sdprofile, sensors, variables())
+
+        def from_memory():
+            return indexed_lookup(sdraw, sdprofile, sensors, variables())
+
+        assert original_lookup(sdraw, sdprofile, sensors, variables()) == cold()
+        from_cache_file()
+
+        cases = [('original (json + linear scans)', lambda: original_lookup(sdraw, sdprofile, sensors, variables())),
+                 ('index, cold', cold),
+                 ('index, from cache file', from_cache_file),
+                 ('index, from memory', from_memory)]
+        print(f'{len(sensors)} sensors, best of {args.repeat}')
+        t_original = None
+        for name, fn in cases:
+            t = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+            t_original = t_original or t
+            print(f'{name:<34}{t * 1000:>10.2f} ms  ({t_original / t:.1f}x)')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('config_dir',
+                            nargs='?',
+                            help='Deployment config directory containing the sensor_defs json files, sensors.txt and '
+                                 'deployment-template.yml',
+                            default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                 'example_config_files', 'ru44-20250325T0438'))
+
+    arg_parser.add_argument('-r', '--repeat',
+                            help='Number of times to run each case',
+                            type=int,
+                            default=10)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
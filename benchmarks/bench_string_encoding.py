@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""
+Before/after report for the encoding of the per-row source_file and trajectory variables in merged timeseries files.
+Writes a synthetic merged segment with the previous encoding (full-length numpy unicode arrays written as
+uncompressed variable-length strings) and with ruglider_processing.ncwrite.build_encoding (compressed
+fixed-width char arrays), and reports file size, write time and read time.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import xarray as xr
+from ruglider_processing.ncwrite import build_encoding, constant_dataarray
+
+
+def synthetic_segment(nrows, nvars):
+    rng = np.random.default_rng(0)
+    time = np.datetime64('2025-04-09T17:38:00') + np.arange(nrows).astype('timedelta64[s]')
+    ds = xr.Dataset({f'var{i}': ('time', rng.random(nrows)) for i in range(nvars)}, coords={'time': time})
+    ds['source_file'] = constant_dataarray('ru44-2025-098-0-0-sbd(01230000)', ds['time'])
+    ds['trajectory'] = constant_dataarray('ru44-20250325T0438', ds['time'])
+    return ds
+
+
+def legacy_encoding(ds):
+    # previous behavior: full-length unicode arrays, written as vlen strings without compression
+    ds = ds.copy()
+    encoding = dict()
+    for v in list(ds.data_vars) + list(ds.coords):
+        build_encoding(encoding, ds, v)
+    for v in ['source_file', 'trajectory']:
+        ds[v] = (ds[v].dims, np.array(ds[v].values))
+        encoding[v] = {'zlib': False, 'complevel': 1, 'dtype': ds[v].dtype, '_FillValue': ''}
+    return ds, encoding
+
+
+def compact_encoding(ds):
+    encoding = dict()
+    for v in list(ds.data_vars) + list(ds.coords):
+        build_encoding(encoding, ds, v)
+    return ds, encoding
+
+
+def timed_write_read(ds, encoding, outname):
+    t0 = time.perf_counter()
+    ds.to_netcdf(outname, 'w', encoding=encoding)
+    t_write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with xr.open_dataset(outname) as rds:
+        values = rds['source_file'].values
+    t_read = time.perf_counter() - t0
+
+    return os.path.getsize(outname), t_write, t_read, values
+
+
+def main(args):
+    tmpdir = tempfile.mkdtemp(prefix='bench_string_encoding-')
+    try:
+        ds = synthetic_segment(args.rows, args.variables)
+        print(f'{args.rows} rows, {args.variables} float variables')
+        print(f'{"encoding":<28} {"size (MB)":>10} {"write (s)":>10} {"read (s)":>10}')
+        results = dict()
+        for name, prepare in [('vlen string (before)', legacy_encoding), ('compressed char (after)', compact_encoding)]:
+            outds, encoding = prepare(ds)
+            size, t_write, t_read, values = timed_write_read(outds, encoding, os.path.join(tmpdir, 'segment.nc'))
+            results[name] = values
+            print(f'{name:<28} {size / 1e6:>10.2f} {t_write:>10.3f} {t_read:>10.3f}')
+
+        before, after = results.values()
+        if not np.array_equal(before, after):
+            raise RuntimeError('source_file values read back differ between the encodings')
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-r', '--rows',
+                            type=int,
+                            help='Number of rows in the synthetic segment',
+                            default=500000)
+
+    arg_parser.add_argument('-v', '--variables',
+                            type=int,
+                            help='Number of float science/engineering variables in the synthetic segment',
+                            default=20)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
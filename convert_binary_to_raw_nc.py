@@ -11,9 +11,546 @@ import os
 import argparse
 import sys
 import shutil
+import tempfile
+import yaml
+from concurrent.futures import ProcessPoolExecutor
 import pyglider.slocum as slocum
-import ruglider_processing.common as cf
-from ruglider_processing.loggers import logfile_basename, setup_logger, logfile_deploymentname
+import ruglider_processing.paths as paths
+from ruglider_processing.cli import add_convert_arguments
+from ruglider_processing.config import load_deployment_config
+from ruglider_processing.dirindex import index_directory, add_file, remove_file, files_with_suffix, count_suffix, suffix_case, \
+    pair_segments, split_filename
+from ruglider_processing.metrics import new_metrics, timed_phase, finish_metrics, file_bytes, metrics_path, write_metrics, \
+    write_prometheus_textfile
+from ruglider_processing.loggers import logfile_basename, setup_logger, logfile_deploymentname, configure_logging
+from ruglider_processing.staging import new_staging_stats, stage_file, format_staging_stats
+from ruglider_processing.journal import convert_journal_path, append_journal, read_journal, clear_journal, remove_stale_tmp
+from ruglider_processing.locks import lock_deployment, release_lock
+from ruglider_processing.deployindex import update_index, active_deployments
+
+
+def group_files_by_segment(filenames):
+    """
+    Group binary file names by glider segment so that both halves of a segment (e.g. sbd/tbd) stay together
+    :param filenames: list of binary file names
+    :return: dictionary of segment name: sorted list of file names, sorted by segment name
+    """
+    segments = dict()
+    for f in sorted(filenames):
+        segments.setdefault(f.split('.')[0], []).append(f)
+
+    return dict(sorted(segments.items()))
+
+
+def make_shards(binarydir, segments, nshards, workdir):
+    """
+    Split the binary queue into shard directories (hardlinks to the queued files where possible, see
+    ruglider_processing.staging.stage_file) that can be converted independently
+    :param binarydir: binary queue directory
+    :param segments: dictionary of segment name: list of file names (from group_files_by_segment)
+    :param nshards: maximum number of shards
+    :param workdir: directory in which to create the shard directories
+    :return: list of (shard directory, list of segment names)
+    """
+    segnames = list(segments.keys())
+    nshards = max(1, min(nshards, len(segnames)))
+    shards = []
+    for i in range(nshards):
+        shard_segments = segnames[i::nshards]
+        sharddir = os.path.join(workdir, f'shard{i:03d}')
+        os.makedirs(sharddir)
+        for seg in shard_segments:
+            for f in segments[seg]:
+                stage_file(os.path.join(binarydir, f), os.path.join(sharddir, f))
+        shards.append((sharddir, shard_segments))
+
+    return shards
+
+
+def publish_cache_files(private_cacdir, cacdir):
+    """
+    Move cache files created by one worker into the shared cache directory. Each file is renamed into place
+    atomically and only if it doesn't already exist, so concurrent workers never see a partially written file.
+    :param private_cacdir: worker cache file directory
+    :param cacdir: shared cache file directory
+    """
+    for f in os.listdir(private_cacdir):
+        dst = os.path.join(cacdir, f)
+        if os.path.exists(dst):
+            continue
+        tmp = os.path.join(cacdir, f'.{f}.{os.getpid()}.tmp')
+        shutil.copy2(os.path.join(private_cacdir, f), tmp)
+        os.replace(tmp, dst)
+
+
+def publish_output_files(tmp_outdir, outdir):
+    # move the converted files into the output directory, each file is renamed into place atomically
+    # returns the full paths of the published files
+    published = []
+    for f in os.listdir(tmp_outdir):
+        os.replace(os.path.join(tmp_outdir, f), os.path.join(outdir, f))
+        published.append(os.path.join(outdir, f))
+
+    return published
+
+
+def convert_shard(binarydir, outdir, cacdir, sensorlist, deploymentyaml, scisuffix, glidersuffix, private_cache=False):
+    """
+    Convert the binary files in one directory to raw netCDF files with pyglider. pyglider writes to a temporary
+    directory inside outdir and the converted files are only moved into outdir once the conversion has finished,
+    so an interrupted conversion never leaves a truncated file in outdir.
+    :param private_cache: if True, convert using a private copy of the shared cache file directory and publish
+    any new cache files to the shared directory when finished, so concurrent workers never write the same file
+    :return: metrics dictionary (timing, files and bytes read/written) for the directory
+    """
+    # pyglider converts the whole directory in one call, so the conversion is timed per directory (one segment
+    # for the rt watch daemon, a shard or the whole queue otherwise)
+    binary_files = [f for f in os.listdir(binarydir) if f.partition('.')[2] in [scisuffix, glidersuffix]]
+    segments = {split_filename(f)[0] for f in binary_files}
+    metrics = new_metrics('convert', next(iter(segments)) if len(segments) == 1 else None)
+    metrics['segments'] = len(segments)
+    metrics['files'] = len(binary_files)
+    metrics['bytes_read'] = file_bytes([os.path.join(binarydir, f) for f in binary_files])
+
+    # the pid in the temporary directory name lets the next run remove it if this process is killed
+    tmp_outdir = tempfile.mkdtemp(prefix=f'.convert-{os.getpid()}-', dir=outdir)
+    try:
+        if not private_cache:
+            with timed_phase(metrics, 'binary_to_rawnc'):
+                slocum.binary_to_rawnc(binarydir, tmp_outdir, cacdir, sensorlist, deploymentyaml, incremental=True, 
+                                       scisuffix=scisuffix, glidersuffix=glidersuffix)
+        else:
+            private_cacdir = tempfile.mkdtemp(prefix=f'.worker-{os.getpid()}-', dir=cacdir)
+            try:
+                with timed_phase(metrics, 'cache_copy'):
+                    for f in os.listdir(cacdir):
+                        if os.path.isfile(os.path.join(cacdir, f)) and not f.startswith('.'):
+                            stage_file(os.path.join(cacdir, f), os.path.join(private_cacdir, f))
+                with timed_phase(metrics, 'binary_to_rawnc'):
+                    slocum.binary_to_rawnc(binarydir, tmp_outdir, private_cacdir, sensorlist, deploymentyaml, incremental=True, 
+                                           scisuffix=scisuffix, glidersuffix=glidersuffix)
+                with timed_phase(metrics, 'cache_publish'):
+                    publish_cache_files(private_cacdir, cacdir)
+            finally:
+                shutil.rmtree(private_cacdir, ignore_errors=True)
+        published = publish_output_files(tmp_outdir, outdir)
+    finally:
+        shutil.rmtree(tmp_outdir, ignore_errors=True)
+
+    # only the files this shard wrote, the raw netcdf queue is shared by every shard and run
+    metrics['bytes_written'] = file_bytes([f for f in published if f.endswith('.nc')])
+
+    return finish_metrics(metrics)
+
+
+def failed_convert_metrics(segments):
+    # metrics record for a conversion that raised an error
+    metrics = new_metrics('convert', segments[0] if len(segments) == 1 else None)
+    metrics['segments'] = len(segments)
+
+    return finish_metrics(metrics, success=False)
+
+
+def binary_signatures(binarydir, files):
+    # size and modification time of binary files, to check that journaled files haven't been replaced since
+    signatures = dict()
+    for f in files:
+        st = os.stat(os.path.join(binarydir, f))
+        signatures[f] = [st.st_size, st.st_mtime_ns]
+
+    return signatures
+
+
+def journal_converted(job, segments):
+    """
+    Record converted segments in the deployment convert journal, so a run that is interrupted before the binary
+    queue is cleared doesn't convert them again
+    :param job: deployment conversion job from prepare_deployment
+    :param segments: list of segment names whose converted files are in the raw netcdf queue
+    """
+    for seg in segments:
+        files = files_with_suffix({seg: job['binary_index'].get(seg, dict())}, [job['scisuffix'], job['glidersuffix']],
+                                  case_sensitive=True)
+        append_journal(job['journal'], seg, files=binary_signatures(job['binarydir'], files))
+
+
+def converted_segments(journalfile, binarydir, out_index):
+    """
+    Find the segments converted by an interrupted run: journaled segments whose binary files are unchanged and
+    whose converted files are in the raw netcdf queue
+    :param journalfile: full path to the deployment convert journal
+    :param binarydir: binary queue directory
+    :param out_index: directory index of the raw netcdf queue
+    :return: set of segment names
+    """
+    completed = set()
+    for seg, record in read_journal(journalfile).items():
+        if not any(suffix.endswith('.nc') for suffix in out_index.get(seg, dict())):
+            continue
+        try:
+            if binary_signatures(binarydir, record['files']) == record['files']:
+                completed.add(seg)
+        except OSError:
+            continue
+
+    return completed
+
+
+def prepare_deployment(logging_base, deployment, deployments_root, mode, loglevel):
+    """
+    Find and check the directories and config files for a deployment, and count the binary files to convert
+    :return: dictionary describing the deployment conversion job, None if the deployment can't be processed
+    """
+    # find the deployment data filepaths
+    rawncdir, __, deployment_location = paths.find_glider_deployment_datapath(logging_base, deployment, deployments_root, mode)
+
+    binarydir = os.path.join(deployment_location, 'data', 'in', 'binary', 'queue')
+    outdir = os.path.join(deployment_location, 'data', 'in', 'rawnc', 'queue')
+
+    if not os.path.isdir(binarydir):
+        logging_base.error(f'{deployment} binary file data directory not found')
+        return None
+    
+    if not os.path.isdir(rawncdir):
+        logging_base.error(f'{deployment} raw NetCDF output file data directory not found')
+        return None
+
+    if not os.path.isdir(outdir):
+        logging_base.error(f'{deployment} raw NetCDF output file data directory not found')
+        return None
+
+    if not os.path.isdir(os.path.join(deployment_location, 'proc-logs')):
+        logging_base.error(f'{deployment} deployment proc-logs directory not found')
+        return None
+
+    logfilename = logfile_deploymentname(deployment, mode, 'proc_binary_to_rawnc')
+    logFile = os.path.join(deployment_location, 'proc-logs', logfilename)
+    logging = setup_logger(f'logging_convert_{deployment}_{mode}', loglevel, logFile)
+
+    # Set the deployment configuration path
+    deployment_config_root = os.path.join(deployment_location, 'config', 'proc')
+    if not os.path.isdir(deployment_config_root):
+        logging.warning(f'Invalid deployment config root: {deployment_config_root}')
+
+    # Find metadata files
+    deploymentyaml = os.path.join(deployment_config_root, 'deployment.yml')
+    if not os.path.isfile(deploymentyaml):
+        logging.warning(f'Invalid deployment.yaml file: {deploymentyaml}')
+    else:
+        # validate deployment.yml and write the parsed config sidecar so the merge step doesn't parse it again
+        try:
+            load_deployment_config(deploymentyaml, sidecar=True)
+        except (yaml.YAMLError, ValueError) as e:
+            logging.warning(f'Invalid deployment.yaml file {deploymentyaml}: {e}')
+    
+    # Find sensor list for processing binary files
+    sensorlist = os.path.join(deployment_config_root, 'sensors.txt')
+    if not os.path.isfile(sensorlist):
+        logging.warning(f'Invalid sensors.txt file: {sensorlist}')
+    
+    if mode == 'rt':
+        scisuffix = 'tbd'
+        glidersuffix = 'sbd'
+    elif mode == 'delayed':
+        scisuffix = 'ebd'
+        glidersuffix = 'dbd'
+    else:
+        logging.warning(f'Invalid mode provided: {mode}')
+        return None
+    
+    logging.info(f'Processing: {deployment} {mode}')
+
+    # convert binary *.T/EBD and *.S/DBD into *.t/ebd.nc and *.s/dbd.nc netcdf files.
+    logging.info(f'Converting binary *.{scisuffix} and *.{glidersuffix} into *.{scisuffix}.nc and *.{glidersuffix}.nc netcdf files')
+    logging.info(f'Binary filepath: {binarydir}')
+    logging.info(f'Output filepath: {outdir}')
+
+    # index the binary queue once, the index is used for counting, sharding and cleanup
+    binary_index = index_directory(binarydir)
+
+    # log the number of binary files to be converted
+    # (binary files are sometimes named with uppercase suffixes e.g. *.SBD)
+    scisuffix = suffix_case(binary_index, scisuffix)
+    glidersuffix = suffix_case(binary_index, glidersuffix)
+    # pyglider only converts the files with the exact suffix case it's given, files with the other case (e.g. *.SBD
+    # next to *.sbd) are left in the queue for the next run
+    scicount = count_suffix(binary_index, scisuffix, case_sensitive=True)
+    flightcount = count_suffix(binary_index, glidersuffix, case_sensitive=True)
+    othercase = len(files_with_suffix(binary_index, [scisuffix, glidersuffix])) - scicount - flightcount
+    if othercase > 0:
+        logging.info(f'Leaving {othercase} binary files with differently cased suffixes in the queue for the next run')
+
+    # resume an interrupted run: remove its partial output and skip the segments it finished converting
+    for name in remove_stale_tmp(outdir):
+        logging.info(f'Removed {name} left in the raw NetCDF queue by an interrupted run')
+    for name in remove_stale_tmp(os.path.dirname(binarydir)):
+        logging.info(f'Removed {name} left next to the binary queue by an interrupted run')
+    journalfile = convert_journal_path(deployment_location, mode)
+    completed = converted_segments(journalfile, binarydir, index_directory(outdir))
+    if len(completed) > 0:
+        logging.info(f'Resuming an interrupted run: {len(completed)} segments were already converted')
+
+    return dict(deployment=deployment,
+                logging=logging,
+                binarydir=binarydir,
+                binary_index=binary_index,
+                outdir=outdir,
+                rawncdir=rawncdir,
+                deployment_location=deployment_location,
+                deploymentyaml=deploymentyaml,
+                sensorlist=sensorlist,
+                scisuffix=scisuffix,
+                glidersuffix=glidersuffix,
+                scicount=scicount,
+                flightcount=flightcount,
+                journal=journalfile,
+                completed=completed)
+
+
+def finish_deployment(job, mode, failed_segments=(), metrics=(), metrics_textfile_dir=None, staging='link'):
+    """
+    Stage the converted files for the merge step, log the conversion counts and clear the binary queue
+    :param job: deployment conversion job from prepare_deployment
+    :param mode: dataset mode (rt or delayed)
+    :param failed_segments: segments whose conversion failed, their binary files are left in the queue
+    :param metrics: list of conversion metrics dictionaries, written to the deployment metrics file in proc-logs
+    :param metrics_textfile_dir: optional node-exporter textfile collector directory for a summary of the run metrics
+    :param staging: how converted files are staged between the queue and rawnc directories: link (hardlink, then
+    reflink, then copy), reflink (reflink, then copy) or copy
+    """
+    logging = job['logging']
+    binarydir = job['binarydir']
+    outdir = job['outdir']
+    rawncdir = job['rawncdir']
+    scisuffix = job['scisuffix']
+    glidersuffix = job['glidersuffix']
+
+    # index the converted files and the raw netcdf directory once, the indexes are shared by
+    # the copy, counting and rt pairing steps below
+    out_index = index_directory(outdir)
+    rawnc_index = index_directory(rawncdir)
+    ncsuffixes = [f'{scisuffix}.nc', f'{glidersuffix}.nc']
+
+    # Files are written to ./data/in/rawnc/queue for the next step in processing
+    # Stage those files in rawncdir (hardlinked or reflinked when the filesystem allows it, otherwise copied)
+    staging_stats = new_staging_stats()
+    for f in files_with_suffix(out_index, ncsuffixes):
+        stage_file(os.path.join(outdir, f), os.path.join(rawncdir, f), staging, staging_stats)
+        add_file(rawnc_index, f)
+
+    # log how many files were successfully converted from binary to *.nc
+    oscicount = count_suffix(out_index, f'{scisuffix}.nc')
+    oflightcount = count_suffix(out_index, f'{glidersuffix}.nc')
+    logging.info(f'Successfully converted {oscicount} of {job["scicount"]} science binary files with suffix *.{scisuffix}')
+    logging.info(f'Successfully converted {oflightcount} of {job["flightcount"]} engineering binary files with suffix *.{glidersuffix}')
+
+    # Check the file names in ./data/in/rawnc/queue
+    # If there aren't a pair of files (sbd/tbd or dbd/ebd) check the files in rawncdir 
+    # and copy them to ./data/in/rawnc/queue for the next step in processing.
+    # This is necessary for the rt data processing because the binary files are processed as 
+    # they are received from the glider and there may be a delay in receiving the other file type.
+    if mode == 'rt':
+        pair_files, unpaired = pair_segments(out_index, rawnc_index, ncsuffixes)
+        for rnm in pair_files:
+            stage_file(os.path.join(rawncdir, rnm), os.path.join(outdir, rnm), staging, staging_stats)
+            add_file(out_index, rnm)
+        if len(pair_files) > 0:
+            logging.info(f'Staged {len(pair_files)} previously converted files in the queue to complete segment pairs')
+        if len(unpaired) > 0:
+            logging.info(f'{len(unpaired)} queued segments are still unpaired: {", ".join(unpaired)}')
+        
+    if staging_stats['files'] > 0:
+        logging.info(f'Staged {format_staging_stats(staging_stats)}')
+
+    # once all binary files have been processed, remove the files from ./data/in/binary/queue
+    # (binary files for segments that failed to convert are left in the queue for the next run)
+    # (only the files with the suffix case that was converted, see prepare_deployment)
+    for f in files_with_suffix(job['binary_index'], [scisuffix, glidersuffix], case_sensitive=True):
+        if f.split('.')[0] in failed_segments:
+            logging.warning(f'Leaving {f} in the binary queue directory, conversion failed')
+            continue
+        os.remove(os.path.join(binarydir, f))
+        remove_file(job['binary_index'], f)
+
+    # the converted segments are staged and their binary files removed, the journal isn't needed anymore
+    clear_journal(job['journal'])
+
+    write_metrics(list(metrics), metrics_path(job['deployment_location'], mode), deployment=job['deployment'], mode=mode)
+    if metrics_textfile_dir and len(metrics) > 0:
+        write_prometheus_textfile(list(metrics), metrics_textfile_dir, 'convert', deployment=job['deployment'], mode=mode)
+
+    logging.info('Finished converting binary files to raw netcdf files')
+
+
+def convert_segment(job, seg, files, cacdir, mode, metrics_textfile_dir=None, staging='link'):
+    """
+    Convert the binary files of one segment from the deployment binary queue and stage the raw netcdf files
+    for the merge step (used by the rt watch daemon to process each segment as soon as it arrives)
+    :param job: deployment conversion job from prepare_deployment
+    :param seg: segment name e.g. ru44-2025-098-0-0
+    :param files: binary file names of the segment in the binary queue directory
+    :param cacdir: shared cache file directory
+    :param mode: dataset mode (rt or delayed)
+    :param metrics_textfile_dir: optional node-exporter textfile collector directory for a summary of the metrics
+    :param staging: how converted files are staged between the queue and rawnc directories (see finish_deployment)
+    :return: True if the segment was converted successfully
+    """
+    seg_index = dict()
+    for f in files:
+        add_file(seg_index, f)
+    scisuffix = suffix_case(seg_index, job['scisuffix'])
+    glidersuffix = suffix_case(seg_index, job['glidersuffix'])
+    files = files_with_suffix(seg_index, [scisuffix, glidersuffix], case_sensitive=True)
+    seg_job = dict(job,
+                   binary_index=seg_index,
+                   scisuffix=scisuffix,
+                   glidersuffix=glidersuffix,
+                   scicount=count_suffix(seg_index, scisuffix, case_sensitive=True),
+                   flightcount=count_suffix(seg_index, glidersuffix, case_sensitive=True))
+
+    failed = set()
+    workdir = tempfile.mkdtemp(prefix=f'.queue-shards-{os.getpid()}-', dir=os.path.dirname(job['binarydir']))
+    try:
+        [(sharddir, __)] = make_shards(job['binarydir'], {seg: files}, 1, workdir)
+        metrics = convert_shard(sharddir, job['outdir'], cacdir, job['sensorlist'], job['deploymentyaml'],
+                                scisuffix, glidersuffix)
+    except Exception as e:
+        job['logging'].error(f'Segment {seg}: conversion failed: {e}')
+        failed.add(seg)
+        metrics = failed_convert_metrics([seg])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    finish_deployment(seg_job, mode, failed_segments=failed, metrics=[metrics], metrics_textfile_dir=metrics_textfile_dir,
+                      staging=staging)
+
+    return len(failed) == 0
+
+
+def convert_serial(job, cacdir):
+    """
+    Convert a deployment binary queue in this process with one pyglider call for all queued segments. If that
+    call fails, the segments are converted again one at a time, so only the segments that fail on their own are
+    left in the queue. Converted segments are recorded in the convert journal, so an interrupted run doesn't
+    convert them again.
+    :param job: deployment conversion job from prepare_deployment
+    :param cacdir: shared cache file directory
+    :return: set of segments that failed to convert, list of conversion metrics dictionaries
+    """
+    failed = set()
+    metrics = []
+    segments = group_files_by_segment(files_with_suffix(job['binary_index'], [job['scisuffix'], job['glidersuffix']],
+                                                        case_sensitive=True))
+    segments = {seg: files for seg, files in segments.items() if seg not in job['completed']}
+    if len(segments) == 0:
+        return failed, metrics
+
+    convert_args = (job['outdir'], cacdir, job['sensorlist'], job['deploymentyaml'], job['scisuffix'],
+                    job['glidersuffix'])
+    workdir = tempfile.mkdtemp(prefix=f'.queue-shards-{os.getpid()}-', dir=os.path.dirname(job['binarydir']))
+    try:
+        [(sharddir, __)] = make_shards(job['binarydir'], segments, 1, workdir)
+        try:
+            metrics.append(convert_shard(sharddir, *convert_args))
+        except Exception as e:
+            if len(segments) == 1:
+                job['logging'].error(f'Segment {next(iter(segments))}: conversion failed: {e}')
+                failed.update(segments)
+                metrics.append(failed_convert_metrics(list(segments)))
+                return failed, metrics
+            job['logging'].warning(f'Conversion of {len(segments)} segments failed ({e}), converting them one '
+                                   'segment at a time')
+        else:
+            journal_converted(job, list(segments))
+            return failed, metrics
+
+        # isolate the failing segments: nothing from the failed call was published, convert each segment on its own
+        shutil.rmtree(sharddir, ignore_errors=True)
+        retrydir = os.path.join(workdir, 'retry')
+        os.makedirs(retrydir)
+        for sharddir, shard_segments in make_shards(job['binarydir'], segments, len(segments), retrydir):
+            try:
+                metrics.append(convert_shard(sharddir, *convert_args))
+            except Exception as e:
+                job['logging'].error(f'Segment {shard_segments[0]}: conversion failed: {e}')
+                failed.update(shard_segments)
+                metrics.append(failed_convert_metrics(shard_segments))
+            else:
+                journal_converted(job, shard_segments)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return failed, metrics
+
+
+def convert_parallel(jobs, cacdir, workers):
+    """
+    Convert the binary queues of several deployments with a bounded pool of worker processes. Each deployment
+    queue is split into shards of whole segments. Before fanning out, the first segment of each deployment is
+    converted in this process against the shared cache directory, so the cache files for that glider's
+    sensor list exist before any worker starts. Workers convert using private copies of the cache directory
+    and publish any new cache files atomically.
+    :param jobs: list of deployment conversion jobs from prepare_deployment
+    :param cacdir: shared cache file directory
+    :param workers: maximum number of worker processes
+    :return: dictionary of deployment: set of segments that failed to convert,
+    dictionary of deployment: list of conversion metrics dictionaries
+    """
+    failed = {job['deployment']: set() for job in jobs}
+    metrics = {job['deployment']: [] for job in jobs}
+    workdirs = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for job in jobs:
+                logging = job['logging']
+                segments = group_files_by_segment(files_with_suffix(job['binary_index'],
+                                                                    [job['scisuffix'], job['glidersuffix']],
+                                                                    case_sensitive=True))
+                segments = {seg: files for seg, files in segments.items() if seg not in job['completed']}
+                if len(segments) == 0:
+                    continue
+
+                workdir = tempfile.mkdtemp(prefix=f'.queue-shards-{os.getpid()}-', dir=os.path.dirname(job['binarydir']))
+                workdirs.append(workdir)
+                convert_args = (job['outdir'], cacdir, job['sensorlist'], job['deploymentyaml'],
+                                job['scisuffix'], job['glidersuffix'])
+
+                # populate the shared cache files before the workers fan out
+                first_segment = next(iter(segments))
+                primedir = os.path.join(workdir, 'prime')
+                os.makedirs(primedir)
+                for f in segments.pop(first_segment):
+                    stage_file(os.path.join(job['binarydir'], f), os.path.join(primedir, f))
+                try:
+                    metrics[job['deployment']].append(convert_shard(primedir, *convert_args))
+                except Exception as e:
+                    logging.error(f'Segment {first_segment}: conversion failed: {e}')
+                    failed[job['deployment']].add(first_segment)
+                    metrics[job['deployment']].append(failed_convert_metrics([first_segment]))
+                else:
+                    journal_converted(job, [first_segment])
+
+                shards = make_shards(job['binarydir'], segments, workers, workdir)
+                logging.info(f'Converting {len(segments)} remaining segments in {len(shards)} shards with up to {workers} workers')
+                for sharddir, shard_segments in shards:
+                    future = executor.submit(convert_shard, sharddir, *convert_args, private_cache=True)
+                    futures.append((job, shard_segments, future))
+
+            for job, shard_segments, future in futures:
+                try:
+                    metrics[job['deployment']].append(future.result())
+                except Exception as e:
+                    job['logging'].error(f'Conversion failed for segments {", ".join(shard_segments)}: {e}')
+                    failed[job['deployment']].update(shard_segments)
+                    metrics[job['deployment']].append(failed_convert_metrics(shard_segments))
+                else:
+                    journal_converted(job, shard_segments)
+    finally:
+        for workdir in workdirs:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return failed, metrics
 
 
 def main(args):
@@ -27,130 +564,59 @@ def main(args):
     logFile_base = logfile_basename()
     logging_base = setup_logger('logging_base', loglevel, logFile_base)
 
-    data_home, deployments_root = cf.find_glider_deployments_rootdir(logging_base, test)
+    data_home, deployments_root = paths.find_glider_deployments_rootdir(logging_base, test)
 
     # Find the cache file directory
     cacdir = os.path.join(data_home, 'cac')
     if not os.path.isdir(cacdir):
         logging_base.error(f'cache file directory not found: {cacdir}')
+    else:
+        # private cache directories and cache files being published by workers that were killed
+        for name in remove_stale_tmp(cacdir):
+            logging_base.info(f'Removed {name} left in the cache file directory by an interrupted run')
     
     if isinstance(deployments_root, str):
 
-        for deployment in args.deployments:
-        # for deployment in [deployments]:
-
-            # find the deployment data filepaths
-            rawncdir, __, deployment_location = cf.find_glider_deployment_datapath(logging_base, deployment, deployments_root, mode)
-
-            binarydir = os.path.join(deployment_location, 'data', 'in', 'binary', 'queue')
-            outdir = os.path.join(deployment_location, 'data', 'in', 'rawnc', 'queue')
-
-            if not os.path.isdir(binarydir):
-                logging_base.error(f'{deployment} binary file data directory not found')
-                continue
-            
-            if not os.path.isdir(rawncdir):
-                logging_base.error(f'{deployment} raw NetCDF output file data directory not found')
-                continue
-
-            if not os.path.isdir(outdir):
-                logging_base.error(f'{deployment} raw NetCDF output file data directory not found')
-                continue
+        deployments = list(args.deployments)
+        if args.all_active:
+            # deployments with queued binary or raw netCDF files of this mode, from the cached deployments index
+            index = update_index(logging_base, deployments_root)
+            deployments.extend(d for d in active_deployments(index, mode) if d not in deployments)
+        if len(deployments) == 0:
+            if args.all_active:
+                logging_base.info(f'No deployments with queued {mode} files')
+                return 0
+            logging_base.error('No deployments provided, list deployment names or use --all-active')
+            return 1
 
-            if not os.path.isdir(os.path.join(deployment_location, 'proc-logs')):
-                logging_base.error(f'{deployment} deployment proc-logs directory not found')
+        jobs = []
+        locks = []
+        for deployment in deployments:
+        # for deployment in [deployments]:
+            # one process at a time converts a deployment dataset mode, the lock is held until the run is finished
+            lockfile = lock_deployment(logging_base, deployment, deployments_root, mode, args.lock_timeout)
+            if lockfile is None:
                 continue
+            locks.append(lockfile)
+            job = prepare_deployment(logging_base, deployment, deployments_root, mode, loglevel)
+            if job is not None:
+                jobs.append(job)
 
-            logfilename = logfile_deploymentname(deployment, mode, 'proc_binary_to_rawnc')
-            logFile = os.path.join(deployment_location, 'proc-logs', logfilename)
-            logging = setup_logger('logging', loglevel, logFile)
-
-            # Set the deployment configuration path
-            deployment_config_root = os.path.join(deployment_location, 'config', 'proc')
-            if not os.path.isdir(deployment_config_root):
-                logging.warning(f'Invalid deployment config root: {deployment_config_root}')
-
-            # Find metadata files
-            deploymentyaml = os.path.join(deployment_config_root, 'deployment.yml')
-            if not os.path.isfile(deploymentyaml):
-                logging.warning(f'Invalid deployment.yaml file: {deploymentyaml}')
-            
-            # Find sensor list for processing binary files
-            sensorlist = os.path.join(deployment_config_root, 'sensors.txt')
-            if not os.path.isfile(sensorlist):
-                logging.warning(f'Invalid sensors.txt file: {sensorlist}')
-            
-            if mode == 'rt':
-                scisuffix = 'tbd'
-                glidersuffix = 'sbd'
-            elif mode == 'delayed':
-                scisuffix = 'ebd'
-                glidersuffix = 'dbd'
+        try:
+            if args.workers > 1:
+                failed, metrics = convert_parallel(jobs, cacdir, args.workers)
+                for job in jobs:
+                    finish_deployment(job, mode, failed_segments=failed[job['deployment']],
+                                      metrics=metrics[job['deployment']],
+                                      metrics_textfile_dir=args.metrics_textfile_dir, staging=args.staging)
             else:
-                logging.warning(f'Invalid mode provided: {mode}')
-                continue
-            
-            logging.info(f'Processing: {deployment} {mode}')
-
-            # convert binary *.T/EBD and *.S/DBD into *.t/ebd.nc and *.s/dbd.nc netcdf files.
-            logging.info(f'Converting binary *.{scisuffix} and *.{glidersuffix} into *.{scisuffix}.nc and *.{glidersuffix}.nc netcdf files')
-            logging.info(f'Binary filepath: {binarydir}')
-            logging.info(f'Output filepath: {outdir}')
-
-            # log the number of binary files to be converted
-            scicount = len([f for f in os.listdir(binarydir) if f.endswith(f'.{scisuffix}')])
-            if scicount == 0:
-                scisuffix = scisuffix.upper()
-                scicount = len([f for f in os.listdir(binarydir) if f.endswith(f'.{scisuffix}')])
-            flightcount = len([f for f in os.listdir(binarydir) if f.endswith(f'.{glidersuffix}')])
-            if flightcount == 0:
-                glidersuffix = glidersuffix.upper()
-                flightcount = len([f for f in os.listdir(binarydir) if f.endswith(f'.{glidersuffix}')])
-
-            slocum.binary_to_rawnc(binarydir, outdir, cacdir, sensorlist, deploymentyaml, incremental=True, scisuffix=scisuffix, glidersuffix=glidersuffix)
-
-            # Files are written to ./data/in/rawnc/queue for the next step in processing
-            # Copy those files to rawncdir
-            for f in os.listdir(outdir):
-                if f.endswith(f'.{scisuffix}.nc') or f.endswith(f'.{glidersuffix}.nc'):
-                    shutil.copy(os.path.join(outdir, f), os.path.join(rawncdir, f))
-
-            # log how many files were successfully converted from binary to *.nc
-            oscicount = len([f for f in os.listdir(outdir) if f.endswith(f'.{scisuffix}.nc')])
-            if oscicount == 0:
-                scisuffix = scisuffix.lower()
-                oscicount = len([f for f in os.listdir(outdir) if f.endswith(f'.{scisuffix}.nc')])
-            oflightcount = len([f for f in os.listdir(outdir) if f.endswith(f'.{glidersuffix}.nc')])
-            if oflightcount == 0:
-                glidersuffix = glidersuffix.lower()
-                oflightcount = len([f for f in os.listdir(outdir) if f.endswith(f'.{glidersuffix}.nc')])
-            logging.info(f'Successfully converted {oscicount} of {scicount} science binary files with suffix *.{scisuffix}')
-            logging.info(f'Successfully converted {oflightcount} of {flightcount} engineering binary files with suffix *.{glidersuffix}')
-
-            # Check the file names in ./data/in/rawnc/queue
-            # If there aren't a pair of files (sbd/tbd or dbd/ebd) check the files in rawncdir 
-            # and copy them to ./data/in/rawnc/queue for the next step in processing.
-            # This is necessary for the rt data processing because the binary files are processed as 
-            # they are received from the glider and there may be a delay in receiving the other file type.
-            if mode == 'rt':
-                for f in os.listdir(outdir):
-                    seg = f.split('.')[0]
-                    # look for this segment in rawncdir
-                    rawncmatch = [
-                        filename for filename in os.listdir(rawncdir)
-                        if seg in filename and filename.endswith('.nc')
-                    ]
-                    queued_files = set(os.listdir(outdir))
-                    for rnm in rawncmatch:
-                        if rnm not in queued_files:
-                            shutil.copy(os.path.join(rawncdir, rnm), os.path.join(outdir, rnm))
-                
-            # once all binary files have been processed, remove the files from ./data/in/binary/queue
-            for f in os.listdir(binarydir):
-                if f.endswith(f'.{scisuffix}') or f.endswith(f'.{glidersuffix}'):
-                    os.remove(os.path.join(binarydir, f))
-
-            logging.info(f'Finished converting binary files to raw netcdf files')
+                for job in jobs:
+                    failed, metrics = convert_serial(job, cacdir)
+                    finish_deployment(job, mode, failed_segments=failed, metrics=metrics,
+                                      metrics_textfile_dir=args.metrics_textfile_dir, staging=args.staging)
+        finally:
+            for lockfile in locks:
+                release_lock(lockfile)
 
 
 if __name__ == '__main__':
@@ -161,26 +627,10 @@ if __name__ == '__main__':
     # main(deploy, mode, ll, test)
     arg_parser = argparse.ArgumentParser(description=main.__doc__,
                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    
-    arg_parser.add_argument('deployments',
-                            nargs='+',
-                            help='Glider deployment name(s) formatted as glider-YYYYmmddTHHMM')
-    
-    arg_parser.add_argument('-m', '--mode',
-                            help='Dataset mode: real-time (rt) or delayed-mode (delayed)',
-                            choices=['rt', 'delayed'],
-                            default='rt')
-    
-    arg_parser.add_argument('-l', '--loglevel',
-                            help='Verbosity level',
-                            type=str,
-                            choices=['debug', 'info', 'warning', 'error'],
-                            default='info')
-    
-    arg_parser.add_argument('-test', '--test',
-                            help='Point to the environment variable key GLIDER_DATA_HOME_TEST for testing.',
-                            action='store_true')
+
+    add_convert_arguments(arg_parser)
     
     parsed_args = arg_parser.parse_args()
+    configure_logging(parsed_args.log_root, parsed_args.log_format)
     
     sys.exit(main(parsed_args))
@@ -18,19 +18,195 @@ Writes the deployment.yml file that is used to convert raw glider data files to
 import os
 import argparse
 import sys
-import yaml
 import json
-import ruglider_processing.common as cf
-from ruglider_processing.loggers import logfile_basename, setup_logger, logfile_deploymentname
+import hashlib
+import yaml
+import ruglider_processing.paths as paths
+from ruglider_processing.cli import add_deploymentyaml_arguments
+from ruglider_processing.config import file_content_hash, load_config_layer
+from ruglider_processing.loggers import logfile_basename, setup_logger, logfile_deploymentname, configure_logging
+from ruglider_processing.sensordefs import load_sensor_index, source_variable_map
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
+# bump when the way deployment.yml is generated changes, so all deployment.yml files are regenerated
+GENERATOR_VERSION = 1
+
+# input files in ../config/proc used to generate deployment.yml
+INPUT_FILES = ['deployment-template.yml', 'deployment-globalattrs.yml', 'platform.yml', 'instruments.json',
+               'sensor_defs-raw.json', 'sensor_defs-sci_profile.json', 'sensors.txt']
+
+
+def inputs_path(deploymentyaml):
+    # record of the inputs deployment.yml was generated from, e.g. ../config/proc/.deployment.yml.inputs
+    dirname, basename = os.path.split(deploymentyaml)
+    return os.path.join(dirname, f'.{basename}.inputs')
+
+
+def inputs_hash(deployment, deployment_config_root):
+    """
+    Hash the contents of the input files (and the deployment name) used to generate deployment.yml
+    :return: hex digest, None if any of the input files is missing
+    """
+    h = hashlib.sha256(f'{GENERATOR_VERSION}:{deployment}'.encode())
+    for f in INPUT_FILES:
+        filepath = os.path.join(deployment_config_root, f)
+        if not os.path.isfile(filepath):
+            return None
+        h.update(f'{f}:{file_content_hash(filepath)}'.encode())
+
+    return h.hexdigest()
+
+
+def deploymentyaml_current(deploymentyaml, input_hash):
+    # True if deployment.yml was generated from the same inputs and hasn't been modified since
+    try:
+        with open(inputs_path(deploymentyaml), 'r') as f:
+            record = json.load(f)
+        st = os.stat(deploymentyaml)
+    except (OSError, ValueError):
+        return False
+
+    return record.get('inputs') == input_hash and record.get('output') == [st.st_mtime_ns, st.st_size]
+
+
+def write_deploymentyaml(template_data, deploymentyaml, input_hash):
+    # write deployment.yml atomically and record the inputs it was generated from
+    tmpfile = f'{deploymentyaml}.{os.getpid()}.tmp'
+    try:
+        with open(tmpfile, 'w') as outfile:
+            yaml.dump(template_data, outfile, Dumper=SafeDumper, default_flow_style=False)
+        os.replace(tmpfile, deploymentyaml)
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+    st = os.stat(deploymentyaml)
+    with open(inputs_path(deploymentyaml), 'w') as f:
+        json.dump(dict(inputs=input_hash, output=[st.st_mtime_ns, st.st_size]), f)
+
+
+def build_deployment_config(deployment, deployment_config_root, logging):
+    """
+    Build the deployment.yml contents for a deployment from the config files in deployment_config_root.
+    Layers that are shared by many deployments (template, sensor definitions, instruments) are parsed once
+    per distinct file content in this process.
+    :param deployment: glider deployment name e.g. ru44-20250306T0038
+    :param deployment_config_root: deployment config directory (../config/proc)
+    :param logging: logger object
+    :return: deployment.yml dictionary, None if the config files are missing or invalid
+    """
+    # Read in the deployment-template.yml file
+    templatefile = os.path.join(deployment_config_root, 'deployment-template.yml')
+    if os.path.isfile(templatefile):
+        try:
+            template_data = load_config_layer(templatefile)  # Parse the YAML file
+        except yaml.YAMLError as e:
+            logging.error(f"Error reading YAML file {templatefile}: {e}")
+            return None
+    else:
+        logging.error(f"Template file not found: {templatefile}")
+        return None
+
+    # Read in the deployment specific global attributes from deployment-globalattrs.yml
+    # and update the template_data['metadata'] dictionary
+    globalattrsfile = os.path.join(deployment_config_root, 'deployment-globalattrs.yml')
+    if os.path.isfile(globalattrsfile):
+        try:
+            deployment_global_attrs = load_config_layer(globalattrsfile)  # Parse the YAML file
+            if 'metadata' in template_data.keys():
+                template_data['metadata'].update(deployment_global_attrs)
+            else:
+                template_data['metadata'] = deployment_global_attrs
+        except yaml.YAMLError as e:
+            logging.error(f"Error reading YAML file {globalattrsfile}: {e}")
+            return None
+    else:
+        logging.error(f"deployment_globalattrs.yml file not found: {globalattrsfile}")
+        return None
+
+    # Read in the platform metadata from platform.yml
+    template_data['platform'] = dict()
+    platformfile = os.path.join(deployment_config_root, 'platform.yml')
+    if os.path.isfile(platformfile):
+        try:
+            platform_metadata = load_config_layer(platformfile)  # Parse the YAML file
+            if 'platform' in template_data.keys():
+                template_data['platform'].update(platform_metadata['platform'])
+            else:
+                template_data['platform'] = platform_metadata['platform']
+        except yaml.YAMLError as e:
+            logging.error(f"Error reading YAML file {platformfile}: {e}")
+            return None
+    else:
+        logging.error(f"platform.yml file not found: {platformfile}")
+        return None
+
+    # add extra info to the global attributes
+    template_data['metadata']['wmo_id'] = platform_metadata['platform']['wmo_id']
+    template_data['metadata']['wmo_platform_code'] = platform_metadata['platform']['wmo_platform_code']
+    template_data['metadata']['deployment'] = deployment
+    template_data['metadata']['deployment_name'] = deployment
+    template_data['metadata']['glider_name'] = platform_metadata['glider']
+    template_data['metadata']['glider_serial'] = platform_metadata['platform']['serial_number']
+
+    # find and open instruments.json
+    instrumentsfile = os.path.join(deployment_config_root, 'instruments.json')
+    if os.path.isfile(instrumentsfile):
+        instruments = load_config_layer(instrumentsfile)
+    else:
+        logging.error(f"instruments.json file not found: {instrumentsfile}")
+        return None
+
+    # add all of the instruments from instruments.json to template_data['instruments']
+    template_data['instruments'] = dict()
+    for instrument in instruments:
+        template_data['instruments'][instrument['nc_var_name']] = instrument['attrs']
 
+    # combine both sensor_defs.json files
+    # (indexed once and cached until the files change, see ruglider_processing.sensordefs)
+    sdraw = os.path.join(deployment_config_root, 'sensor_defs-raw.json')
+    sdprofile = os.path.join(deployment_config_root, 'sensor_defs-sci_profile.json')
+    sensor_index = load_sensor_index([sdraw, sdprofile])
 
-def is_sensor_listed_as_source(sensor, template_data):
-    # Check if the sensor is listed as a source in netcdf_variables
-    netcdf_variables = template_data.get('netcdf_variables', {})
-    for var, attributes in netcdf_variables.items():
-        if attributes.get('source') == sensor:
-            return True
-    return False
+    # find and open sensors.txt
+    sensorsfile = os.path.join(deployment_config_root, 'sensors.txt')
+    if os.path.isfile(sensorsfile):
+        with open(sensorsfile, 'r') as file:
+            sensors = file.readlines()  # Read all lines into a list
+            sensors = [sensor.strip() for sensor in sensors]  # Strip whitespace characters like `\n` at the end of each line
+    else:
+        logging.error(f"sensors.txt file not found: {sensorsfile}")
+        return None
+
+    # add all of the variables from sensors.txt to template_data['netcdf_variables']
+    source_map = source_variable_map(template_data['netcdf_variables'])
+    for sensor in sensors:
+        # Check if the sensor is listed as a source in netcdf_variables
+        if sensor in source_map:
+            continue  # it's already in deployment.yml so skip this variable
+        else:
+            # find the variable information in sensor_defs and add to the deployment.yml file
+            try:
+                sensor_info = sensor_index[sensor]
+                keyname = sensor_info['nc_var_name']
+                if keyname in template_data['netcdf_variables']:
+                    # the variable is replaced, so its previous source is no longer listed
+                    source_map.pop(template_data['netcdf_variables'][keyname].get('source'), None)
+                template_data['netcdf_variables'][keyname] = {}
+                template_data['netcdf_variables'][keyname]['source'] = sensor
+                template_data['netcdf_variables'][keyname].update(sensor_info['attrs'])
+            except KeyError:
+                keyname = sensor
+                template_data['netcdf_variables'][sensor] = {}
+                template_data['netcdf_variables'][sensor]['source'] = sensor
+                logging.warning(f'No information found for {sensor} in sensor_defs-raw.json or sensor_defs-sci_profile.json')
+            source_map[sensor] = keyname
+
+    return template_data
 
 
 def main(args):
@@ -43,150 +219,73 @@ def main(args):
     logFile_base = logfile_basename()
     logging_base = setup_logger('logging_base', loglevel, logFile_base)
 
-    data_home, deployments_root = cf.find_glider_deployments_rootdir(logging_base, test)
+    data_home, deployments_root = paths.find_glider_deployments_rootdir(logging_base, test)
     
     if isinstance(deployments_root, str):
 
-        for deployment in args.deployments:
+        deployments = list(args.deployments)
+        if args.all:
+            # every deployment under the deployments root that has a deployment-template.yml
+            deployments.extend(d for d in paths.find_deployments(deployments_root) if d not in deployments)
+        if len(deployments) == 0:
+            logging_base.error('No deployments provided, list deployment names or use --all')
+            return 1
+
+        regenerated = 0
+        skipped = 0
+        failed = 0
+        for deployment in deployments:
         # for deployment in [deployments]:
 
             # find the deployment binary data filepath
-            deployment_location = cf.find_glider_deployment_location(logging_base, deployment, deployments_root)
+            deployment_location = paths.find_glider_deployment_location(logging_base, deployment, deployments_root)
 
-            if not os.path.isdir(os.path.join(deployment_location, 'proc-logs')):
+            if not deployment_location or not os.path.isdir(os.path.join(deployment_location, 'proc-logs')):
                 logging_base.error(f'{deployment} deployment proc-logs directory not found')
+                failed += 1
+                continue
+
+            # Set the deployment configuration path
+            deployment_config_root = os.path.join(deployment_location, 'config', 'proc')
+            if args.all and not os.path.isfile(os.path.join(deployment_config_root, 'deployment-template.yml')):
+                # not configured yet
                 continue
 
             logfilename = logfile_deploymentname(deployment, 'configure', 'deploymentyaml')
             logFile = os.path.join(deployment_location, 'proc-logs', logfilename)
-            logging = setup_logger('logging', loglevel, logFile)
+            logging = setup_logger(f'logging_deploymentyaml_{deployment}', loglevel, logFile)
 
-            # Set the deployment configuration path
-            deployment_config_root = os.path.join(deployment_location, 'config', 'proc')
             if not os.path.isdir(deployment_config_root):
                 logging.warning(f'Invalid deployment config root: {deployment_config_root}')
 
-            # Read in the deployment-template.yml file
-            templatefile = os.path.join(deployment_config_root, 'deployment-template.yml')
-            if os.path.isfile(templatefile):
-                with open(templatefile, 'r') as file:
-                    try:
-                        template_data = yaml.safe_load(file)  # Parse the YAML file
-                    except yaml.YAMLError as e:
-                        logging.error(f"Error reading YAML file {templatefile}: {e}")
-                        continue
-            else:
-                logging.error(f"Template file not found: {templatefile}")
+            # skip deployments whose deployment.yml was generated from the same inputs
+            deploymentyaml = os.path.join(deployment_config_root, 'deployment.yml')
+            input_hash = inputs_hash(deployment, deployment_config_root)
+            if not args.force and input_hash and deploymentyaml_current(deploymentyaml, input_hash):
+                logging.info(f'deployment.yml is up to date with its input files, skipping: {deploymentyaml}')
+                skipped += 1
                 continue
 
-            # Read in the deployment specific global attributes from deployment-globalattrs.yml
-            # and update the template_data['metadata'] dictionary
-            globalattrsfile = os.path.join(deployment_config_root, 'deployment-globalattrs.yml')
-            if os.path.isfile(globalattrsfile):
-                with open(globalattrsfile, 'r') as file:
-                    try:
-                        deployment_global_attrs = yaml.safe_load(file)  # Parse the YAML file
-                        if 'metadata' in template_data.keys():
-                            template_data['metadata'].update(deployment_global_attrs)
-                        else:
-                            template_data['metadata'] = deployment_global_attrs
-                    except yaml.YAMLError as e:
-                        logging.error(f"Error reading YAML file {globalattrsfile}: {e}")
-                        continue
-            else:
-                logging.error(f"deployment_globalattrs.yml file not found: {globalattrsfile}")
+            template_data = build_deployment_config(deployment, deployment_config_root, logging)
+            if template_data is None:
+                failed += 1
                 continue
 
-            # Read in the platform metadata from platform.yml
-            template_data['platform'] = dict()
-            platformfile = os.path.join(deployment_config_root, 'platform.yml')
-            if os.path.isfile(platformfile):
-                with open(platformfile, 'r') as file:
-                    try:
-                        platform_metadata = yaml.safe_load(file)  # Parse the YAML file
-                        if 'platform' in template_data.keys():
-                            template_data['platform'].update(platform_metadata['platform'])
-                        else:
-                            template_data['platform'] = platform_metadata['platform']
-                    except yaml.YAMLError as e:
-                        logging.error(f"Error reading YAML file {platformfile}: {e}")
-                        continue
-            else:
-                logging.error(f"platform.yml file not found: {platformfile}")
-                continue
+            # Write the final deployment.yml file
+            try:
+                write_deploymentyaml(template_data, deploymentyaml, input_hash)
+                logging.info(f'Successfully wrote deployment.yml file: {deploymentyaml}')
+                regenerated += 1
+            except (yaml.YAMLError, OSError) as e:
+                logging.error(f"Error writing YAML file {deploymentyaml}: {e}")
+                failed += 1
 
-            # add extra info to the global attributes
-            template_data['metadata']['wmo_id'] = platform_metadata['platform']['wmo_id']
-            template_data['metadata']['wmo_platform_code'] = platform_metadata['platform']['wmo_platform_code']
-            template_data['metadata']['deployment'] = deployment
-            template_data['metadata']['deployment_name'] = deployment
-            template_data['metadata']['glider_name'] = platform_metadata['glider']
-            template_data['metadata']['glider_serial'] = platform_metadata['platform']['serial_number']
-
-            # find and open instruments.json
-            instrumentsfile = os.path.join(deployment_config_root, 'instruments.json')
-            if os.path.isfile(instrumentsfile):
-                with open(instrumentsfile, 'r') as file:
-                    instruments = json.load(file)
-            else:
-                logging.error(f"instruments.json file not found: {instrumentsfile}")
-                continue
+        summary = f'deployment.yml files: {regenerated} regenerated, {skipped} skipped (inputs unchanged), {failed} failed'
+        logging_base.info(summary)
+        print(summary)
 
-            # add all of the instruments from instruments.json to template_data['instruments']
-            template_data['instruments'] = dict()
-            for instrument in instruments:
-                template_data['instruments'][instrument['nc_var_name']] = instrument['attrs']
-
-            # combine both sensor_defs.json files
-            sdraw = os.path.join(deployment_config_root, 'sensor_defs-raw.json')
-            sdprofile = os.path.join(deployment_config_root, 'sensor_defs-sci_profile.json')
-            with open(sdraw, 'r') as file:
-                sdraw_data = json.load(file)
-            with open(sdprofile, 'r') as file:
-                sdprofile_data = json.load(file)
-            combined_data = sdraw_data.copy()
-            combined_data.update(sdprofile_data)
-            
-            # find and open sensors.txt
-            sensorsfile = os.path.join(deployment_config_root, 'sensors.txt')
-            if os.path.isfile(sensorsfile):
-                with open(sensorsfile, 'r') as file:
-                    sensors = file.readlines()  # Read all lines into a list
-                    sensors = [sensor.strip() for sensor in sensors]  # Strip whitespace characters like `\n` at the end of each line
-            else:
-                logging.error(f"sensors.txt file not found: {sensorsfile}")
-                continue
+        return 1 if failed else 0
 
-            # add all of the variables from sensors.txt to template_data['netcdf_variables']
-            for sensor in sensors:
-                # Check if the sensor is listed as a source in netcdf_variables
-                check = is_sensor_listed_as_source(sensor, template_data)
-                if check:
-                    continue  # it's already in deployment.yml so skip this variable
-                else:
-                    # find the variable information in sensor_defs and add to the deployment.yml file
-                    try:
-                        sensor_info = combined_data[sensor]
-                        keyname = sensor_info['nc_var_name']
-                        template_data['netcdf_variables'][keyname] = {}
-                        template_data['netcdf_variables'][keyname]['source'] = sensor
-                        for key, value in sensor_info['attrs'].items():
-                            if key in ['axis', 'units', 'long_name', 'standard_name', 'valid_min', 'valid_max', 'fill_value']:
-                                template_data['netcdf_variables'][keyname][key] = value
-                    except KeyError:
-                        template_data['netcdf_variables'][sensor] = {}
-                        template_data['netcdf_variables'][sensor]['source'] = sensor
-                        logging.warning(f'No information found for {sensor} in sensor_defs-raw.json or sensor_defs-sci_profile.json')
-            
-            # Write the final deployment.yml file
-            deploymentyaml = os.path.join(deployment_config_root, 'deployment.yml')
-            with open(deploymentyaml, 'w') as outfile:
-                try:
-                    yaml.dump(template_data, outfile, default_flow_style=False)
-                    logging.info(f'Successfully wrote deployment.yml file: {deploymentyaml}')
-                except yaml.YAMLError as e:
-                    logging.error(f"Error writing YAML file {deploymentyaml}: {e}")
-            
 
 if __name__ == '__main__':
     # deploy = 'ru39-20250423T1535'  #  ru44-20250306T0038 ru44-20250325T0438 ru39-20250423T1535
@@ -195,21 +294,10 @@ if __name__ == '__main__':
     # main(deploy, ll, test)
     arg_parser = argparse.ArgumentParser(description=main.__doc__,
                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    
-    arg_parser.add_argument('deployments',
-                            nargs='+',
-                            help='Glider deployment name(s) formatted as glider-YYYYmmddTHHMM')
-    
-    arg_parser.add_argument('-l', '--loglevel',
-                            help='Verbosity level',
-                            type=str,
-                            choices=['debug', 'info', 'warning', 'error'],
-                            default='info')
-    
-    arg_parser.add_argument('-test', '--test',
-                            help='Point to the environment variable key GLIDER_DATA_HOME_TEST for testing.',
-                            action='store_true')
+
+    add_deploymentyaml_arguments(arg_parser)
     
     parsed_args = arg_parser.parse_args()
+    configure_logging(parsed_args.log_root, parsed_args.log_format)
     
     sys.exit(main(parsed_args))
@@ -11,58 +11,577 @@ import os
 import argparse
 import sys
 import glob
+import multiprocessing as mp
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import yaml
 import xarray as xr
 import numpy as np
-from netCDF4 import default_fillvals
 import pyglider.slocum as slocum
 import ruglider_processing.common as cf
-from ruglider_processing.loggers import logfile_basename, setup_logger, logfile_deploymentname
-
-
-def add_profile_vars(dataset, add_var, profile_meta, template_var='profile_id'):
-    v = np.zeros(np.shape(dataset[template_var]))
-    if np.any(dataset[template_var] != 0):
-        sourcevar = profile_meta[add_var]['source']
-        unique_ids = np.unique(dataset[template_var].values)
-        for i in unique_ids:
-            if i != 0:
-                idx = np.where(dataset[template_var] == i)[0]
-                v[idx] = np.nanmean(dataset[sourcevar].values[idx])
+import ruglider_processing.paths as paths
+from ruglider_processing.cli import add_merge_arguments
+from ruglider_processing.config import load_deployment_config
+from ruglider_processing.ncwrite import build_dataset_encoding, constant_dataarray, write_netcdf_chunked
+from ruglider_processing.encoding import resolve_encoding_profile
+from ruglider_processing.manifest import manifest_path, load_manifest, save_manifest, segment_unchanged, segment_entry
+from ruglider_processing.journal import merge_journal_path, append_journal, read_journal, clear_journal, remove_stale_tmp
+from ruglider_processing.preflight import resolve_preflight_settings, check_segment
+from ruglider_processing.aggregate import store_path, update_store
+from ruglider_processing.locks import lock_deployment, release_lock
+from ruglider_processing.deployindex import update_index, active_deployments
+from ruglider_processing.catalog import catalog_path, open_catalog, profile_summaries, upsert_segment, sync_catalog
+from ruglider_processing.metrics import new_metrics, timed_phase, finish_metrics, file_bytes, peak_rss_mb, \
+    reset_peak_rss, metrics_path, write_metrics, write_prometheus_textfile
+from ruglider_processing.loggers import logfile_basename, setup_logger, logfile_deploymentname, \
+    setup_queue_listener, setup_worker_logger, get_worker_logger, WORKER_LOGGER_NAME, configure_logging
+
+
+def add_profile_vars(dataset, add_vars, profile_meta, template_var='profile_id'):
+    """
+    Add profile variables (e.g. profile_lat, profile_lon) to the dataset, calculated as the mean of the
+    source variable for each profile. All variables are calculated in one pass over the profile index.
+    :param dataset: xarray dataset containing the profile index and source variables
+    :param add_vars: list of profile variable names to add, e.g. ['profile_lat', 'profile_lon']
+    :param profile_meta: dictionary of profile variable metadata from deployment.yml (profile_variables)
+    :param template_var: name of the profile index variable
+    """
+    sources = [dataset[profile_meta[add_var]['source']].values for add_var in add_vars]
+    profile_means = cf.profile_nanmeans(dataset[template_var].values, sources)
+
+    for add_var, v in zip(add_vars, profile_means):
+        da = xr.DataArray(v, coords=dataset[template_var].coords, dims=dataset[template_var].dims,
+                          name=add_var, attrs=profile_meta[add_var])
+
+        dataset[add_var] = da
+
+
+def merge_segment(seg, queuedir, outdir, deploymentyaml, deployment_meta, deployment, profile_filter_time, logger,
+                  chunk_size=None, encoding_settings=None, metrics=None):
+    """
+    Merge the raw netcdf files for one glider segment into a timeseries netcdf file in outdir
+    :param seg: segment name e.g. ru44-2025-098-0-0
+    :param queuedir: directory containing the raw *.s/dbd.nc and *.t/ebd.nc files
+    :param outdir: output directory for the merged timeseries file
+    :param deploymentyaml: path to the deployment.yml file
+    :param deployment_meta: parsed contents of deployment.yml
+    :param deployment: glider deployment name e.g. ru44-20250306T0038
+    :param profile_filter_time: profile finding filter time (seconds)
+    :param logger: logger object
+    :param chunk_size: optional number of rows to write at a time (chunked mode), by default the
+    merged dataset is written in one call to to_netcdf. This only bounds the encoded copy made for the write,
+    pyglider still reads and merges the whole segment in memory.
+    :param encoding_settings: optional encoding profile from resolve_encoding_profile (default profile if not provided)
+    :param metrics: optional metrics dictionary from new_metrics, filled in with the phase timings, rows and bytes
+    :return: path to the merged file (None if there was nothing to write), list of profile summaries for the
+    profile catalog (see ruglider_processing.catalog.profile_summaries)
+    """
+    logger.debug(f'Segment {seg}: merging')
+    # the peak memory of this segment (new_metrics already reset it when there's a metrics record)
+    peak_reset = metrics['peak_reset'] if metrics is not None else reset_peak_rss()
+    # pyglider reads and merges the raw files and indexes the profiles in one call
+    with timed_phase(metrics, 'read_merge'):
+        ds, savefile, source_file = slocum.raw_segment_to_timeseries(queuedir,
+                                                                     outdir,
+                                                                     deploymentyaml,
+                                                                     logger,
+                                                                     profile_filt_time=profile_filter_time,
+                                                                     profile_min_time=60,
+                                                                     segment=seg)
+
+    if ds is None:
+        return None, []
+
+    # add profile_lat and profile_lon
+    with timed_phase(metrics, 'profile_vars'):
+        add_profile_vars(ds, ['profile_lat', 'profile_lon'], deployment_meta['profile_variables'])
+
+    # add source_file variable
+    # (constant for the segment: a broadcast view rather than a full-length string array, written as a
+    # compressed char array by build_encoding)
+    da = constant_dataarray(source_file, ds['time'])
+    da.name = 'source_file'
+    da.attrs = {'comment': 'Name of the source data file: full_filename(the8x3_filename)'}
+    ds['source_file'] = da
+
+    # add trajectory variable
+    da = constant_dataarray(deployment, ds['time'])
+    da.name = 'trajectory'
+    da.attrs = {'comment': 'A trajectory is a single deployment of a glider and may span multiple data files.',
+                'long_name': 'Trajectory/Deployment Name'}
+    ds['trajectory'] = da
+
+    # add platform metadata variable
+    da = xr.DataArray(np.array(np.nan), name='platform', attrs=deployment_meta['platform'])
+    ds['platform'] = da
     
-    da = xr.DataArray(v, coords=dataset[template_var].coords, dims=dataset[template_var].dims, 
-                      name=add_var, attrs=profile_meta[add_var])
+    # add instrument metadata variables
+    for ncvar_name, attributes in deployment_meta.get('instruments', {}).items():
+        da = xr.DataArray(np.array(np.nan), name=ncvar_name, attrs=attributes)
+        ds[ncvar_name] = da
     
-    dataset[add_var] = da
-
-
-def build_encoding(encoding_dict, ds, variable):
-    # set the fill value using netCDF4.default_fillvals
-    if variable == 'time':
-        encoding_dict[variable] = {
-            'zlib': True,
-            'complevel': 1,
-            'dtype': np.float64,
-            '_FillValue': default_fillvals['f8'],
-            'units': 'seconds since 1970-01-01T00:00:00Z',
-            'calendar': 'gregorian'
-            }
-    else:
-        encoding_type = f'{ds[variable].dtype.kind}{ds[variable].dtype.itemsize}'
+    # add variable encoding
+    with timed_phase(metrics, 'encoding'):
+        sources = {k: v.get('source') for k, v in deployment_meta.get('netcdf_variables', dict()).items()}
+        encoding = build_dataset_encoding(ds, encoding_settings, sources, chunk_size)
+
+    outname = os.path.join(outdir, savefile)
+    logger.info(f'Writing {outname}')
+    # write to a temporary file and rename, so an interrupted write never leaves a truncated file in the output directory
+    tmpname = f'{outname}.{os.getpid()}.tmp'
+    with timed_phase(metrics, 'write'):
         try:
-            fillvalue = default_fillvals[encoding_type]
-            zlib = True
-        except KeyError:
-            fillvalue = ""
-            zlib = False
-        encoding_dict[variable] = {
-            'zlib': zlib,
-            'complevel': 1,
-            'dtype': ds[variable].dtype,
-            '_FillValue': fillvalue
-        }
+            if chunk_size:
+                write_netcdf_chunked(ds, tmpname, encoding, chunk_size)
+            else:
+                ds.to_netcdf(
+                    tmpname, 'w', encoding=encoding
+                )
+            os.replace(tmpname, outname)
+        finally:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+    logger.info(f'Segment {seg}: {ds.sizes["time"]} rows, peak memory {peak_rss_mb():.0f} MB'
+                f'{"" if peak_reset else " (largest of the process so far)"}')
+
+    if metrics is not None:
+        metrics['rows'] = ds.sizes['time']
+        metrics['files'] = 1
+        metrics['bytes_written'] = file_bytes([outname])
+
+    profiles = profile_summaries(ds, source_file)
+
+    # # for testing
+    # savefile = savefile.replace('.nc', '.csv')
+    # outcsv = os.path.join(outdir, savefile)
+    # ds.to_dataframe().to_csv(outcsv)
+
+    return outname, profiles
+
+
+def merge_segment_safe(seg, merge_kwargs, logger):
+    """
+    Merge one segment, logging (rather than raising) any error so the remaining segments are still processed
+    :return: success flag, path to the merged file, list of profile summaries, metrics dictionary
+    """
+    metrics = new_metrics('merge', seg)
+    metrics['bytes_read'] = file_bytes(glob.glob(os.path.join(merge_kwargs['queuedir'], f'{seg}.*')))
+    try:
+        outname, profiles = merge_segment(seg, logger=logger, metrics=metrics, **merge_kwargs)
+    except Exception as e:
+        logger.error(f'Segment {seg}: merge failed, leaving files in the queue directory: {e}', exc_info=True)
+        return False, None, [], finish_metrics(metrics, success=False)
+
+    return True, outname, profiles, finish_metrics(metrics)
+
+
+def _merge_segment_worker(seg, merge_kwargs):
+    # runs in a process pool worker, log records are sent back to the deployment log by the QueueListener
+    return merge_segment_safe(seg, merge_kwargs, get_worker_logger())
+
+
+def merge_segments(segments, merge_kwargs, workers, logger, loglevel, on_result=None):
+    """
+    Merge each segment, one at a time or in a pool of worker processes. Segments don't share any state
+    so they can be merged in any order, results are always returned in the order of segments.
+    :param segments: sorted list of segment names
+    :param merge_kwargs: keyword arguments for merge_segment
+    :param workers: number of worker processes, 1 merges the segments in this process
+    :param logger: deployment logger object
+    :param loglevel: logging level e.g. 'INFO'
+    :param on_result: optional function called with (segment, result) as soon as each segment is finished
+    :return: list of (segment, (success, outname, profiles, metrics))
+    """
+    results = dict()
+
+    def finished(seg, result):
+        results[seg] = result
+        if on_result is not None:
+            on_result(seg, result)
+
+    if workers <= 1 or len(segments) <= 1:
+        for seg in segments:
+            finished(seg, merge_segment_safe(seg, merge_kwargs, logger))
+        return [(seg, results[seg]) for seg in segments]
+
+    log_queue = mp.Queue()
+    listener = setup_queue_listener(log_queue, logger)
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(segments)),
+                                 initializer=setup_worker_logger,
+                                 initargs=(WORKER_LOGGER_NAME, loglevel, log_queue)) as executor:
+            futures = {executor.submit(_merge_segment_worker, seg, merge_kwargs): seg for seg in segments}
+            for future in as_completed(futures):
+                seg = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # e.g. the worker process was killed
+                    logger.error(f'Segment {seg}: merge worker failed, leaving files in the queue directory: {e}')
+                    result = (False, None, [], finish_metrics(new_metrics('merge', seg), success=False))
+                finished(seg, result)
+    finally:
+        listener.stop()
+
+    return [(seg, results[seg]) for seg in segments]
+
+
+def remove_from_queue(files, logger):
+    # remove segment raw netcdf files from the queue directory
+    for f in files:
+        if os.path.isfile(f):
+            logger.debug(f'removing {os.path.basename(f)} from queue directory')
+            os.remove(f)
+
+
+def preflight_check(input_files, job):
+    # check a segment from the headers of its raw files before merging, returns None if the segment should be merged
+    try:
+        return check_segment(input_files, job['preflight_settings'], job['gps_variable'])
+    except (OSError, RuntimeError, ValueError, IndexError) as e:
+        # unreadable raw files are left for the merge step, which logs the error and leaves them in the queue
+        job['logging'].warning(f'Pre-flight check failed for {", ".join(os.path.basename(f) for f in input_files)}: {e}')
+        return None
+
+
+def prepare_merge(logging_base, deployment, deployments_root, mode, loglevel, encoding_profile=None, preflight=None):
+    """
+    Find and check the directories and config files needed to merge a deployment's queued raw netcdf files
+    :param logging_base: base logger object
+    :param deployment: glider deployment name e.g. ru44-20250306T0038
+    :param deployments_root: root directory for glider deployments
+    :param mode: dataset mode (rt or delayed)
+    :param loglevel: logging level e.g. 'INFO'
+    :param encoding_profile: optional built-in encoding profile name
+    :param preflight: optional dictionary of pre-flight settings that override the deployment.yml preflight section
+    :return: dictionary describing the deployment merge job, None if the deployment can't be processed
+    """
+    # find the deployment binary data filepath
+    rawncdir, outdir, deployment_location = paths.find_glider_deployment_datapath(logging_base, deployment, deployments_root, mode)
+    queuedir = os.path.join(deployment_location, 'data', 'in', 'rawnc', 'queue')
+
+    if not os.path.isdir(queuedir):
+        logging_base.error(f'{deployment} queue directory containing raw NetCDF files not found')
+        return None
+
+    if not os.path.isdir(outdir):
+        logging_base.error(f'{deployment} output file data directory not found')
+        return None
+
+    if not os.path.isdir(os.path.join(deployment_location, 'proc-logs')):
+        logging_base.error(f'{deployment} deployment proc-logs directory not found')
+        return None
+
+    logfilename = logfile_deploymentname(deployment, mode, 'proc_merge_nc_to_timeseries')
+    logFile = os.path.join(deployment_location, 'proc-logs', logfilename)
+    logging = setup_logger(f'logging_merge_{deployment}_{mode}', loglevel, logFile)
+
+    # remove partially written merged files left by an interrupted run
+    for name in remove_stale_tmp(outdir):
+        logging.info(f'Removed {name} left in the output directory by an interrupted run')
+    for name in remove_stale_tmp(queuedir):
+        logging.info(f'Removed {name} left in the queue directory by an interrupted run')
+
+    # Set the deployment configuration path
+    deployment_config_root = os.path.join(deployment_location, 'config', 'proc')
+    if not os.path.isdir(deployment_config_root):
+        logging.warning(f'Invalid deployment config root: {deployment_config_root}')
+
+    # Find metadata file
+    deploymentyaml = os.path.join(deployment_config_root, 'deployment.yml')
+    if os.path.isfile(deploymentyaml):
+        try:
+            # cached, parsed once per file version (the json sidecar is written by the convert step)
+            deployment_meta = load_deployment_config(deploymentyaml, sidecar=True)
+        except (yaml.YAMLError, ValueError) as e:
+            logging.error(f"Error reading YAML file {deploymentyaml}: {e}")
+            return None
+    else:
+        logging.error(f"deployment.yaml file not found: {deploymentyaml}")
+        return None
+
+    # netCDF encoding (compression, chunking, quantization) from the CLI and/or deployment.yml
+    try:
+        encoding_settings = resolve_encoding_profile(encoding_profile, deployment_meta.get('encoding'))
+    except ValueError as e:
+        logging.error(f'Invalid encoding settings: {e}')
+        return None
+    logging.info(f'Using the {encoding_settings["name"]} encoding profile')
+
+    # thresholds for merging a segment, checked from the raw file headers
+    try:
+        preflight_settings = resolve_preflight_settings(preflight, deployment_meta.get('preflight'))
+    except ValueError as e:
+        logging.error(f'Invalid preflight settings: {e}')
+        return None
+    gps_variable = deployment_meta['netcdf_variables'].get('latitude', dict()).get('source', 'm_gps_lat')
+
+    if mode == 'rt':
+        scisuffix = 'tbd'
+        glidersuffix = 'sbd'
+        profile_filter_time = 30
+    elif mode == 'delayed':
+        scisuffix = 'ebd'
+        glidersuffix = 'dbd'
+        profile_filter_time = 30
+    else:
+        logging.warning(f'Invalid mode provided: {mode}')
+        return None
+
+    logging.info(f'Processing: {deployment} {mode}')
+
+    # make timeseries netcdf file from each debd.nc/stdb.nc pair
+    logging.info(f'merging *.{scisuffix}.nc and *.{glidersuffix}.nc netcdf files into timeseries netcdf files')
+    logging.info(f'Individual *.{scisuffix}.nc and *.{glidersuffix}.nc filepath: {queuedir}')
+    logging.info(f'Timeseries output filepath: {outdir}')
+
+    return dict(deployment=deployment,
+                logging=logging,
+                queuedir=queuedir,
+                outdir=outdir,
+                deployment_location=deployment_location,
+                deploymentyaml=deploymentyaml,
+                deployment_meta=deployment_meta,
+                encoding_settings=encoding_settings,
+                preflight_settings=preflight_settings,
+                gps_variable=gps_variable,
+                mode=mode,
+                scisuffix=scisuffix,
+                glidersuffix=glidersuffix,
+                profile_filter_time=profile_filter_time)
 
+
+def aggregate_segments(job, manifest):
+    """
+    Bring the deployment timeseries file (all merged segments of the deployment in one file) up to date with the
+    merge manifest, so it also picks up segments merged by a run that was interrupted before updating it
+    :param job: deployment merge job from prepare_merge
+    :param manifest: merge manifest dictionary
+    """
+    logging = job['logging']
+    storefile = store_path(job['deployment_location'], job['deployment'], job['mode'])
+    remove_stale_tmp(os.path.dirname(storefile))
+    try:
+        added, replaced = update_store(storefile, manifest, job['deployment'])
+    except (OSError, RuntimeError, ValueError) as e:
+        logging.error(f'Failed to update the deployment timeseries file {storefile}: {e}')
+        return
+
+    if added > 0 or replaced > 0:
+        logging.info(f'Updated {storefile}: {added} segments added, {replaced} segments replaced or removed')
+
+
+def open_segment_catalog(job, manifest):
+    """
+    Open the deployment profile catalog and bring it up to date with the merge manifest (e.g. segments merged
+    before the deployment had a catalog, or by a run that was interrupted before cataloguing them)
+    :param job: deployment merge job from prepare_merge
+    :param manifest: merge manifest dictionary
+    :return: catalog connection, None if the catalog can't be opened
+    """
+    logging = job['logging']
+    catalogfile = catalog_path(job['deployment_location'], job['deployment'], job['mode'])
+    try:
+        catalog = open_catalog(catalogfile)
+    except sqlite3.Error as e:
+        logging.error(f'Failed to open the profile catalog {catalogfile}: {e}')
+        return None
+
+    try:
+        count = sync_catalog(catalog, manifest, job['deployment'])
+    except (OSError, RuntimeError, ValueError, sqlite3.Error) as e:
+        logging.error(f'Failed to update the profile catalog {catalogfile}: {e}')
+    else:
+        if count > 0:
+            logging.info(f'Added {count} previously merged segments to the profile catalog {catalogfile}')
+
+    return catalog
+
+
+def merge_queued_segments(job, segment_list, workers=1, force=False, chunk_size=None, loglevel='INFO',
+                          metrics_textfile_dir=None, aggregate=False):
+    """
+    Merge queued segments of a deployment, skipping segments that are unchanged since they were last merged and
+    segments that fail the pre-flight check (too few rows, too short or too few GPS fixes). Each successfully merged segment is recorded in the merge journal and removed from the queue directory as
+    soon as it is finished, and the journal is folded into the manifest at the end of the run. If a run is
+    interrupted, the next run recovers the journal first so it resumes with the segments that weren't finished.
+    The profiles of each merged segment are upserted into the deployment profile catalog. The segments deferred by
+    the pre-flight check are listed in job['deferred'].
+    :param job: deployment merge job from prepare_merge
+    :param segment_list: list of segment names to merge
+    :param workers: number of worker processes
+    :param force: merge segments even if they are unchanged since they were last merged
+    :param chunk_size: optional number of rows to write at a time
+    :param loglevel: logging level e.g. 'INFO'
+    :param metrics_textfile_dir: optional node-exporter textfile collector directory for a summary of the run metrics
+    :param aggregate: also add the merged segments to the deployment timeseries file
+    :return: number of merged files written
+    """
+    logging = job['logging']
+    queuedir = job['queuedir']
+    deploymentyaml = job['deploymentyaml']
+    scisuffix = job['scisuffix']
+    glidersuffix = job['glidersuffix']
+
+    merge_kwargs = dict(queuedir=queuedir,
+                        outdir=job['outdir'],
+                        deploymentyaml=deploymentyaml,
+                        deployment_meta=job['deployment_meta'],
+                        deployment=job['deployment'],
+                        profile_filter_time=job['profile_filter_time'],
+                        chunk_size=chunk_size,
+                        encoding_settings=job['encoding_settings'])
+
+    # skip segments that were already merged from the same input files and deployment.yml
+    manifestfile = manifest_path(job['deployment_location'], job['mode'])
+    manifest = load_manifest(manifestfile)
+
+    # recover the segments merged by an interrupted run
+    journalfile = merge_journal_path(job['deployment_location'], job['mode'])
+    journaled = read_journal(journalfile)
+    if len(journaled) > 0:
+        logging.info(f'Recovered {len(journaled)} segments merged by an interrupted run from {journalfile}')
+        for seg, record in journaled.items():
+            manifest['segments'][seg] = record['entry']
+        save_manifest(manifest, manifestfile)
+        clear_journal(journalfile)
+
+    catalog = open_segment_catalog(job, manifest)
+    segment_inputs = dict()
+    committed = []
+
+    def commit_segment(seg, result):
+        # catalog the profiles and record the merged segment in the journal, then remove the segment raw netcdf
+        # files from the queue directory (failed segments are left in the queue directory so they are merged on
+        # the next run)
+        success, outname, profiles = result[:3]
+        if not success:
+            return
+        # the segment's previous entry, or the last one merged in this run for the deployment.yml hash
+        previous = manifest['segments'].get(seg) or (manifest['segments'][committed[-1]] if committed else None)
+        entry = segment_entry(segment_inputs[seg], deploymentyaml, outname, previous)
+        if catalog is not None:
+            try:
+                upsert_segment(catalog, job['deployment'], seg, entry['merged'], outname, profiles)
+            except sqlite3.Error as e:
+                logging.error(f'Segment {seg}: failed to update the profile catalog: {e}')
+        append_journal(journalfile, seg, entry=entry)
+        manifest['segments'][seg] = entry
+        committed.append(seg)
+        remove_from_queue(segment_inputs[seg], logging)
+
+    merge_list = []
+    skipcount = 0
+    rejectcount = 0
+    job['deferred'] = []
+    for seg in sorted(segment_list):
+        segment_inputs[seg] = [
+            os.path.join(queuedir, filename) for filename in (f'{seg}.{glidersuffix}.nc', f'{seg}.{scisuffix}.nc')
+            if os.path.isfile(os.path.join(queuedir, filename))
+        ]
+        if len(segment_inputs[seg]) == 0:
+            # the queue is shared by both modes, the segment's files belong to the other mode
+            logging.debug(f'Segment {seg}: no {glidersuffix}/{scisuffix} raw files in the queue directory, skipping')
+            continue
+        if not force and segment_unchanged(manifest, seg, segment_inputs[seg], deploymentyaml):
+            logging.info(f'Segment {seg}: inputs and deployment.yml unchanged since last merge, skipping')
+            remove_from_queue(segment_inputs[seg], logging)
+            skipcount += 1
+            continue
+
+        reason = preflight_check(segment_inputs[seg], job)
+        if reason is None:
+            merge_list.append(seg)
+        elif job['preflight_settings']['action'] == 'defer':
+            logging.info(f'Segment {seg}: {reason}, deferring (leaving files in the queue directory)')
+            job['deferred'].append(seg)
+        else:
+            # recorded without an output file, so the segment is only checked again if its raw files change
+            logging.info(f'Segment {seg}: {reason}, not merging')
+            commit_segment(seg, (True, None, []))
+            rejectcount += 1
+
+    outputcount = 0
+    segment_results = merge_segments(merge_list, merge_kwargs, workers, logging, loglevel, on_result=commit_segment)
+    # per-segment timing and throughput metrics, one JSON line per segment in proc-logs
+    segment_metrics = [result[3] for seg, result in segment_results]
+    write_metrics(segment_metrics, metrics_path(job['deployment_location'], job['mode']),
+                  deployment=job['deployment'], mode=job['mode'])
+    if metrics_textfile_dir:
+        write_prometheus_textfile(segment_metrics, metrics_textfile_dir, 'merge', deployment=job['deployment'], mode=job['mode'])
+
+    for seg, (success, outname, profiles, __) in segment_results:
+        if success and outname:
+            logging.info(f'Segment {seg}: indexed {len(profiles)} profiles')
+            outputcount += 1
+
+    if catalog is not None:
+        catalog.close()
+
+    # fold the journal into the manifest
+    if len(committed) > 0:
+        save_manifest(manifest, manifestfile)
+        clear_journal(journalfile)
+
+    if aggregate:
+        aggregate_segments(job, manifest)
+
+    if skipcount > 0:
+        logging.info(f'Skipped {skipcount} unchanged segments')
+    if rejectcount > 0:
+        logging.info(f'Skipped {rejectcount} segments that failed the pre-flight check')
+    if len(job['deferred']) > 0:
+        logging.info(f'Deferred {len(job["deferred"])} segments that failed the pre-flight check')
+
+    return outputcount
+
+
+def preflight_overrides(args):
+    # pre-flight settings given on the command line
+    return dict(min_rows=args.min_rows, min_duration=args.min_duration, min_gps_fixes=args.min_gps_fixes,
+                action=args.preflight_action)
+
+
+def merge_deployment(logging_base, deployment, deployments_root, mode, loglevel, args):
+    """
+    Merge all queued segments of one deployment
+    :param logging_base: base logger object
+    :param deployment: glider deployment name e.g. ru44-20250306T0038
+    :param deployments_root: root directory for glider deployments
+    :param mode: dataset mode (rt or delayed)
+    :param loglevel: logging level e.g. 'INFO'
+    :param args: parsed command line arguments
+    """
+    job = prepare_merge(logging_base, deployment, deployments_root, mode, loglevel, args.encoding_profile,
+                        preflight_overrides(args))
+    if job is None:
+        return
+    logging = job['logging']
+    queuedir = job['queuedir']
+    scisuffix = job['scisuffix']
+    glidersuffix = job['glidersuffix']
+
+    # only the segments with raw files of this mode (the queue is shared by both modes)
+    files = [f for suffix in [glidersuffix, scisuffix] for f in glob.glob(os.path.join(queuedir, f'*.{suffix}.nc'))]
+    segment_list = []
+    for file in files:
+        segment = os.path.basename(file).split('.')[0]
+        if segment not in segment_list:
+            segment_list.append(segment)
     
+    # log the number of .nc files to be merged
+    scicount = len([f for f in os.listdir(queuedir) if f.endswith(f'.{scisuffix}.nc')])
+    flightcount = len([f for f in os.listdir(queuedir) if f.endswith(f'.{glidersuffix}.nc')])
+    logging.info(f'Found {scicount} *.{scisuffix}.nc (science) and {flightcount} *.{glidersuffix}.nc (flight) files to merge')
+
+    outputcount = merge_queued_segments(job, segment_list, workers=args.workers, force=args.force,
+                                        chunk_size=args.chunk_size, loglevel=loglevel,
+                                        metrics_textfile_dir=args.metrics_textfile_dir, aggregate=args.aggregate)
+
+    # log how many files were successfully merged
+    logging.info(f'Successfully created {outputcount} merged *.nc files (out of {scicount} *.{scisuffix}.nc files and {flightcount} *.{glidersuffix}.nc files)')
+
+
 def main(args):
 # def main(deployments, mode, loglevel, test):
     loglevel = args.loglevel.upper()
@@ -74,169 +593,32 @@ def main(args):
     logFile_base = logfile_basename()
     logging_base = setup_logger('logging_base', loglevel, logFile_base)
 
-    data_home, deployments_root = cf.find_glider_deployments_rootdir(logging_base, test)
+    data_home, deployments_root = paths.find_glider_deployments_rootdir(logging_base, test)
     
     if isinstance(deployments_root, str):
 
-        for deployment in args.deployments:
-        # for deployment in [deployments]:
-
-            # find the deployment binary data filepath
-            rawncdir, outdir, deployment_location = cf.find_glider_deployment_datapath(logging_base, deployment, deployments_root, mode)
-            queuedir = os.path.join(deployment_location, 'data', 'in', 'rawnc', 'queue')
-
-            if not os.path.isdir(queuedir):
-                logging_base.error(f'{deployment} queue directory containing raw NetCDF files not found')
-                continue
-            
-            if not os.path.isdir(outdir):
-                logging_base.error(f'{deployment} output file data directory not found')
-                continue
+        deployments = list(args.deployments)
+        if args.all_active:
+            # deployments with queued binary or raw netCDF files of this mode, from the cached deployments index
+            index = update_index(logging_base, deployments_root)
+            deployments.extend(d for d in active_deployments(index, mode) if d not in deployments)
+        if len(deployments) == 0:
+            if args.all_active:
+                logging_base.info(f'No deployments with queued {mode} files')
+                return 0
+            logging_base.error('No deployments provided, list deployment names or use --all-active')
+            return 1
 
-            if not os.path.isdir(os.path.join(deployment_location, 'proc-logs')):
-                logging_base.error(f'{deployment} deployment proc-logs directory not found')
-                continue
-
-            logfilename = logfile_deploymentname(deployment, mode, 'proc_merge_nc_to_timeseries')
-            logFile = os.path.join(deployment_location, 'proc-logs', logfilename)
-            logging = setup_logger('logging', loglevel, logFile)
-
-            # Set the deployment configuration path
-            deployment_config_root = os.path.join(deployment_location, 'config', 'proc')
-            if not os.path.isdir(deployment_config_root):
-                logging.warning(f'Invalid deployment config root: {deployment_config_root}')
-
-            # Find metadata file
-            deploymentyaml = os.path.join(deployment_config_root, 'deployment.yml')
-            if os.path.isfile(deploymentyaml):
-                with open(deploymentyaml, 'r') as file:
-                    try:
-                        deployment_meta = yaml.safe_load(file)  # Parse the YAML file
-                    except yaml.YAMLError as e:
-                        logging.error(f"Error reading YAML file {deploymentyaml}: {e}")
-                        continue
-            else:
-                logging.error(f"deployment.yaml file not found: {deploymentyaml}")
-                continue
-            
-            if mode == 'rt':
-                scisuffix = 'tbd'
-                glidersuffix = 'sbd'
-                profile_filter_time = 30
-            elif mode == 'delayed':
-                scisuffix = 'ebd'
-                glidersuffix = 'dbd'
-                profile_filter_time = 30
-            else:
-                logging.warning(f'Invalid mode provided: {mode}')
+        for deployment in deployments:
+        # for deployment in [deployments]:
+            # one process at a time merges a deployment dataset mode
+            lockfile = lock_deployment(logging_base, deployment, deployments_root, mode, args.lock_timeout)
+            if lockfile is None:
                 continue
-            
-            logging.info(f'Processing: {deployment} {mode}')
-            
-            # make timeseries netcdf file from each debd.nc/stdb.nc pair
-            logging.info(f'merging *.{scisuffix}.nc and *.{glidersuffix}.nc netcdf files into timeseries netcdf files')
-            logging.info(f'Individual *.{scisuffix}.nc and *.{glidersuffix}.nc filepath: {queuedir}')
-            logging.info(f'Timeseries output filepath: {outdir}')
-            
-            files = glob.glob(os.path.join(queuedir, '*.nc'))
-            segment_list = []
-            for file in files:
-                segment = os.path.basename(file).split('.')[0]
-                if segment not in segment_list:
-                    segment_list.append(segment)
-            
-            # log the number of .nc files to be merged
-            scicount = len([f for f in os.listdir(queuedir) if f.endswith(f'.{scisuffix}.nc')])
-            flightcount = len([f for f in os.listdir(queuedir) if f.endswith(f'.{glidersuffix}.nc')])
-            logging.info(f'Found {scicount} *.{scisuffix}.nc (science) and {flightcount} *.{glidersuffix}.nc (flight) files to merge')
-
-            outputcount = 0
-            for seg in sorted(segment_list):
-                print(seg)
-                ds, savefile, source_file = slocum.raw_segment_to_timeseries(queuedir, 
-                                                                             outdir, 
-                                                                             deploymentyaml, 
-                                                                             logging, 
-                                                                             profile_filt_time=profile_filter_time,
-                                                                             profile_min_time=60, 
-                                                                             segment=seg)
-                
-                if ds is not None:
-                    # add profile_lat and profile_lon
-                    add_profile_vars(ds, 'profile_lat', deployment_meta['profile_variables'])
-                    add_profile_vars(ds, 'profile_lon', deployment_meta['profile_variables'])
-
-                    # add source_file variable
-                    attrs = {'comment': 'Name of the source data file: full_filename(the8x3_filename)'}
-                    v = np.zeros(np.shape(ds['time'])).astype(str)
-                    v[:] = source_file
-
-                    da = xr.DataArray(v, 
-                                      coords=ds['time'].coords, 
-                                      dims=ds['time'].dims, name='source_file', 
-                                      attrs=attrs)
-    
-                    ds['source_file'] = da
-
-                    # add trajectory variable
-                    attrs = {'comment': 'A trajectory is a single deployment of a glider and may span multiple data files.',
-                             'long_name': 'Trajectory/Deployment Name'}
-                    t = np.zeros(np.shape(ds['time'])).astype(str)
-                    t[:] = deployment
-
-                    da = xr.DataArray(t, 
-                                      coords=ds['time'].coords, 
-                                      dims=ds['time'].dims, name='trajectory', 
-                                      attrs=attrs)
-    
-                    ds['trajectory'] = da
-
-                    # add platform metadata variable
-                    da = xr.DataArray(np.array(np.nan), name='platform', attrs=deployment_meta['platform'])
-                    ds['platform'] = da
-                    
-                    # add instrument metadata variables
-                    for ncvar_name, attributes in deployment_meta.get('instruments', {}).items():
-                        da = xr.DataArray(np.array(np.nan), name=ncvar_name, attrs=attributes)
-                        ds[ncvar_name] = da
-                    
-                    # add variable encoding
-                    encoding = dict()
-                    for v in ds.data_vars:
-                        build_encoding(encoding, ds, v)
-                    
-                    for v in ds.coords:
-                        build_encoding(encoding, ds, v)
-
-                    outname = os.path.join(outdir, savefile)
-                    logging.info(f'Writing {outname}')
-                    ds.to_netcdf(
-                        outname, 'w', encoding=encoding
-                    )
-
-                    profile_count = len(np.where(np.unique(ds['profile_id']) != 0)[0])
-                    logging.info(f'Segment {seg}: indexed {profile_count} profiles')
-                    
-                    # # for testing
-                    # savefile = savefile.replace('.nc', '.csv')
-                    # outcsv = os.path.join(outdir, savefile)
-                    # ds.to_dataframe().to_csv(outcsv)
-                    outputcount += 1
-
-                # remove the segment raw netcdf files from the queue directory
-                queuencmatch = [
-                    filename for filename in os.listdir(queuedir)
-                    if filename in (
-                        f'{seg}.{glidersuffix}.nc',
-                        f'{seg}.{scisuffix}.nc',
-                    )
-                ]
-                for f in queuencmatch:
-                    print(f'removing {f} from queue directory')
-                    os.remove(os.path.join(queuedir, f))
-
-            # log how many files were successfully merged
-            logging.info(f'Successfully created {outputcount} merged *.nc files (out of {scicount} *.{scisuffix}.nc files and {flightcount} *.{glidersuffix}.nc files)')
+            try:
+                merge_deployment(logging_base, deployment, deployments_root, mode, loglevel, args)
+            finally:
+                release_lock(lockfile)
 
 
 if __name__ == '__main__':
@@ -247,26 +629,10 @@ if __name__ == '__main__':
     # main(deploy, mode, ll, test)
     arg_parser = argparse.ArgumentParser(description=main.__doc__,
                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    
-    arg_parser.add_argument('deployments',
-                            nargs='+',
-                            help='Glider deployment name(s) formatted as glider-YYYYmmddTHHMM')
-    
-    arg_parser.add_argument('-m', '--mode',
-                            help='Dataset mode: real-time (rt) or delayed-mode (delayed)',
-                            choices=['rt', 'delayed'],
-                            default='rt')
-    
-    arg_parser.add_argument('-l', '--loglevel',
-                            help='Verbosity level',
-                            type=str,
-                            choices=['debug', 'info', 'warning', 'error'],
-                            default='info')
-    
-    arg_parser.add_argument('-test', '--test',
-                            help='Point to the environment variable key GLIDER_DATA_HOME_TEST for testing.',
-                            action='store_true')
+
+    add_merge_arguments(arg_parser)
     
     parsed_args = arg_parser.parse_args()
+    configure_logging(parsed_args.log_root, parsed_args.log_format)
     
     sys.exit(main(parsed_args))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""
+Find glider profiles by time window and/or bounding box using the profile catalogs
+(../data/out/<mode>/<deployment>-<mode>-profiles.sqlite) written by merge_raw_nc_to_timeseries.py,
+without opening the merged files.
+"""
+
+import os
+import argparse
+import sys
+import csv
+import json
+from dateutil import parser
+import pytz
+import ruglider_processing.paths as paths
+from ruglider_processing.cli import add_profiles_arguments
+from ruglider_processing.catalog import catalog_path, query_profiles, PROFILE_COLUMNS
+from ruglider_processing.loggers import logfile_basename, setup_logger, configure_logging
+
+
+def parse_time(value):
+    # ISO 8601 date/time (UTC unless a timezone is given) as seconds since 1970-01-01
+    if value is None:
+        return None
+    dt = parser.parse(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=pytz.UTC)
+
+    return dt.timestamp()
+
+
+def write_profiles(profiles, output_format, stream=sys.stdout):
+    if output_format == 'json':
+        json.dump(profiles, stream, indent=2)
+        stream.write('\n')
+    else:
+        writer = csv.DictWriter(stream, fieldnames=PROFILE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(profiles)
+
+
+def main(args):
+    loglevel = args.loglevel.upper()
+    mode = args.mode
+    test = args.test
+
+    logFile_base = logfile_basename()
+    logging_base = setup_logger('logging_base', loglevel, logFile_base)
+
+    data_home, deployments_root = paths.find_glider_deployments_rootdir(logging_base, test)
+    if not isinstance(deployments_root, str):
+        return 1
+
+    deployments = list(args.deployments)
+    if args.all:
+        deployments.extend(d for d in paths.find_deployments(deployments_root) if d not in deployments)
+    if len(deployments) == 0:
+        logging_base.error('No deployments provided, list deployment names or use --all')
+        return 1
+
+    catalog_files = []
+    for deployment in deployments:
+        deployment_location = paths.find_glider_deployment_location(logging_base, deployment, deployments_root)
+        if deployment_location is None:
+            continue
+        catalogfile = catalog_path(deployment_location, deployment, mode)
+        if os.path.isfile(catalogfile):
+            catalog_files.append(catalogfile)
+        elif not args.all:
+            logging_base.warning(f'{deployment} profile catalog not found: {catalogfile}')
+
+    try:
+        start = parse_time(args.start)
+        end = parse_time(args.end)
+    except (ValueError, OverflowError) as e:
+        logging_base.error(f'Invalid time window: {e}')
+        return 1
+
+    profiles = query_profiles(catalog_files, start=start, end=end, bbox=args.bbox)
+    write_profiles(profiles, args.format)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    add_profiles_arguments(arg_parser)
+
+    parsed_args = arg_parser.parse_args()
+    configure_logging(parsed_args.log_root, parsed_args.log_format)
+
+    sys.exit(main(parsed_args))
@@ -1,4 +1,19 @@
-from . import common
-from . import loggers
+import importlib
 
 __version__ = '0.1.0'
+
+# Submodules are imported on first use (e.g. ruglider_processing.ncwrite), so importing the package or a light
+# submodule such as paths, config or cli doesn't pull in netCDF4, xarray and pandas
+_SUBMODULES = ['aggregate', 'catalog', 'cli', 'common', 'config', 'deployindex', 'dirindex', 'encoding', 'journal',
+               'locks', 'loggers', 'manifest', 'metrics', 'ncwrite', 'paths', 'preflight', 'scheduler', 'sensordefs',
+               'staging', 'watch']
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + _SUBMODULES)
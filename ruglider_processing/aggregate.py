@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+
+import os
+from datetime import datetime, timezone
+import numpy as np
+from netCDF4 import Dataset, chartostring, default_fillvals
+
+AGGREGATE_VERSION = 2
+
+# chunk size along time for variables that aren't chunked in the merged files
+STORE_CHUNKSIZE = 4096
+
+# lengths of the segment table string variables
+NAME_STRLEN = 64
+FILE_STRLEN = 256
+STAMP_STRLEN = 20
+
+# per-row variables of the merged files that are constant for a segment, recorded once per segment instead
+SEGMENT_CONSTANT_VARIABLES = ['source_file', 'trajectory']
+
+# segment table variables (CF contiguous ragged array: segment_row_size rows of time per segment, in time order)
+SEGMENT_TABLE = dict(
+    segment_name=dict(dtype='S1', dims=('segment', 'name_strlen'),
+                      attrs=dict(long_name='Glider segment name', cf_role='trajectory_id')),
+    segment_row_size=dict(dtype='i8', dims=('segment',),
+                          attrs=dict(long_name='Number of time rows of the segment', sample_dimension='time')),
+    segment_time_min=dict(dtype='f8', dims=('segment',), attrs=dict(long_name='Time of the first row of the segment')),
+    segment_time_max=dict(dtype='f8', dims=('segment',), attrs=dict(long_name='Time of the last row of the segment')),
+    segment_file=dict(dtype='S1', dims=('segment', 'file_strlen'),
+                      attrs=dict(long_name='Merged segment file the rows were appended from')),
+    segment_source_file=dict(dtype='S1', dims=('segment', 'file_strlen'),
+                             attrs=dict(long_name='Source data file of the segment (source_file of the merged file)')),
+    segment_merged=dict(dtype='S1', dims=('segment', 'stamp_strlen'),
+                        attrs=dict(long_name='Time the segment was merged (segment_manifest.json)')),
+)
+
+
+def store_path(deployment_location, deployment, mode):
+    # one timeseries file per deployment and dataset mode e.g. ../data/out/rt/ru44-20250325T0438-rt-timeseries.nc
+    return os.path.join(deployment_location, 'data', 'out', mode, f'{deployment}-{mode}-timeseries.nc')
+
+
+def _segment_table(nc):
+    n = len(nc.dimensions['segment'])
+    if n == 0:
+        return []
+
+    names = chartostring(nc.variables['segment_name'][:])
+    files = chartostring(nc.variables['segment_file'][:])
+    stamps = chartostring(nc.variables['segment_merged'][:])
+    # stores written before segment_source_file was added don't have it
+    source_files = (chartostring(nc.variables['segment_source_file'][:]) if 'segment_source_file' in nc.variables
+                    else [''] * n)
+    row_size = np.asarray(nc.variables['segment_row_size'][:])
+    starts = np.concatenate([[0], np.cumsum(row_size)[:-1]])
+    tmin = np.asarray(nc.variables['segment_time_min'][:])
+    tmax = np.asarray(nc.variables['segment_time_max'][:])
+
+    return [dict(segment=str(names[i]), rows=int(row_size[i]), start=int(starts[i]), time_min=float(tmin[i]),
+                 time_max=float(tmax[i]), file=str(files[i]), source_file=str(source_files[i]),
+                 merged=str(stamps[i])) for i in range(n)]
+
+
+def read_segment_table(filepath):
+    """
+    Read the segment table of a deployment timeseries file
+    :param filepath: full path to the deployment timeseries file
+    :return: list of dictionaries (segment, rows, start, time_min, time_max, file, source_file, merged) in time order,
+    empty if the file doesn't exist
+    """
+    if not os.path.isfile(filepath):
+        return []
+
+    with Dataset(filepath, 'r') as nc:
+        nc.set_auto_maskandscale(False)
+        return _segment_table(nc)
+
+
+def _time_range(filepath):
+    # first and last (encoded) time and number of rows of a merged segment file, None if the file has no rows
+    with Dataset(filepath, 'r') as nc:
+        nc.set_auto_maskandscale(False)
+        rows = len(nc.dimensions['time'])
+        if rows == 0:
+            return None
+        time = nc.variables['time']
+        return float(time[0]), float(time[-1]), getattr(time, 'units', None), rows
+
+
+def _source_file(nc):
+    # source_file of a merged segment file (constant for the segment), empty if the file doesn't have one
+    if 'source_file' not in nc.variables or len(nc.dimensions['time']) == 0:
+        return ''
+    value = np.asarray(nc.variables['source_file'][0])
+    if value.dtype.kind == 'S':
+        value = chartostring(value)
+
+    return str(value)
+
+
+def _create_store(filepath, deployment):
+    nc = Dataset(filepath, 'w', format='NETCDF4')
+    nc.set_auto_maskandscale(False)
+    nc.createDimension('time', None)
+    nc.createDimension('segment', None)
+    nc.createDimension('name_strlen', NAME_STRLEN)
+    nc.createDimension('file_strlen', FILE_STRLEN)
+    nc.createDimension('stamp_strlen', STAMP_STRLEN)
+    for name, spec in SEGMENT_TABLE.items():
+        var = nc.createVariable(name, spec['dtype'], spec['dims'])
+        var.setncatts(spec['attrs'])
+    nc.setncattr('trajectory', deployment)
+    nc.setncattr('featureType', 'trajectory')
+    nc.setncattr('aggregate_version', AGGREGATE_VERSION)
+
+    return nc
+
+
+def _time_variables(nc):
+    # per-row variables that are copied row by row into the store
+    return [name for name, var in nc.variables.items()
+            if var.dimensions == ('time',) and name not in SEGMENT_CONSTANT_VARIABLES]
+
+
+def _define_variables(store, source):
+    # add the variables of a source file that the store doesn't have yet (earlier rows read as the fill value)
+    for name, var in source.variables.items():
+        if name in store.variables or name in SEGMENT_CONSTANT_VARIABLES:
+            continue
+        if var.dimensions == ('time',):
+            filters = var.filters() or dict()
+            chunking = var.chunking()
+            chunksize = chunking[0] if isinstance(chunking, list) else STORE_CHUNKSIZE
+            fill_value = var.getncattr('_FillValue') if '_FillValue' in var.ncattrs() else None
+            new = store.createVariable(name, var.dtype, ('time',), zlib=filters.get('zlib', False),
+                                       complevel=filters.get('complevel', 4), shuffle=filters.get('shuffle', True),
+                                       chunksizes=(max(chunksize, STORE_CHUNKSIZE),), fill_value=fill_value)
+        elif var.dimensions == ():
+            # scalar metadata variables e.g. platform and instruments
+            new = store.createVariable(name, var.dtype, ())
+            new[...] = var[...]
+        else:
+            continue
+        new.setncatts({k: var.getncattr(k) for k in var.ncattrs() if k != '_FillValue'})
+
+
+def _chars(value, length):
+    # fixed-width char array of a string (null padded) for the segment table
+    return np.frombuffer(value.encode()[:length].ljust(length, b'\0'), dtype='S1')
+
+
+def _append_segment(store, position, source, src_start, rows, entry):
+    # append rows of a source (merged file or another store) and then the segment table entry, so a store that
+    # is interrupted while the rows are written has no table entry for them (see update_store)
+    # position is (number of segments, number of rows) in the store, returns the position after the segment
+    i, start = position
+    _define_variables(store, source)
+    for name in _time_variables(source):
+        store.variables[name][start:start + rows] = source.variables[name][src_start:src_start + rows]
+
+    store.variables['segment_name'][i] = _chars(entry['segment'], NAME_STRLEN)
+    store.variables['segment_file'][i] = _chars(entry['file'], FILE_STRLEN)
+    store.variables['segment_source_file'][i] = _chars(entry['source_file'], FILE_STRLEN)
+    store.variables['segment_merged'][i] = _chars(entry['merged'], STAMP_STRLEN)
+    store.variables['segment_time_min'][i] = entry['time_min']
+    store.variables['segment_time_max'][i] = entry['time_max']
+    store.variables['segment_row_size'][i] = rows
+
+    return i + 1, start + rows
+
+
+def _append_file(store, position, entry):
+    with Dataset(entry['file'], 'r') as source:
+        source.set_auto_maskandscale(False)
+        entry = dict(entry, source_file=_source_file(source))
+        return _append_segment(store, position, source, 0, len(source.dimensions['time']), entry)
+
+
+def _overwrite_file(store, i, start, entry):
+    # write a re-merged segment with an unchanged number of rows over its own slice (and table entry i), the
+    # variables the new merged file doesn't have are reset to their fill value in the slice
+    with Dataset(entry['file'], 'r') as source:
+        source.set_auto_maskandscale(False)
+        rows = len(source.dimensions['time'])
+        entry = dict(entry, source_file=_source_file(source))
+        for name in _time_variables(store):
+            if name in source.variables:
+                continue
+            var = store.variables[name]
+            fill_value = (var.getncattr('_FillValue') if '_FillValue' in var.ncattrs()
+                          else default_fillvals.get(var.dtype.str[1:]))
+            if fill_value is not None:
+                var[start:start + rows] = np.full(rows, fill_value, dtype=var.dtype)
+        _append_segment(store, (i, start), source, 0, rows, entry)
+
+
+def _in_place(table, updates, new):
+    # True if the updates don't move any stored rows: every re-merged segment has the same number of rows and keeps
+    # its place in time order, and new segments are all later than the stored ones
+    if any(u is None for u in updates.values()):
+        return False
+    names = {e['segment'] for e in table}
+    stored = [updates.get(e['segment'], e) for e in table]
+    if any(u['rows'] != e['rows'] for u, e in zip(stored, table)):
+        return False
+    keys = [(e['time_min'], e['segment']) for e in stored + [u for u in new if u['segment'] not in names]]
+    return keys == sorted(keys)
+
+
+def _set_coverage(store, table):
+    # global attributes of the newest merged file, with the time coverage of the whole store
+    newest = max(table, key=lambda e: e['time_max'])
+    if os.path.isfile(newest['file']):
+        with Dataset(newest['file'], 'r') as source:
+            store.setncatts({k: source.getncattr(k) for k in source.ncattrs()})
+    for attr, value in [('time_coverage_start', table[0]['time_min']), ('time_coverage_end', newest['time_max'])]:
+        store.setncattr(attr, datetime.fromtimestamp(value, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'))
+    store.setncattr('aggregate_version', AGGREGATE_VERSION)
+
+
+def update_store(filepath, manifest, deployment):
+    """
+    Bring a deployment timeseries file up to date with the merge manifest: each merged segment's rows are
+    stored as one contiguous slice along the unlimited time dimension, in time order. The file is updated in
+    place when no stored rows move: newly merged segments that are later than everything in the file are
+    appended, and a re-merged segment with the same number of rows is written over its own slice. Otherwise
+    (a segment that arrives out of time order, changes its number of rows or no longer has output) the file is
+    rebuilt in a temporary file that replaces it atomically. Segments whose merged file has already left the
+    output directory are kept as they are.
+    :param filepath: full path to the deployment timeseries file (see store_path)
+    :param manifest: merge manifest dictionary (see ruglider_processing.manifest)
+    :param deployment: glider deployment name e.g. ru44-20250306T0038
+    :return: number of segments added, number of segments replaced or removed (0, 0 if the file is up to date)
+    """
+    table = read_segment_table(filepath)
+    stored = {e['segment']: e for e in table}
+
+    updates = dict()
+    for seg, entry in manifest['segments'].items():
+        if seg in stored and stored[seg]['merged'] == entry['merged']:
+            continue
+        output = entry.get('output')
+        if output is not None and not os.path.isfile(output):
+            continue
+        time_range = _time_range(output) if output is not None else None
+        if time_range is None:
+            # no output (or no rows) for the segment anymore
+            if seg in stored:
+                updates[seg] = None
+            continue
+        if time_range[2] and not str(time_range[2]).startswith('seconds since 1970'):
+            raise ValueError(f'{output}: unexpected time units {time_range[2]}')
+        updates[seg] = dict(segment=seg, file=output, merged=entry['merged'], time_min=time_range[0],
+                            time_max=time_range[1], rows=time_range[3])
+    if len(updates) == 0:
+        return 0, 0
+
+    new = sorted([u for u in updates.values() if u is not None], key=lambda u: (u['time_min'], u['segment']))
+    added = len([seg for seg in updates if seg not in stored])
+    replaced = len(updates) - added
+
+    if os.path.isfile(filepath) and _in_place(table, updates, new):
+        with Dataset(filepath, 'a') as store:
+            store.set_auto_maskandscale(False)
+            # rows beyond the segment table are left by an interrupted append, rebuild instead. An interrupted
+            # overwrite keeps the old merged time in the segment table, so the segment is written again next time.
+            # A store written by an older version is also rebuilt, to add the segment table variables it lacks.
+            position = (len(table), sum(e['rows'] for e in table))
+            if len(store.dimensions['time']) == position[1] and all(v in store.variables for v in SEGMENT_TABLE):
+                index = {e['segment']: i for i, e in enumerate(table)}
+                for entry in new:
+                    if entry['segment'] in index:
+                        i = index[entry['segment']]
+                        _overwrite_file(store, i, table[i]['start'], entry)
+                    else:
+                        position = _append_file(store, position, entry)
+                _set_coverage(store, _segment_table(store))
+                return added, replaced
+
+    # rebuild: the stored segments that didn't change and the updated segments, in time order
+    keep = [dict(e, source='store') for e in table if e['segment'] not in updates]
+    ordered = sorted(keep + new, key=lambda e: (e['time_min'], e['segment']))
+    tmpfile = f'{filepath}.{os.getpid()}.tmp'
+    old = None
+    try:
+        if os.path.isfile(filepath):
+            old = Dataset(filepath, 'r')
+            old.set_auto_maskandscale(False)
+        with _create_store(tmpfile, deployment) as store:
+            position = (0, 0)
+            for entry in ordered:
+                if entry.get('source') == 'store':
+                    position = _append_segment(store, position, old, entry['start'], entry['rows'], entry)
+                else:
+                    position = _append_file(store, position, entry)
+            if len(ordered) > 0:
+                _set_coverage(store, _segment_table(store))
+        os.replace(tmpfile, filepath)
+    finally:
+        if old is not None:
+            old.close()
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+    return added, replaced
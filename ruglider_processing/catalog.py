@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+import os
+import sqlite3
+import numpy as np
+
+CATALOG_VERSION = 1
+
+# merged file variables the profile depth range is taken from, in order of preference
+DEPTH_VARIABLES = ['depth', 'pressure']
+
+# one row per glider profile, keyed by segment and profile_id (times are seconds since 1970-01-01)
+PROFILE_COLUMNS = ['deployment', 'segment', 'profile_id', 'start_time', 'end_time', 'mid_time', 'lat', 'lon',
+                   'depth_min', 'depth_max', 'row_start', 'row_end', 'file', 'source_file']
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS profiles (
+        deployment TEXT NOT NULL,
+        segment TEXT NOT NULL,
+        profile_id REAL NOT NULL,
+        start_time REAL,
+        end_time REAL,
+        mid_time REAL,
+        lat REAL,
+        lon REAL,
+        depth_min REAL,
+        depth_max REAL,
+        row_start INTEGER,
+        row_end INTEGER,
+        file TEXT,
+        source_file TEXT,
+        PRIMARY KEY (segment, profile_id))''',
+    'CREATE INDEX IF NOT EXISTS profiles_time ON profiles (start_time, end_time)',
+    'CREATE INDEX IF NOT EXISTS profiles_location ON profiles (lat, lon)',
+    # merge manifest stamp of each catalogued segment, so the catalog can be brought up to date from the manifest
+    '''CREATE TABLE IF NOT EXISTS segments (
+        segment TEXT PRIMARY KEY,
+        merged TEXT,
+        file TEXT,
+        profiles INTEGER)''',
+]
+
+
+def catalog_path(deployment_location, deployment, mode):
+    # one profile catalog per deployment and dataset mode e.g. ../data/out/rt/ru44-20250325T0438-rt-profiles.sqlite
+    return os.path.join(deployment_location, 'data', 'out', mode, f'{deployment}-{mode}-profiles.sqlite')
+
+
+def open_catalog(filepath):
+    """
+    Open a profile catalog for writing, creating it if it doesn't exist
+    :param filepath: full path to the catalog file (see catalog_path)
+    :return: sqlite3 connection
+    """
+    conn = sqlite3.connect(filepath, timeout=30)
+    # readers (e.g. query_profile_catalog.py) aren't blocked while the merge writes
+    conn.execute('PRAGMA journal_mode=WAL')
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.execute(f'PRAGMA user_version={CATALOG_VERSION}')
+    conn.commit()
+
+    return conn
+
+
+def _epoch_seconds(values):
+    # datetime64 or numeric times as float seconds since 1970-01-01, NaN for missing times
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        seconds = values.astype('datetime64[ns]').astype('int64') / 1e9
+        return np.where(np.isnat(values), np.nan, seconds)
+
+    return values.astype(float)
+
+
+def _optional(value):
+    # NULL in the catalog for missing values
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def profile_summaries(ds, source_file=None, template_var='profile_id'):
+    """
+    Summarize each profile of a merged dataset (rows with a profile_id of 0 aren't part of a profile). All
+    profiles are summarized in one pass over the profile index.
+    :param ds: merged xarray dataset with the profile index, time and optionally profile_lat, profile_lon and depth
+    :param source_file: optional name of the source data file of the segment
+    :param template_var: name of the profile index variable
+    :return: list of profile dictionaries (profile_id, start_time, end_time, mid_time, lat, lon, depth_min,
+    depth_max, row_start, row_end, source_file) in profile_id order
+    """
+    pid = np.asarray(ds[template_var].values, dtype=float)
+    rows = np.flatnonzero(np.isfinite(pid) & (pid != 0))
+    if len(rows) == 0:
+        return []
+
+    # group the rows of each profile: stable sort by profile, each group's rows stay in time order
+    ids, inverse = np.unique(pid[rows], return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    rows = rows[order]
+    bounds = np.searchsorted(inverse[order], np.arange(len(ids)))
+    last = np.append(bounds[1:], len(rows)) - 1
+
+    t = _epoch_seconds(ds['time'].values)[rows]
+    start_time = np.fmin.reduceat(t, bounds)
+    end_time = np.fmax.reduceat(t, bounds)
+
+    depth_var = next((v for v in DEPTH_VARIABLES if v in ds.variables), None)
+    if depth_var is not None:
+        depth = np.asarray(ds[depth_var].values, dtype=float)[rows]
+        depth_min = np.fmin.reduceat(depth, bounds)
+        depth_max = np.fmax.reduceat(depth, bounds)
+    else:
+        depth_min = depth_max = np.full(len(ids), np.nan)
+
+    # profile_lat and profile_lon are the profile means, repeated on every row of the profile
+    lat, lon = [np.asarray(ds[v].values, dtype=float)[rows[bounds]] if v in ds.variables else np.full(len(ids), np.nan)
+                for v in ('profile_lat', 'profile_lon')]
+
+    return [dict(profile_id=float(ids[i]), start_time=_optional(start_time[i]), end_time=_optional(end_time[i]),
+                 mid_time=_optional((start_time[i] + end_time[i]) / 2), lat=_optional(lat[i]), lon=_optional(lon[i]),
+                 depth_min=_optional(depth_min[i]), depth_max=_optional(depth_max[i]), row_start=int(rows[bounds[i]]),
+                 row_end=int(rows[last[i]]), source_file=source_file) for i in range(len(ids))]
+
+
+def file_profiles(filepath):
+    """
+    Summarize each profile of a merged segment file (see profile_summaries), reading only the variables needed
+    :param filepath: full path to a merged segment file
+    :return: list of profile dictionaries
+    """
+    # imported here so the catalog can be queried without loading xarray
+    import xarray as xr
+
+    with xr.open_dataset(filepath) as ds:
+        source_file = None
+        if 'source_file' in ds.variables and ds.sizes.get('time', 0) > 0:
+            source_file = str(ds['source_file'].values[0])
+        return profile_summaries(ds, source_file)
+
+
+def upsert_segment(conn, deployment, segment, merged, filepath, profiles):
+    """
+    Replace the catalogued profiles of a segment (e.g. after the segment is re-merged) in one transaction
+    :param conn: catalog connection from open_catalog
+    :param deployment: glider deployment name e.g. ru44-20250306T0038
+    :param segment: segment name e.g. ru44-2025-098-0-0
+    :param merged: time the segment was merged (merge manifest entry)
+    :param filepath: full path to the merged segment file, None if the segment has no output
+    :param profiles: list of profile dictionaries from profile_summaries
+    """
+    with conn:
+        conn.execute('DELETE FROM profiles WHERE segment = ?', (segment,))
+        conn.executemany(f'INSERT INTO profiles ({", ".join(PROFILE_COLUMNS)}) '
+                         f'VALUES ({", ".join("?" * len(PROFILE_COLUMNS))})',
+                         [tuple(dict(p, deployment=deployment, segment=segment, file=filepath)[c]
+                                for c in PROFILE_COLUMNS) for p in profiles])
+        conn.execute('INSERT OR REPLACE INTO segments (segment, merged, file, profiles) VALUES (?, ?, ?, ?)',
+                     (segment, merged, filepath, len(profiles)))
+
+
+def sync_catalog(conn, manifest, deployment):
+    """
+    Bring a profile catalog up to date with the merge manifest: segments merged since they were catalogued (e.g.
+    by a run that was interrupted, or before the deployment had a catalog) are read from their merged file. Segments
+    whose merged file has already left the output directory are kept as they are.
+    :param conn: catalog connection from open_catalog
+    :param manifest: merge manifest dictionary (see ruglider_processing.manifest)
+    :param deployment: glider deployment name e.g. ru44-20250306T0038
+    :return: number of segments catalogued
+    """
+    catalogued = dict(conn.execute('SELECT segment, merged FROM segments'))
+    count = 0
+    for seg, entry in manifest['segments'].items():
+        if catalogued.get(seg) == entry['merged']:
+            continue
+        output = entry.get('output')
+        if output is not None and not os.path.isfile(output):
+            continue
+        profiles = file_profiles(output) if output is not None else []
+        upsert_segment(conn, deployment, seg, entry['merged'], output, profiles)
+        count += 1
+
+    return count
+
+
+def query_profiles(catalog_files, start=None, end=None, bbox=None):
+    """
+    Find the profiles that overlap a time window and/or are inside a bounding box, across one or more catalogs
+    :param catalog_files: list of full paths to profile catalogs (missing files are ignored)
+    :param start: optional start of the time window (seconds since 1970-01-01)
+    :param end: optional end of the time window (seconds since 1970-01-01)
+    :param bbox: optional bounding box (lon_min, lat_min, lon_max, lat_max) of the profile positions
+    :return: list of profile dictionaries (PROFILE_COLUMNS) in start_time order
+    """
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append('end_time >= ?')
+        params.append(start)
+    if end is not None:
+        conditions.append('start_time <= ?')
+        params.append(end)
+    if bbox is not None:
+        conditions.append('lon BETWEEN ? AND ? AND lat BETWEEN ? AND ?')
+        params.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+    where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+    sql = f'SELECT {", ".join(PROFILE_COLUMNS)} FROM profiles{where} ORDER BY start_time'
+
+    profiles = []
+    for filepath in catalog_files:
+        if not os.path.isfile(filepath):
+            continue
+        conn = sqlite3.connect(f'file:{filepath}?mode=ro', uri=True, timeout=30)
+        try:
+            profiles.extend(dict(zip(PROFILE_COLUMNS, row)) for row in conn.execute(sql, params))
+        finally:
+            conn.close()
+
+    return sorted(profiles, key=lambda p: (p['start_time'] is None, p['start_time'] or 0, p['deployment']))
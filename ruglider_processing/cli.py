@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+
+"""
+Process Slocum glider deployments: ruglider convert|merge|deployment-yaml|watch|run|profiles
+"""
+
+import argparse
+import copy
+import importlib
+import sys
+from ruglider_processing.encoding import ENCODING_PROFILES
+from ruglider_processing.staging import STAGING_METHODS
+from ruglider_processing.preflight import PREFLIGHT_ACTIONS
+from ruglider_processing.loggers import LOG_FORMATS, configure_logging
+
+# The arguments of each processing script are defined here and the scripts are only imported once a subcommand
+# runs, so --help and argument errors don't pay for importing pyglider, xarray, pandas and netCDF4.
+# subcommand: (script module, help)
+SUBCOMMANDS = {
+    'deployment-yaml': ('generate_deploymentyaml', 'Generate the deployment.yml file for a glider deployment'),
+    'convert': ('convert_binary_to_raw_nc', 'Convert binary DBD/EBD or SBD/TBD files to raw netCDF files'),
+    'merge': ('merge_raw_nc_to_timeseries', 'Merge raw netCDF file pairs to merged timeseries netCDF files'),
+    'watch': ('watch_rt_queue', 'Watch the rt binary queue and convert and merge each segment as it arrives'),
+    'run': (None, 'Convert the binary queue, then merge the raw netCDF queue (convert followed by merge) of each '
+                  'deployment and mode, rt before delayed'),
+    'profiles': ('query_profile_catalog', 'Find profiles by time window and/or bounding box in the profile catalogs')
+}
+
+
+def add_common_arguments(arg_parser, deployments_nargs='+'):
+    arg_parser.add_argument('deployments',
+                            nargs=deployments_nargs,
+                            help='Glider deployment name(s) formatted as glider-YYYYmmddTHHMM')
+
+    arg_parser.add_argument('-l', '--loglevel',
+                            help='Verbosity level',
+                            type=str,
+                            choices=['debug', 'info', 'warning', 'error'],
+                            default='info')
+
+    arg_parser.add_argument('-test', '--test',
+                            help='Point to the environment variable key GLIDER_DATA_HOME_TEST for testing.',
+                            action='store_true')
+
+    arg_parser.add_argument('--log_root',
+                            help='Directory of the base log file (default: $RUGLIDER_LOG_ROOT, or /home/glideradm/logs)',
+                            type=str,
+                            default=None)
+
+    arg_parser.add_argument('--log_format',
+                            help='Log file format: text lines, or one JSON object per line (default: '
+                                 '$RUGLIDER_LOG_FORMAT, or text)',
+                            choices=LOG_FORMATS,
+                            default=None)
+
+
+def add_mode_argument(arg_parser, nargs=None):
+    arg_parser.add_argument('-m', '--mode',
+                            help='Dataset mode: real-time (rt) or delayed-mode (delayed)',
+                            choices=['rt', 'delayed'],
+                            nargs=nargs,
+                            default=['rt'] if nargs else 'rt')
+
+
+def add_active_argument(arg_parser):
+    arg_parser.add_argument('-A', '--all-active', '--all_active',
+                            dest='all_active',
+                            help='Also process every deployment under the deployments root with queued files of the '
+                                 'mode, found from the cached deployments index '
+                                 '($GLIDER_DATA_HOME/deployments/.deployments-index.json)',
+                            action='store_true')
+
+
+def add_lock_argument(arg_parser):
+    arg_parser.add_argument('--lock_timeout',
+                            help='Seconds to wait for another process that is processing the same deployment and mode, '
+                                 '0 skips a deployment that is locked',
+                            type=float,
+                            default=0)
+
+
+def add_metrics_argument(arg_parser):
+    arg_parser.add_argument('--metrics_textfile_dir',
+                            help='Also write a summary of the run metrics to this node-exporter textfile collector directory',
+                            type=str,
+                            default=None)
+
+
+def add_staging_argument(arg_parser):
+    arg_parser.add_argument('--staging',
+                            help='How converted files are staged between the raw netCDF queue and rawnc directories: '
+                                 'link (hardlink, falling back to reflink then copy), reflink (copy-on-write, falling '
+                                 'back to copy) or copy',
+                            choices=STAGING_METHODS,
+                            default='link')
+
+
+def add_merge_output_arguments(arg_parser):
+    arg_parser.add_argument('-c', '--chunk_size',
+                            help='Write each merged segment in chunks of this many rows, so the encoded copy made '
+                                 'for the write is at most one chunk (pyglider still loads the whole segment) '
+                                 '(default: write each segment in one call)',
+                            type=int,
+                            default=None)
+
+    arg_parser.add_argument('-e', '--encoding_profile',
+                            help='Built-in netCDF encoding profile, overrides the profile set in the deployment.yml encoding section '
+                                 '(default: the deployment.yml profile, or "default")',
+                            type=str,
+                            choices=list(ENCODING_PROFILES.keys()),
+                            default=None)
+
+    arg_parser.add_argument('--aggregate',
+                            help='Also add each merged segment to the deployment timeseries file '
+                                 '../data/out/<mode>/<deployment>-<mode>-timeseries.nc (all segments in time order)',
+                            action='store_true')
+
+
+def add_preflight_arguments(arg_parser):
+    # defaults of None fall back to the deployment.yml preflight section, then the built-in defaults
+    arg_parser.add_argument('--min_rows',
+                            help='Skip segments whose raw files have fewer rows (checked from the file headers, 0 disables; '
+                                 'default: deployment.yml preflight section, or 0)',
+                            type=int,
+                            default=None)
+
+    arg_parser.add_argument('--min_duration',
+                            help='Skip segments shorter than this many seconds (0 disables; default: deployment.yml '
+                                 'preflight section, or 0)',
+                            type=float,
+                            default=None)
+
+    arg_parser.add_argument('--min_gps_fixes',
+                            help='Skip segments with fewer GPS fixes (0 disables; default: deployment.yml preflight '
+                                 'section, or 0)',
+                            type=int,
+                            default=None)
+
+    arg_parser.add_argument('--preflight_action',
+                            help='What to do with segments that fail the pre-flight check: skip (record them as merged '
+                                 'without an output file) or defer (leave them in the queue); default: deployment.yml '
+                                 'preflight section, or skip',
+                            choices=PREFLIGHT_ACTIONS,
+                            default=None)
+
+
+def add_deploymentyaml_arguments(arg_parser):
+    add_common_arguments(arg_parser, deployments_nargs='*')
+
+    arg_parser.add_argument('-a', '--all',
+                            help='Generate deployment.yml for every deployment under the deployments root that has a '
+                                 'deployment-template.yml in ../config/proc',
+                            action='store_true')
+
+    arg_parser.add_argument('-f', '--force',
+                            help='Regenerate deployment.yml even if its input files are unchanged since it was generated',
+                            action='store_true')
+
+
+def add_convert_arguments(arg_parser):
+    add_common_arguments(arg_parser, deployments_nargs='*')
+    add_active_argument(arg_parser)
+    add_mode_argument(arg_parser)
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='Maximum number of worker processes used to convert binary files in parallel, '
+                                 'across deployments and across shards of each deployment binary queue',
+                            type=int,
+                            default=1)
+
+    add_staging_argument(arg_parser)
+    add_lock_argument(arg_parser)
+    add_metrics_argument(arg_parser)
+
+
+def add_merge_arguments(arg_parser):
+    add_common_arguments(arg_parser, deployments_nargs='*')
+    add_active_argument(arg_parser)
+    add_mode_argument(arg_parser)
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='Number of worker processes used to merge segments in parallel',
+                            type=int,
+                            default=1)
+
+    arg_parser.add_argument('-f', '--force',
+                            help='Merge all queued segments, even if their inputs and deployment.yml are unchanged since they were last merged',
+                            action='store_true')
+
+    add_merge_output_arguments(arg_parser)
+    add_preflight_arguments(arg_parser)
+    add_lock_argument(arg_parser)
+    add_metrics_argument(arg_parser)
+
+
+def add_watch_arguments(arg_parser):
+    add_common_arguments(arg_parser)
+
+    arg_parser.add_argument('-t', '--single_timeout',
+                            help='Seconds to wait for the other half of a segment (sbd/tbd) before processing a single file',
+                            type=float,
+                            default=900)
+
+    arg_parser.add_argument('-p', '--poll',
+                            help='Polling interval in seconds (polling watcher) or maximum time between pending segment checks (inotify)',
+                            type=float,
+                            default=10)
+
+    arg_parser.add_argument('--polling',
+                            help='Scan the queue directories instead of using inotify (e.g. for network filesystems)',
+                            action='store_true')
+
+    add_staging_argument(arg_parser)
+    add_merge_output_arguments(arg_parser)
+    add_preflight_arguments(arg_parser)
+    add_metrics_argument(arg_parser)
+
+
+def add_run_arguments(arg_parser):
+    add_common_arguments(arg_parser, deployments_nargs='*')
+    add_active_argument(arg_parser)
+    add_mode_argument(arg_parser, nargs='+')
+
+    arg_parser.add_argument('-j', '--jobs',
+                            help='Number of deployment and mode jobs that run at the same time (rt jobs start first, '
+                                 'delayed-mode jobs run at a lower CPU priority)',
+                            type=int,
+                            default=1)
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='Number of worker processes used by the convert and merge steps of each job',
+                            type=int,
+                            default=1)
+
+    arg_parser.add_argument('-f', '--force',
+                            help='Merge all queued segments, even if their inputs and deployment.yml are unchanged since they were last merged',
+                            action='store_true')
+
+    add_staging_argument(arg_parser)
+    add_merge_output_arguments(arg_parser)
+    add_preflight_arguments(arg_parser)
+    add_lock_argument(arg_parser)
+    add_metrics_argument(arg_parser)
+
+
+def add_profiles_arguments(arg_parser):
+    add_common_arguments(arg_parser, deployments_nargs='*')
+    add_mode_argument(arg_parser)
+
+    arg_parser.add_argument('-a', '--all',
+                            help='Query the profile catalogs of every deployment under the deployments root',
+                            action='store_true')
+
+    arg_parser.add_argument('-s', '--start',
+                            help='Start of the time window, e.g. 2025-03-25T00:00 (UTC unless a timezone is given)',
+                            type=str,
+                            default=None)
+
+    arg_parser.add_argument('-e', '--end',
+                            help='End of the time window, e.g. 2025-06-01 (UTC unless a timezone is given)',
+                            type=str,
+                            default=None)
+
+    arg_parser.add_argument('-b', '--bbox',
+                            help='Bounding box of the profile positions',
+                            nargs=4,
+                            type=float,
+                            metavar=('LON_MIN', 'LAT_MIN', 'LON_MAX', 'LAT_MAX'),
+                            default=None)
+
+    arg_parser.add_argument('--format',
+                            help='Output format',
+                            choices=['csv', 'json'],
+                            default='csv')
+
+
+ADD_ARGUMENTS = {
+    'deployment-yaml': add_deploymentyaml_arguments,
+    'convert': add_convert_arguments,
+    'merge': add_merge_arguments,
+    'watch': add_watch_arguments,
+    'run': add_run_arguments,
+    'profiles': add_profiles_arguments
+}
+
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(prog='ruglider', description=__doc__)
+    subparsers = arg_parser.add_subparsers(dest='command', metavar='command', required=True)
+    for command, (__, description) in SUBCOMMANDS.items():
+        subparser = subparsers.add_parser(command, help=description, description=description,
+                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+        ADD_ARGUMENTS[command](subparser)
+
+    return arg_parser
+
+
+def run_job(job):
+    # convert the binary queue of one deployment and mode, then merge everything that was staged in the raw
+    # netcdf queue (runs in a scheduler worker, which already holds the deployment lock)
+    convert = importlib.import_module(SUBCOMMANDS['convert'][0])
+    merge = importlib.import_module(SUBCOMMANDS['merge'][0])
+    status = convert.main(job['args'])
+    if status:
+        return status
+
+    return merge.main(job['args'])
+
+
+def run(args):
+    # one job per deployment and mode, scheduled rt first on a pool of args.jobs workers
+    from ruglider_processing import paths
+    from ruglider_processing.deployindex import update_index, active_deployments
+    from ruglider_processing.loggers import logfile_basename, setup_logger
+    from ruglider_processing.scheduler import new_job, schedule_jobs
+
+    logging_base = setup_logger('logging_base', args.loglevel.upper(), logfile_basename())
+    data_home, deployments_root = paths.find_glider_deployments_rootdir(logging_base, args.test)
+    if not isinstance(deployments_root, str):
+        return 1
+
+    # listed deployments run in every mode, deployments found with --all-active only in the modes with queued files
+    modes = list(dict.fromkeys(args.mode))
+    deployment_modes = {deployment: modes for deployment in args.deployments}
+    index = dict(deployments=dict())
+    if args.all_active:
+        index = update_index(logging_base, deployments_root)
+        for mode in modes:
+            for deployment in active_deployments(index, mode):
+                if deployment not in args.deployments:
+                    deployment_modes.setdefault(deployment, []).append(mode)
+    if len(deployment_modes) == 0:
+        if args.all_active:
+            logging_base.info('No deployments with queued files')
+            return 0
+        logging_base.error('No deployments provided, list deployment names or use --all-active')
+        return 1
+
+    jobs = []
+    for deployment, job_modes in deployment_modes.items():
+        if deployment in index['deployments']:
+            deployment_location = index['deployments'][deployment]['location']
+        else:
+            deployment_location = paths.find_glider_deployment_location(logging_base, deployment, deployments_root)
+        if deployment_location is None:
+            continue
+        for mode in job_modes:
+            job_args = copy.copy(args)
+            job_args.deployments = [deployment]
+            job_args.all_active = False
+            job_args.mode = mode
+            jobs.append(new_job(deployment, mode, deployment_location, args=job_args))
+
+    records = schedule_jobs(jobs, run_job, args.jobs, logging_base, args.lock_timeout)
+
+    return int(any(r['status'] not in ('done', 'locked') for r in records))
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_root, args.log_format)
+    if args.command == 'run':
+        return run(args)
+
+    # import the processing script only now that the arguments are valid
+    script = importlib.import_module(SUBCOMMANDS[args.command][0])
+
+    return script.main(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,156 +1,128 @@
 #!/usr/bin/env python
 
-import os
-import re
+from datetime import datetime
 import pandas as pd
-import pytz
 from netCDF4 import num2date
 import numpy as np
-from dateutil import parser
 from netCDF4 import default_fillvals
 import xarray as xr
+# deployment path discovery lives in paths.py (no netCDF/xarray imports), imported here for existing callers
+from ruglider_processing.paths import find_glider_deployment_datapath, find_glider_deployment_location, \
+    find_glider_deployments_rootdir
 
 
-def convert_epoch_ts(data):
-    if isinstance(data, xr.core.dataarray.DataArray):
-        time = pd.to_datetime(num2date(data.values, data.units, only_use_cftime_datetimes=False))
-    elif isinstance(data, pd.core.indexes.base.Index):
-        time = pd.to_datetime(num2date(data, 'seconds since 1970-01-01T00:00:00Z', only_use_cftime_datetimes=False))
-    elif isinstance(data, pd.core.indexes.datetimes.DatetimeIndex):
-        time = pd.to_datetime(num2date(data, 'seconds since 1970-01-01T00:00:00Z', only_use_cftime_datetimes=False))
+EPOCH_UNITS = 'seconds since 1970-01-01T00:00:00Z'
 
-    return time
+# microseconds per time unit (the units num2date supports, except months and years)
+TIME_UNIT_MICROSECONDS = dict(
+    microseconds=1, microsecond=1, microsec=1, microsecs=1,
+    milliseconds=1000, millisecond=1000, millisec=1000, millisecs=1000, msec=1000, msecs=1000, ms=1000,
+    seconds=1000000, second=1000000, sec=1000000, secs=1000000, s=1000000,
+    minutes=60000000, minute=60000000, min=60000000, mins=60000000,
+    hours=3600000000, hour=3600000000, hr=3600000000, hrs=3600000000, h=3600000000,
+    days=86400000000, day=86400000000, d=86400000000
+)
+
+# calendars that num2date decodes to python datetimes, other calendars are left to num2date
+REAL_WORLD_CALENDARS = ['standard', 'gregorian', 'proleptic_gregorian']
 
+# datetime64 dtype pd.to_datetime gives python datetimes (microseconds from pandas 3, nanoseconds before)
+_DATETIME_DTYPE = pd.to_datetime([datetime(2000, 1, 1)]).dtype
+_INT64 = np.iinfo(np.int64)
 
-def find_glider_deployment_datapath(logger, deployment, deployments_root, mode):
+
+def _num2date_fast(values, units, calendar='standard'):
     """
-    Find the glider deployment binary data path
-    :param logger: logger object
-    :param deployment: glider deployment/trajectory name e.g. ru44-20250306T0038
-    :param deployments_root: root directory for glider deployments
-    :return: deployment_location
+    Vectorized equivalent of pd.to_datetime(num2date(values, units, calendar, only_use_cftime_datetimes=False))
+    for numeric times in real-world calendars, with the same microsecond rounding as num2date
+    :param values: numpy array of numeric times
+    :param units: CF time units e.g. 'seconds since 1970-01-01T00:00:00Z'
+    :param calendar: CF calendar
+    :return: pandas DatetimeIndex, None if the times have to be converted with num2date
     """
-    glider_regex = re.compile(r'^(.*)-(\d{8}T\d{4})')
-    match = glider_regex.search(deployment)
-    if match:
-        try:
-            (glider, trajectory) = match.groups()
-            try:
-                trajectory_dt = parser.parse(trajectory).replace(tzinfo=pytz.UTC)
-            except ValueError as e:
-                logger.error('Error parsing trajectory date {:s}: {:}'.format(trajectory, e))
-                trajectory_dt = None
-                deployment_location = None
-
-            if trajectory_dt:
-                trajectory = '{:s}-{:s}'.format(glider, trajectory_dt.strftime('%Y%m%dT%H%M'))
-                deployment_name = os.path.join('{:0.0f}'.format(trajectory_dt.year), trajectory)
-
-                # Create fully-qualified path to the deployment location
-                deployment_location = os.path.join(deployments_root, deployment_name)
-                if mode == 'delayed':
-                    modemap = 'debd'
-                elif mode == 'rt':
-                    modemap = 'stbd'
-                else:
-                    logger.warning('{:s} invalid mode provided: {:s}'.format(trajectory, mode))
-                if os.path.isdir(deployment_location):
-                    # Set the deployment raw netcdf data path
-                    nc_outpath = os.path.join(deployment_location, 'data', 'in', 'rawnc', modemap)
-
-                    # Set the deployment output file directory
-                    outdir = os.path.join(deployment_location, 'data', 'out', mode, 'qc_queue')
-                    if not os.path.isdir(nc_outpath):
-                        logger.warning(f'{trajectory} data directory not found: {nc_outpath}')
-                        nc_outpath = None
-                        deployment_location = None
-                        outdir = None
-                else:
-                    logger.warning(f'Deployment location does not exist: {deployment_location}')
-                    nc_outpath = None
-                    deployment_location = None
-                    outdir = None
-
-        except ValueError as e:
-            logger.error(f'Error parsing invalid deployment name {deployment}: {e}')
-            nc_outpath = None
-            deployment_location = None
-            outdir = None
+    unit, since = (units.split(None, 2) + ['', ''])[:2]
+    factor = TIME_UNIT_MICROSECONDS.get(unit.lower())
+    if factor is None or since.lower() != 'since' or calendar.lower() not in REAL_WORLD_CALENDARS \
+            or values.dtype.kind not in 'iuf' or values.ndim == 0 or values.size == 0:
+        return None
+
+    # the reference time as num2date parses it (including any utc offset), a python datetime unless it's before 1582
+    basedate = num2date(0, units, calendar, only_use_cftime_datetimes=False)
+    if not isinstance(basedate, datetime):
+        return None
+
+    if values.dtype.kind == 'f':
+        # num2date scales in extended precision and rounds to the microsecond, snapping times 1 microsecond from a
+        # whole second to the second. Missing values decode to the reference time (num2date masks them and
+        # pd.to_datetime drops the mask).
+        num = values.astype(np.longdouble)
+        num[~np.isfinite(num)] = 0
+        num *= factor
+        if num.min() < _INT64.min or num.max() > _INT64.max:
+            return None
+        microseconds = np.rint(num).astype(np.int64)
+        if factor > 1000:
+            # floor and ceil are slow in extended precision, so only the times that snap are recalculated
+            snap = microseconds % 1000000 == 1
+            microseconds[snap] = np.floor(num[snap]).astype(np.int64)
+            snap = microseconds % 1000000 == 999999
+            microseconds[snap] = np.ceil(num[snap]).astype(np.int64)
     else:
-        logger.error(f'Cannot pull glider name from {deployment}')
-        nc_outpath = None
-        deployment_location = None
-        outdir = None
+        if int(values.min()) * factor < _INT64.min or int(values.max()) * factor > _INT64.max:
+            return None
+        microseconds = values.astype(np.int64) * factor
+
+    # python datetimes are limited to years 1-9999
+    base = np.datetime64(basedate, 'us')
+    earliest = (np.datetime64('0001-01-01', 'us') - base).astype(np.int64)
+    latest = (np.datetime64('9999-12-31T23:59:59.999999', 'us') - base).astype(np.int64)
+    if microseconds.min() < earliest or microseconds.max() > latest:
+        return None
 
-    return nc_outpath, outdir, deployment_location
+    time = pd.to_datetime((base + microseconds.astype('timedelta64[us]')).ravel())
+    if time.dtype != _DATETIME_DTYPE:
+        time = time.as_unit(np.datetime_data(_DATETIME_DTYPE)[0])
+
+    return time
 
 
-def find_glider_deployment_location(logger, deployment, deployments_root):
+def epoch_to_datetimeindex(values, units=EPOCH_UNITS, calendar='standard'):
     """
-    Find the glider deployment location
-    :param logger: logger object
-    :param deployment: glider deployment/trajectory name e.g. ru44-20250306T0038
-    :param deployments_root: root directory for glider deployments
-    :return: deployment_location
+    Convert numeric times to a pandas DatetimeIndex, vectorized for the common case (e.g. seconds since 1970-01-01
+    in the standard calendar) and with num2date for other calendars or reference times
+    :param values: array of numeric times
+    :param units: CF time units
+    :param calendar: CF calendar
+    :return: pandas DatetimeIndex
     """
-    glider_regex = re.compile(r'^(.*)-(\d{8}T\d{4})')
-    match = glider_regex.search(deployment)
-    if match:
-        try:
-            (glider, trajectory) = match.groups()
-            try:
-                trajectory_dt = parser.parse(trajectory).replace(tzinfo=pytz.UTC)
-            except ValueError as e:
-                logger.error('Error parsing trajectory date {:s}: {:}'.format(trajectory, e))
-                trajectory_dt = None
-                data_path = None
-                deployment_location = None
-
-            if trajectory_dt:
-                trajectory = '{:s}-{:s}'.format(glider, trajectory_dt.strftime('%Y%m%dT%H%M'))
-                deployment_name = os.path.join('{:0.0f}'.format(trajectory_dt.year), trajectory)
-
-                # Create fully-qualified path to the deployment location
-                deployment_location = os.path.join(deployments_root, deployment_name)
-
-                if os.path.isdir(deployment_location):
-                    logger.info(f'Deployment location found: {deployment_location}')
-                else:
-                    logger.warning(f'Deployment location does not exist: {deployment_location}')
-                    deployment_location = None
-
-        except ValueError as e:
-            logger.error(f'Error parsing invalid deployment name {deployment}: {e}')
-            deployment_location = None
-    else:
-        logger.error(f'Cannot pull glider name from {deployment}')
-        deployment_location = None
+    time = _num2date_fast(np.asarray(values), units, calendar)
+    if time is None:
+        time = pd.to_datetime(num2date(values, units, calendar, only_use_cftime_datetimes=False))
 
-    return deployment_location
+    return time
 
 
-def find_glider_deployments_rootdir(logger, test):
-    # Find the glider deployments root directory
-    if test:
-        envvar = 'GLIDER_DATA_HOME_TEST'
+def convert_epoch_ts(data):
+    """
+    Convert glider times to a pandas DatetimeIndex
+    :param data: xarray DataArray of numeric times with a units (and optional calendar) attribute, or of datetimes,
+    a pandas Index of seconds since 1970-01-01, or a DatetimeIndex (returned as it is)
+    :return: pandas DatetimeIndex
+    """
+    # DatetimeIndex is a subclass of Index, so it's checked first
+    if isinstance(data, pd.DatetimeIndex):
+        time = pd.to_datetime(data)
+    elif isinstance(data, xr.DataArray):
+        if np.issubdtype(data.dtype, np.datetime64):
+            time = pd.to_datetime(data.values)
+        else:
+            time = epoch_to_datetimeindex(data.values, data.units, data.attrs.get('calendar', 'standard'))
+    elif isinstance(data, pd.Index):
+        time = epoch_to_datetimeindex(data.values)
     else:
-        envvar = 'GLIDER_DATA_HOME'
-
-    data_home = os.getenv(envvar)
-
-    if not data_home:
-        logger.error('{:s} not set'.format(envvar))
-        return 1, 1
-    elif not os.path.isdir(data_home):
-        logger.error('Invalid {:s}: {:s}'.format(envvar, data_home))
-        return 1, 1
-
-    deployments_root = os.path.join(data_home, 'deployments')
-    if not os.path.isdir(deployments_root):
-        logger.warning('Invalid deployments root: {:s}'.format(deployments_root))
-        return 1, 1
+        raise TypeError(f'Cannot convert {type(data).__name__} to datetimes')
 
-    return data_home, deployments_root
+    return time
 
 
 def return_season(ts):
@@ -187,3 +159,33 @@ def set_encoding(data_array, original_encoding=None):
         # set the fill value using netCDF4.default_fillvals
         data_type = f'{data_array.dtype.kind}{data_array.dtype.itemsize}'
         data_array.encoding['_FillValue'] = default_fillvals[data_type]
+
+
+def profile_nanmeans(profile_id, sources):
+    """
+    Calculate the mean of one or more variables for each profile in a single pass
+    :param profile_id: array of profile identifiers, rows that aren't in a profile are 0
+    :param sources: list of arrays (same shape as profile_id) to average for each profile
+    :return: list of arrays the same shape as profile_id containing the profile mean of each source
+    (0 for rows that aren't in a profile, NaN for profiles where the source is all NaN)
+    """
+    profile_id = np.asarray(profile_id)
+    means = [np.zeros(np.shape(profile_id)) for s in sources]
+
+    inprofile = (profile_id != 0) & ~pd.isna(profile_id)
+    if not np.any(inprofile):
+        return means
+
+    # map each row in a profile to its profile number (0..nprofiles-1) with one sort
+    unique_ids, inverse = np.unique(profile_id[inprofile], return_inverse=True)
+    inverse = inverse.ravel()
+    for v, source in zip(means, sources):
+        values = np.asarray(source, dtype=float)[inprofile]
+        valid = ~np.isnan(values)
+        sums = np.bincount(inverse[valid], weights=values[valid], minlength=len(unique_ids))
+        counts = np.bincount(inverse[valid], minlength=len(unique_ids))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profile_means = np.where(counts > 0, sums / counts, np.nan)
+        v[inprofile] = profile_means[inverse]
+
+    return means
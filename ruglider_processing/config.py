@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+import os
+import copy
+import json
+import hashlib
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+CACHE_VERSION = 2
+
+# parsed deployment.yml files in this process: full path: (file signature, config dictionary)
+_config_cache = dict()
+
+# full path: (file signature, sha256 of the file contents), so unchanged files aren't hashed again
+_hash_cache = dict()
+
+# parsed config layers (e.g. deployment-template.yml, instruments.json) in this process: sha256: parsed contents
+_layer_cache = dict()
+
+
+def _file_signature(filepath):
+    st = os.stat(filepath)
+    return st.st_mtime_ns, st.st_size
+
+
+def file_content_hash(filepath):
+    """
+    Calculate the sha256 of a file's contents, remembered until the file's mtime or size changes
+    :param filepath: full file path
+    :return: hex digest
+    """
+    filepath = os.path.abspath(filepath)
+    signature = _file_signature(filepath)
+    cached = _hash_cache.get(filepath)
+    if not cached or cached[0] != signature:
+        with open(filepath, 'rb') as f:
+            cached = (signature, hashlib.sha256(f.read()).hexdigest())
+        _hash_cache[filepath] = cached
+
+    return cached[1]
+
+
+def load_config_layer(filepath):
+    """
+    Parse a yaml or json config file that is often shared by many deployments (e.g. deployment-template.yml,
+    instruments.json). Files are parsed once per distinct content in this process, so identical copies in
+    different deployment config directories are only parsed once.
+    :param filepath: full path to a .yml/.yaml or .json file
+    :return: parsed contents (a copy, safe to modify)
+    :raises yaml.YAMLError or json.JSONDecodeError: if the file can't be parsed
+    """
+    content_hash = file_content_hash(filepath)
+    if content_hash not in _layer_cache:
+        with open(filepath, 'r') as file:
+            if filepath.endswith('.json'):
+                _layer_cache[content_hash] = json.load(file)
+            else:
+                _layer_cache[content_hash] = yaml.load(file, Loader=SafeLoader)
+
+    return copy.deepcopy(_layer_cache[content_hash])
+
+
+def sidecar_path(deploymentyaml):
+    # json cache of the parsed deployment.yml, next to the file e.g. ../config/proc/.deployment.yml.cache.json
+    dirname, basename = os.path.split(deploymentyaml)
+    return os.path.join(dirname, f'.{basename}.cache.json')
+
+
+def validate_deployment_config(deployment_meta):
+    """
+    Check that a parsed deployment.yml has the sections needed to process a deployment
+    :param deployment_meta: parsed contents of deployment.yml
+    :raises ValueError: listing all of the problems found
+    """
+    if not isinstance(deployment_meta, dict):
+        raise ValueError('deployment.yml does not contain a mapping')
+
+    problems = []
+    for section in ['metadata', 'netcdf_variables', 'profile_variables', 'platform']:
+        if not isinstance(deployment_meta.get(section), dict):
+            problems.append(f'missing or empty section: {section}')
+
+    netcdf_variables = deployment_meta.get('netcdf_variables') or dict()
+    if isinstance(netcdf_variables, dict):
+        if 'time' not in netcdf_variables:
+            problems.append('netcdf_variables has no time variable')
+        for var, attributes in netcdf_variables.items():
+            if not isinstance(attributes, dict) or 'source' not in attributes:
+                problems.append(f'netcdf_variables {var} has no source')
+
+    profile_variables = deployment_meta.get('profile_variables') or dict()
+    if isinstance(profile_variables, dict) and isinstance(netcdf_variables, dict):
+        for var, attributes in profile_variables.items():
+            source = (attributes or dict()).get('source')
+            if source is not None and source not in netcdf_variables:
+                problems.append(f'profile_variables {var} source {source} is not in netcdf_variables')
+
+    if problems:
+        raise ValueError('; '.join(problems))
+
+
+def _write_sidecar(sidecarfile, signature, deployment_meta):
+    # write the sidecar atomically, it's only a cache so failures (e.g. read-only config directory) are ignored
+    try:
+        text = json.dumps(dict(version=CACHE_VERSION, signature=list(signature), config=deployment_meta))
+    except (TypeError, ValueError):
+        return
+    if json.loads(text)['config'] != deployment_meta:
+        return
+    tmpfile = f'{sidecarfile}.{os.getpid()}.tmp'
+    try:
+        with open(tmpfile, 'w') as f:
+            f.write(text)
+        os.replace(tmpfile, sidecarfile)
+    except OSError:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+
+def load_deployment_config(deploymentyaml, sidecar=False):
+    """
+    Load and validate a deployment.yml file once. The parsed config is cached in memory for the life of the
+    process and, optionally, in a json sidecar file so other processes and later pipeline stages don't
+    parse the YAML again. Both caches are invalidated when the file's mtime or size changes.
+    :param deploymentyaml: full path to deployment.yml
+    :param sidecar: read/write the json sidecar cache file (see sidecar_path). A config that doesn't survive a
+    json round trip unchanged (e.g. yaml dates or non-string keys) isn't cached in the sidecar.
+    :return: parsed deployment.yml dictionary (shared, don't modify it)
+    :raises yaml.YAMLError: if the file can't be parsed
+    :raises ValueError: if the file is missing required sections (see validate_deployment_config)
+    """
+    deploymentyaml = os.path.abspath(deploymentyaml)
+    signature = _file_signature(deploymentyaml)
+
+    cached = _config_cache.get(deploymentyaml)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    deployment_meta = None
+    sidecarfile = sidecar_path(deploymentyaml)
+    if sidecar and os.path.isfile(sidecarfile):
+        try:
+            with open(sidecarfile, 'r') as f:
+                sidecar_data = json.load(f)
+            if sidecar_data.get('version') == CACHE_VERSION and sidecar_data.get('signature') == list(signature):
+                deployment_meta = sidecar_data['config']
+        except (OSError, ValueError, AttributeError, KeyError):
+            deployment_meta = None
+
+    if deployment_meta is None:
+        with open(deploymentyaml, 'r') as file:
+            deployment_meta = yaml.load(file, Loader=SafeLoader)  # Parse the YAML file
+        validate_deployment_config(deployment_meta)
+
+        if sidecar:
+            _write_sidecar(sidecarfile, signature, deployment_meta)
+
+    _config_cache[deploymentyaml] = (signature, deployment_meta)
+
+    return deployment_meta
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+from ruglider_processing.paths import DEPLOYMENT_NAME_REGEX
+
+INDEX_VERSION = 1
+
+# binary and raw netcdf file suffixes of each dataset mode, rt and delayed files share the queue directories
+MODE_SUFFIXES = dict(rt=['sbd', 'tbd'], delayed=['dbd', 'ebd'])
+
+# raw netcdf directory of each dataset mode, a deployment has a mode if its directory exists
+MODE_DIRS = dict(rt='stbd', delayed='debd')
+
+# a directory modified this recently is scanned again on the next run, since a file added within the same mtime
+# tick (coarse on some NFS servers) wouldn't change the cached mtime
+MTIME_SETTLE_SECONDS = 2
+
+
+def index_path(deployments_root):
+    # cached index of the deployments under the deployments root e.g. $GLIDER_DATA_HOME/deployments/.deployments-index.json
+    return os.path.join(deployments_root, '.deployments-index.json')
+
+
+def queued_files(dirpath):
+    """
+    Count the binary or raw netcdf files of each dataset mode in a queue directory with one scan
+    :param dirpath: queue directory, a missing directory has no queued files
+    :return: dictionary of mode: number of files
+    """
+    suffixes = {s: mode for mode, mode_suffixes in MODE_SUFFIXES.items()
+                for suffix in mode_suffixes for s in [suffix, f'{suffix}.nc']}
+    counts = {mode: 0 for mode in MODE_SUFFIXES}
+    try:
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                mode = suffixes.get(entry.name.partition('.')[2].lower())
+                if mode and entry.is_file():
+                    counts[mode] += 1
+    except FileNotFoundError:
+        pass
+
+    return counts
+
+
+def _mtime(dirpath, now):
+    # directory mtime to cache, None if the directory is missing or was modified too recently to be trusted
+    try:
+        mtime = os.stat(dirpath).st_mtime
+    except FileNotFoundError:
+        return None
+    return mtime if now - mtime >= MTIME_SETTLE_SECONDS else None
+
+
+def _cached(entry, key, mtime):
+    # True if a cached directory scan is still valid
+    return entry is not None and mtime is not None and entry['mtimes'].get(key) == mtime
+
+
+def scan_deployment(deployment_location, cached=None):
+    """
+    Index a deployment: its dataset modes and the number of files of each mode in the binary and raw netcdf queues.
+    Each directory is only listed again if its mtime changed since the cached entry was built.
+    :param deployment_location: full path to the deployment directory
+    :param cached: optional index entry from a previous scan
+    :return: index entry dictionary of location, modes, queued (mode: number of files), mtimes and rescanned
+    (number of directories listed)
+    """
+    now = time.time()
+    dirs = dict(binary_queue=os.path.join(deployment_location, 'data', 'in', 'binary', 'queue'),
+                rawnc_queue=os.path.join(deployment_location, 'data', 'in', 'rawnc', 'queue'),
+                rawnc=os.path.join(deployment_location, 'data', 'in', 'rawnc'))
+    entry = dict(location=deployment_location, mtimes=dict(), scans=dict(), rescanned=0)
+    for key, dirpath in dirs.items():
+        mtime = _mtime(dirpath, now)
+        entry['mtimes'][key] = mtime
+        if _cached(cached, key, mtime):
+            entry['scans'][key] = cached['scans'][key]
+            continue
+        entry['rescanned'] += 1
+        if key == 'rawnc':
+            # the modes the deployment has been set up for
+            entry['scans'][key] = [mode for mode, modedir in MODE_DIRS.items()
+                                   if os.path.isdir(os.path.join(dirpath, modedir))]
+        else:
+            entry['scans'][key] = queued_files(dirpath)
+
+    entry['modes'] = entry['scans']['rawnc']
+    entry['queued'] = {mode: entry['scans']['binary_queue'][mode] + entry['scans']['rawnc_queue'][mode]
+                       for mode in MODE_SUFFIXES}
+
+    return entry
+
+
+def load_index(filepath, deployments_root):
+    # read a cached index, an unreadable index or one built by another version or for another root is ignored
+    try:
+        with open(filepath) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != INDEX_VERSION or index.get('deployments_root') != deployments_root:
+        return None
+
+    return index
+
+
+def save_index(index, filepath):
+    # write to a temporary file and rename, overlapping runs each write a complete index (compact, the index of a
+    # large deployments root is read and written by every run)
+    tmpfile = f'{filepath}.{os.getpid()}.tmp'
+    with open(tmpfile, 'w') as f:
+        f.write(json.dumps(index, separators=(',', ':')))
+    os.replace(tmpfile, filepath)
+
+
+def update_index(logger, deployments_root):
+    """
+    Bring the cached index of the deployments under the deployments root (deployments_root/YYYY/glider-YYYYmmddTHHMM)
+    up to date. Year directories and deployment queue directories whose mtime is unchanged since the index was
+    last built aren't listed again, so an unchanged tree costs a few stat calls per deployment.
+    :param logger: logger object
+    :param deployments_root: root directory for glider deployments
+    :return: index dictionary of version, deployments_root, years (year: mtime and deployment names) and
+    deployments (name: index entry, see scan_deployment)
+    """
+    filepath = index_path(deployments_root)
+    cached = load_index(filepath, deployments_root) or dict(years=dict(), deployments=dict())
+    index = dict(version=INDEX_VERSION, deployments_root=deployments_root, years=dict(), deployments=dict())
+    now = time.time()
+    rescanned = 0
+    with os.scandir(deployments_root) as years:
+        for year in years:
+            if not (year.is_dir() and year.name.isdigit()):
+                continue
+            mtime = _mtime(year.path, now)
+            cached_year = cached['years'].get(year.name)
+            if cached_year is not None and mtime is not None and cached_year['mtime'] == mtime:
+                names = cached_year['deployments']
+            else:
+                rescanned += 1
+                with os.scandir(year.path) as entries:
+                    names = sorted(entry.name for entry in entries
+                                   if entry.is_dir() and DEPLOYMENT_NAME_REGEX.match(entry.name))
+            index['years'][year.name] = dict(mtime=mtime, deployments=names)
+
+            for name in names:
+                entry = scan_deployment(os.path.join(year.path, name), cached['deployments'].get(name))
+                rescanned += entry.pop('rescanned')
+                index['deployments'][name] = entry
+
+    logger.debug(f'Indexed {len(index["deployments"])} deployments under {deployments_root} '
+                 f'({rescanned} directories listed)')
+    if index == cached:
+        return index
+    try:
+        save_index(index, filepath)
+    except OSError as e:
+        logger.warning(f'Failed to write the deployments index {filepath}: {e}')
+
+    return index
+
+
+def active_deployments(index, mode):
+    """
+    Find the deployments that have queued binary or raw netcdf files of a dataset mode
+    :param index: index dictionary from update_index
+    :param mode: dataset mode (rt or delayed)
+    :return: sorted list of deployment names
+    """
+    return sorted(name for name, entry in index['deployments'].items()
+                  if mode in entry['modes'] and entry['queued'][mode] > 0)
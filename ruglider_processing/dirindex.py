@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import os
+import re
+
+# Slocum segment file names e.g. ru44-2025-098-0-0: glider-year-day-mission-segment
+SEGMENT_REGEX = re.compile(r'^(.+)-(\d{4})-(\d{1,3})-(\d+)-(\d+)$')
+
+
+def split_filename(filename):
+    """
+    Split a glider file name into the segment name and the (lowercase) suffix
+    e.g. ru44-2025-098-0-0.SBD -> ('ru44-2025-098-0-0', 'sbd'), ru44-2025-098-0-0.tbd.nc -> ('ru44-2025-098-0-0', 'tbd.nc')
+    :param filename: file name
+    :return: segment, suffix
+    """
+    segment, __, suffix = filename.partition('.')
+
+    return segment, suffix.lower()
+
+
+def index_directory(dirpath):
+    """
+    Scan a directory once and index the files by segment and case-insensitive suffix
+    :param dirpath: directory to scan
+    :return: dictionary of segment: {suffix: file name}
+    """
+    index = dict()
+    with os.scandir(dirpath) as entries:
+        for entry in entries:
+            if entry.is_file():
+                add_file(index, entry.name)
+
+    return index
+
+
+def add_file(index, filename):
+    # keep the index current when a file is written to the indexed directory
+    segment, suffix = split_filename(filename)
+    index.setdefault(segment, dict())[suffix] = filename
+
+
+def remove_file(index, filename):
+    # keep the index current when a file is removed from the indexed directory
+    segment, suffix = split_filename(filename)
+    files = index.get(segment, dict())
+    if files.get(suffix) == filename:
+        del files[suffix]
+        if len(files) == 0:
+            del index[segment]
+
+
+def files_with_suffix(index, suffixes, case_sensitive=False):
+    """
+    Find all indexed files with any of the suffixes
+    :param index: directory index from index_directory
+    :param suffixes: suffix or list of suffixes e.g. 'sbd' or ['sbd', 'tbd']
+    :param case_sensitive: only match files whose suffix has the same case as given (e.g. the suffix pyglider
+    converts, see suffix_case), by default *.sbd and *.SBD both match 'sbd'
+    :return: sorted list of file names
+    """
+    if isinstance(suffixes, str):
+        suffixes = [suffixes]
+    if case_sensitive:
+        exact = set(suffixes)
+        return sorted(files[s.lower()] for files in index.values() for s in suffixes
+                      if s.lower() in files and files[s.lower()].partition('.')[2] in exact)
+    suffixes = [s.lower() for s in suffixes]
+
+    return sorted(files[s] for files in index.values() for s in suffixes if s in files)
+
+
+def count_suffix(index, suffix, case_sensitive=False):
+    return len(files_with_suffix(index, suffix, case_sensitive))
+
+
+def suffix_case(index, suffix):
+    """
+    Return the suffix in the case used by the indexed files: lowercase if any lowercase files are found, otherwise
+    uppercase if any uppercase files are found (e.g. binary files are sometimes named *.SBD), otherwise lowercase
+    :param index: directory index from index_directory
+    :param suffix: suffix e.g. 'sbd'
+    """
+    names = files_with_suffix(index, suffix)
+    if not any(f.endswith(f'.{suffix.lower()}') for f in names) and any(f.endswith(f'.{suffix.upper()}') for f in names):
+        return suffix.upper()
+
+    return suffix.lower()
+
+
+def segment_key(segment):
+    """
+    Sort key of a segment name, in glider, year, day, mission and segment number order. Names that only differ in
+    zero padding (e.g. ru44-2025-098-0-1 and ru44-2025-098-0-01) sort next to each other but are different
+    segments, so the key ends with the name itself and is only used for sorting, never for matching.
+    e.g. ru44-2025-098-0-01 -> ('ru44', 2025, 98, 0, 1, 'ru44-2025-098-0-01')
+    :param segment: segment name
+    :return: (glider, year, day, mission, segment, name), (name, 0, 0, 0, 0, name) if the name can't be parsed
+    """
+    match = SEGMENT_REGEX.match(segment)
+    if not match:
+        return segment, 0, 0, 0, 0, segment
+
+    glider, year, day, mission, seg = match.groups()
+
+    return glider, int(year), int(day), int(mission), int(seg), segment
+
+
+def pair_segments(queue_index, rawnc_index, suffixes):
+    """
+    Find the missing half of each queued segment (e.g. the sbd.nc for a queued tbd.nc) in the raw netcdf directory.
+    Segments are matched on their exact name in the directory index of the raw netcdf directory built once,
+    so the lookup time doesn't depend on the number of files in the raw netcdf directory.
+    :param queue_index: directory index of the queue directory
+    :param rawnc_index: directory index of the raw netcdf directory
+    :param suffixes: suffixes that make up a pair, e.g. ['sbd.nc', 'tbd.nc']
+    :return: list of file names to copy from the raw netcdf directory to the queue,
+    list of queued segments that are still unpaired (both in segment order, see segment_key)
+    """
+    suffixes = [s.lower() for s in suffixes]
+
+    copies = []
+    unpaired = []
+    for seg in sorted(queue_index, key=segment_key):
+        queued = queue_index[seg]
+        match = rawnc_index.get(seg, dict())
+        missing = [suffix for suffix in suffixes if suffix not in queued]
+        for suffix in missing:
+            if suffix in match:
+                copies.append(match[suffix])
+            else:
+                unpaired.append(seg)
+                break
+
+    return copies, unpaired
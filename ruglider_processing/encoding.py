@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import fnmatch
+
+# Built-in encoding profiles for the merged timeseries files. 'default' is the original encoding (zlib level 1,
+# no explicit chunking). 'rt' uses moderate compression and small chunks so files are cheap to write and fast to
+# read partially (e.g. rt files pushed to the DAC), 'archive' favors higher compression for delayed-mode archives.
+# Profile settings:
+#   complevel: zlib compression level (0 = no compression)
+#   shuffle: apply the HDF5 shuffle filter before compression
+#   chunksize: chunk length along time (None = netCDF library default)
+#   least_significant_digit: optional lossy quantization of floating point variables (None = lossless)
+#   variables: per-variable overrides of the settings above, keyed by netcdf variable name, source sensor
+#              name or a glob pattern of either (e.g. 'm_*' for the engineering variables)
+ENCODING_PROFILES = {
+    'default': dict(complevel=1, shuffle=True, chunksize=None, least_significant_digit=None),
+    'rt': dict(complevel=4, shuffle=True, chunksize=4096, least_significant_digit=None),
+    'archive': dict(complevel=9, shuffle=True, chunksize=65536, least_significant_digit=None)
+}
+
+
+def resolve_encoding_profile(profile=None, config=None):
+    """
+    Build the encoding profile used to write merged files from a built-in profile and optional
+    settings from the deployment.yml 'encoding' section, e.g.
+    encoding:
+      profile: archive
+      complevel: 6
+      variables:
+        m_*:
+          least_significant_digit: 3
+    :param profile: optional built-in profile name, overrides the profile named in config
+    :param config: optional dictionary of encoding settings (deployment.yml 'encoding' section)
+    :return: dictionary of encoding settings
+    :raises ValueError: if the profile or a setting (top-level or per-variable) is unknown
+    """
+    config = dict(config or dict())
+    profile = profile or config.pop('profile', None) or 'default'
+    config.pop('profile', None)
+    if profile not in ENCODING_PROFILES:
+        raise ValueError(f'Unknown encoding profile {profile}, options are: {", ".join(ENCODING_PROFILES.keys())}')
+
+    unknown = set(config.keys()) - set(ENCODING_PROFILES['default'].keys()) - {'variables'}
+    if unknown:
+        raise ValueError(f'Unknown encoding settings: {", ".join(sorted(unknown))}')
+
+    variables = config.get('variables') or dict()
+    if not isinstance(variables, dict):
+        raise ValueError('encoding variables must be a mapping of variable name or pattern: settings')
+    for pattern, overrides in variables.items():
+        if not isinstance(overrides, dict):
+            raise ValueError(f'encoding variables {pattern} must be a mapping of settings')
+        unknown = set(overrides.keys()) - set(ENCODING_PROFILES['default'].keys())
+        if unknown:
+            raise ValueError(f'Unknown encoding settings for variables {pattern}: {", ".join(sorted(unknown))}')
+
+    settings = dict(ENCODING_PROFILES[profile])
+    settings['variables'] = dict()
+    settings.update(config)
+    settings['name'] = profile
+
+    return settings
+
+
+def variable_encoding_settings(settings, variable, source=None):
+    """
+    Find the encoding settings for one variable, applying any matching per-variable overrides in order
+    :param settings: encoding profile from resolve_encoding_profile
+    :param variable: netcdf variable name
+    :param source: optional source sensor name of the variable (e.g. m_pitch for pitch)
+    :return: dictionary of complevel, shuffle, chunksize and least_significant_digit
+    """
+    varsettings = {k: v for k, v in settings.items() if k not in ['variables', 'name']}
+    for pattern, overrides in settings.get('variables', dict()).items():
+        names = [variable] if source is None else [variable, source]
+        if any(fnmatch.fnmatchcase(name, pattern) for name in names):
+            varsettings.update(overrides)
+
+    return varsettings
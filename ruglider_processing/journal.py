@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+import os
+import re
+import json
+import shutil
+
+JOURNAL_VERSION = 1
+
+# temporary output names include the pid of the writing process: <name>.<pid>.tmp files (atomic writes)
+# and .convert-<pid>-* (pyglider conversion output), .queue-shards-<pid>-* (binary queue shards) and
+# .worker-<pid>-* (private cache file copies) directories
+TMP_PATTERNS = [re.compile(r'\.(\d+)\.tmp$'), re.compile(r'^\.convert-(\d+)-'), re.compile(r'^\.queue-shards-(\d+)-'),
+                re.compile(r'^\.worker-(\d+)-')]
+
+
+def convert_journal_path(deployment_location, mode):
+    # segments converted by a run that hasn't finished yet, e.g. ../data/in/binary/convert-rt-journal.jsonl
+    return os.path.join(deployment_location, 'data', 'in', 'binary', f'convert-{mode}-journal.jsonl')
+
+
+def merge_journal_path(deployment_location, mode):
+    # segments merged since the merge manifest was last saved, e.g. ../data/out/rt/segment_manifest.journal.jsonl
+    return os.path.join(deployment_location, 'data', 'out', mode, 'segment_manifest.journal.jsonl')
+
+
+def append_journal(filepath, segment, **fields):
+    """
+    Record a completed segment in a journal. The record is appended as one line and flushed to disk before
+    returning, so completed work survives a crash of the process (or node) that did it.
+    :param filepath: full path to the journal file
+    :param segment: segment name e.g. ru44-2025-098-0-0
+    :param fields: additional JSON-serializable fields to record for the segment
+    """
+    line = json.dumps(dict(version=JOURNAL_VERSION, segment=segment, **fields), sort_keys=True) + '\n'
+    fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line.encode())
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_journal(filepath):
+    """
+    Read the records of a journal, a record that was only partially written when a run was interrupted is ignored
+    :param filepath: full path to the journal file
+    :return: dictionary of segment: latest record for the segment
+    """
+    records = dict()
+    if not os.path.isfile(filepath):
+        return records
+
+    with open(filepath, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('version') == JOURNAL_VERSION:
+                records[record['segment']] = record
+
+    return records
+
+
+def clear_journal(filepath):
+    # the journaled work has been committed (e.g. folded into the manifest, queue files removed)
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+
+def _pid_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def remove_stale_tmp(directory):
+    """
+    Remove temporary files and directories left in a directory by writers that are no longer running
+    (e.g. a merge that was killed partway through writing a file)
+    :param directory: directory to clean up
+    :return: list of removed names
+    """
+    removed = []
+    if not os.path.isdir(directory):
+        return removed
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            for pattern in TMP_PATTERNS:
+                match = pattern.search(entry.name)
+                if match:
+                    break
+            else:
+                continue
+            if int(match.group(1)) == os.getpid() or _pid_running(int(match.group(1))):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+            removed.append(entry.name)
+
+    return removed
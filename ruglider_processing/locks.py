@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+import os
+import time
+import fcntl
+from contextlib import contextmanager
+import ruglider_processing.paths as paths
+
+# lock files held by this process: lock file path: [file descriptor, count], so the same process can take a lock
+# again (e.g. ruglider run holds the lock while it calls the convert and merge steps, which take it too)
+_HELD = dict()
+
+
+def lock_path(deployment_location, mode):
+    # one lock per deployment and dataset mode e.g. ../ru44-20250325T0438/.ruglider-rt.lock, rt and delayed
+    # processing only share directories where their files are told apart by suffix
+    return os.path.join(deployment_location, f'.ruglider-{mode}.lock')
+
+
+def acquire_lock(filepath, timeout=0):
+    """
+    Take an exclusive lock (flock) on a lock file. The lock is released when the process exits, so a killed process
+    never leaves a deployment locked.
+    :param filepath: full path to the lock file (see lock_path)
+    :param timeout: seconds to wait for another process to release the lock, 0 doesn't wait
+    :return: True if the lock was taken (or is already held by this process)
+    """
+    if filepath in _HELD:
+        _HELD[filepath][1] += 1
+        return True
+
+    fd = os.open(filepath, os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                return False
+            time.sleep(min(1., max(deadline - time.monotonic(), 0.)))
+
+    # record the owner so a process that finds the deployment locked can report who holds it
+    os.ftruncate(fd, 0)
+    os.write(fd, f'{os.getpid()}\n'.encode())
+    _HELD[filepath] = [fd, 1]
+
+    return True
+
+
+def release_lock(filepath):
+    # release a lock taken with acquire_lock (the lock file is left in place, removing it would race with other lockers)
+    if filepath not in _HELD:
+        return
+    _HELD[filepath][1] -= 1
+    if _HELD[filepath][1] == 0:
+        fd = _HELD.pop(filepath)[0]
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def lock_owner(filepath):
+    # pid of the process that last took a lock, None if unknown
+    try:
+        with open(filepath) as f:
+            return int(f.read().strip() or 0) or None
+    except (OSError, ValueError):
+        return None
+
+
+def lock_deployment(logger, deployment, deployments_root, mode, timeout=0):
+    """
+    Take the lock of a deployment dataset mode before processing it, so overlapping runs (e.g. cron runs, or a
+    manual reprocess during a scheduled run) don't process the same queue directories at the same time
+    :param logger: logger object
+    :param deployment: glider deployment name e.g. ru44-20250306T0038
+    :param deployments_root: root directory for glider deployments
+    :param mode: dataset mode (rt or delayed)
+    :param timeout: seconds to wait for another process to release the lock
+    :return: lock file path (release it with release_lock), None if the deployment wasn't found or is locked
+    """
+    deployment_location = paths.find_glider_deployment_location(logger, deployment, deployments_root)
+    if deployment_location is None:
+        return None
+
+    lockfile = lock_path(deployment_location, mode)
+    if not acquire_lock(lockfile, timeout):
+        logger.warning(f'{deployment} {mode} is being processed by another process (pid {lock_owner(lockfile)}), skipping')
+        return None
+
+    return lockfile
+
+
+@contextmanager
+def held_lock(filepath, timeout=0):
+    """
+    Hold a lock for a block of code, e.g.
+    with held_lock(lockfile) as acquired:
+        if acquired:
+            ...
+    :param filepath: full path to the lock file
+    :param timeout: seconds to wait for another process to release the lock
+    """
+    acquired = acquire_lock(filepath, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            release_lock(filepath)
@@ -2,13 +2,75 @@
 
 import os
 import pwd
-from datetime import datetime
+import json
+import queue
+import atexit
+import threading
+from datetime import datetime, timezone
 import logging
+import logging.handlers
+
+WORKER_LOGGER_NAME = 'logging_worker'
+
+# directory of the base log files, overridden by the RUGLIDER_LOG_ROOT environment variable or --log_root
+LOG_ROOT = '/home/glideradm/logs'
+
+# log file formats: text lines, or one JSON object per line (set with RUGLIDER_LOG_FORMAT or --log_format)
+LOG_FORMATS = ['text', 'json']
+TEXT_FORMAT = '%(asctime)s%(module)s:%(levelname)s:%(message)s [line %(lineno)d]'
+
+# attributes of every log record, anything else was added with extra= and is written as a JSON field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'target_handler'}
+
+# logging settings given on the command line (see configure_logging), None falls back to the environment
+_SETTINGS = dict(log_root=None, log_format=None)
+
+# logger registry: logger name: handler that writes the logger's records (e.g. a deployment log file)
+_HANDLERS = dict()
+
+# the log queue of this process and the listener thread that empties it, started on first use in each process
+# (a forked worker doesn't inherit the parent's thread)
+_LISTENER = dict(pid=None, queue=None, listener=None, exit_pid=None)
+_LISTENER_LOCK = threading.Lock()
+
+
+def _after_fork():
+    # another thread of the parent may have held the lock when the process forked
+    global _LISTENER_LOCK
+    _LISTENER_LOCK = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def configure_logging(log_root=None, log_format=None):
+    """
+    Set the log root and log file format for this process and the worker processes it forks
+    :param log_root: optional directory of the base log files
+    :param log_format: optional log file format, text or json
+    """
+    if log_format is not None and log_format not in LOG_FORMATS:
+        raise ValueError(f'Unknown log format {log_format}, expected one of {", ".join(LOG_FORMATS)}')
+    if log_root is not None:
+        _SETTINGS['log_root'] = log_root
+    if log_format is not None:
+        _SETTINGS['log_format'] = log_format
+
+
+def log_root():
+    return _SETTINGS['log_root'] or os.getenv('RUGLIDER_LOG_ROOT') or LOG_ROOT
+
+
+def log_format():
+    log_format = _SETTINGS['log_format'] or os.getenv('RUGLIDER_LOG_FORMAT') or 'text'
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f'Unknown log format {log_format}, expected one of {", ".join(LOG_FORMATS)}')
+    return log_format
 
 
 def logfile_basename():
     user = pwd.getpwuid(os.getuid())[0]
-    return f'/home/glideradm/logs/{user}-glider_qc.log'
+    return os.path.join(log_root(), f'{user}-glider_qc.log')
 
 
 def logfile_deploymentname(deployment, mode, fname):
@@ -18,17 +80,157 @@ def logfile_deploymentname(deployment, mode, fname):
     return logfilename
 
 
+class JsonFormatter(logging.Formatter):
+    # one JSON object per record, with any fields passed with extra= e.g. logger.info(..., extra=dict(segment=seg))
+
+    def format(self, record):
+        entry = dict(time=datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+                     level=record.levelname, logger=record.name, module=record.module, line=record.lineno,
+                     pid=record.process, message=record.getMessage())
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+def build_formatter(log_format):
+    return JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+
+
+class _RegistryQueueHandler(logging.handlers.QueueHandler):
+    # puts a registered logger's records on the log queue of this process, so the calling thread never waits for
+    # the log file (e.g. on NFS); the listener thread writes them with the logger's registered handler
+
+    def __init__(self, name):
+        super().__init__(None)
+        self.target_logger = name
+
+    def prepare(self, record):
+        # the record stays in this process: render the message now (its arguments may change after the call) and
+        # keep the exception for the formatter
+        record.msg = record.getMessage()
+        record.args = None
+        # the handler registered when the record was logged, so the record goes to that log file even if the logger
+        # is switched to another file before it is written
+        record.target_handler = _HANDLERS.get(self.target_logger)
+        return record
+
+    def enqueue(self, record):
+        _log_queue().put_nowait(record)
+
+
+class _RegistryListener(logging.handlers.QueueListener):
+    # writes each record with the handler its logger had when the record was logged
+
+    def handle(self, record):
+        handler = record.target_handler
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+
+
+def _log_queue():
+    # the log queue of this process, starting the listener thread if this process doesn't have one yet
+    if _LISTENER['pid'] != os.getpid():
+        with _LISTENER_LOCK:
+            if _LISTENER['pid'] != os.getpid():
+                _LISTENER['queue'] = queue.SimpleQueue()
+                _LISTENER['listener'] = _RegistryListener(_LISTENER['queue'])
+                _LISTENER['listener'].start()
+                _LISTENER['pid'] = os.getpid()
+                if _LISTENER['exit_pid'] != os.getpid():
+                    atexit.register(stop_logging)
+                    _register_worker_exit()
+                    _LISTENER['exit_pid'] = os.getpid()
+
+    return _LISTENER['queue']
+
+
+def _register_worker_exit():
+    # multiprocessing workers exit without running atexit functions, their finalizers run instead
+    import multiprocessing
+    import multiprocessing.util
+    if multiprocessing.parent_process() is not None:
+        multiprocessing.util.Finalize(None, stop_logging, exitpriority=10)
+
+
+def stop_logging():
+    """
+    Write all queued log records and stop the listener thread of this process (it is started again by the next
+    record). Runs at exit, call it before reporting a result that depends on the logs being complete.
+    """
+    with _LISTENER_LOCK:
+        if _LISTENER['pid'] == os.getpid() and _LISTENER['listener'] is not None:
+            _LISTENER['listener'].stop()
+        _LISTENER.update(pid=None, queue=None, listener=None)
+
+
 def setup_logger(name, loglevel, logfile):
+    """
+    Get a logger that writes to a log file without blocking the caller. Each logger name (e.g. one per deployment,
+    mode and processing step) is registered with its log file, later calls return the same logger and switch it to
+    logfile if that changed. Records are put on a queue and written by a listener thread in the log format from
+    configure_logging (text or json).
+    :param name: logger name e.g. logging_merge_ru44-20250306T0038_rt
+    :param loglevel: logging level e.g. 'INFO'
+    :param logfile: full path to the log file
+    :return: logger object
+    """
     logger = logging.getLogger(name)
 
     # if the logger doesn't already exist, set it up
-    if not logger.handlers:
-        log_format = logging.Formatter('%(asctime)s%(module)s:%(levelname)s:%(message)s [line %(lineno)d]')
+    if name not in _HANDLERS:
         handler = logging.FileHandler(logfile)
-        handler.setFormatter(log_format)
+        handler.setFormatter(build_formatter(log_format()))
+        _HANDLERS[name] = handler
 
         log_level = getattr(logging, loglevel)
         logger.setLevel(log_level)
-        logger.addHandler(handler)
+        for old_handler in list(logger.handlers):
+            logger.removeHandler(old_handler)
+        logger.addHandler(_RegistryQueueHandler(name))
+    elif _HANDLERS[name].baseFilename != os.path.abspath(logfile):
+        # the same logger with another log file (e.g. a long-running process after the date in the file name
+        # changed), later records go to the new file
+        handler = logging.FileHandler(logfile)
+        handler.setFormatter(_HANDLERS[name].formatter)
+        old_handler, _HANDLERS[name] = _HANDLERS[name], handler
+        old_handler.close()
 
     return logger
+
+
+def setup_queue_listener(queue, logger):
+    """
+    Forward log records that worker processes put on a queue to the handlers of a logger in the main process
+    :param queue: multiprocessing queue shared with the workers
+    :param logger: logger object whose handlers write the records (e.g. a deployment logger from setup_logger)
+    :return: started QueueListener, call .stop() once the workers are finished to flush the remaining records
+    """
+    listener = logging.handlers.QueueListener(queue, *logger.handlers, respect_handler_level=True)
+    listener.start()
+
+    return listener
+
+
+def setup_worker_logger(name, loglevel, queue):
+    """
+    Process pool initializer: route all records from the named logger in a worker process to a queue
+    that is emptied by a QueueListener in the main process
+    :param name: logger name
+    :param loglevel: logging level e.g. 'INFO'
+    :param queue: multiprocessing queue shared with the main process
+    """
+    logger = logging.getLogger(name)
+    # drop any handlers inherited from the parent process so records are only written once, by the listener
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(queue))
+    logger.setLevel(getattr(logging, loglevel))
+    logger.propagate = False
+
+
+def get_worker_logger():
+    return logging.getLogger(WORKER_LOGGER_NAME)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path(deployment_location, mode):
+    # one merge manifest per deployment and dataset mode, e.g. ../data/out/rt/segment_manifest.json
+    return os.path.join(deployment_location, 'data', 'out', mode, 'segment_manifest.json')
+
+
+def file_sha256(filepath, blocksize=1 << 20):
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def file_signature(filepath, previous=None):
+    """
+    Record the size, modification time and content hash of a file. The hash of a previous signature is reused
+    when the size and mtime are unchanged, so the file is only read when it changed.
+    :param filepath: full file path
+    :param previous: optional dictionary from an earlier file_signature call for the same file
+    :return: dictionary with size, mtime and sha256
+    """
+    st = os.stat(filepath)
+    if previous and previous['size'] == st.st_size and previous['mtime'] == st.st_mtime:
+        return dict(size=st.st_size, mtime=st.st_mtime, sha256=previous['sha256'])
+
+    return dict(size=st.st_size, mtime=st.st_mtime, sha256=file_sha256(filepath))
+
+
+def signature_matches(filepath, signature):
+    """
+    Check if a file is unchanged compared to a recorded signature. The size and mtime are checked first and
+    the content hash is only calculated when the mtime differs (e.g. the file was copied back into the queue).
+    :param filepath: full file path
+    :param signature: dictionary from file_signature
+    :return: True if the file content is unchanged
+    """
+    if not signature or not os.path.isfile(filepath):
+        return False
+
+    st = os.stat(filepath)
+    if st.st_size != signature['size']:
+        return False
+    if st.st_mtime == signature['mtime']:
+        return True
+
+    return file_sha256(filepath) == signature['sha256']
+
+
+def load_manifest(filepath):
+    """
+    Read the merge manifest, returns an empty manifest if the file doesn't exist or can't be read
+    :param filepath: full path to the manifest file
+    :return: manifest dictionary
+    """
+    empty = dict(version=MANIFEST_VERSION, segments=dict())
+    if not os.path.isfile(filepath):
+        return empty
+
+    try:
+        with open(filepath, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        return empty
+
+    return manifest
+
+
+def save_manifest(manifest, filepath):
+    # write to a temporary file and rename so an interrupted write never leaves a truncated manifest
+    tmpfile = f'{filepath}.tmp'
+    with open(tmpfile, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmpfile, filepath)
+
+
+def segment_unchanged(manifest, segment, input_files, config_file):
+    """
+    Check if a segment has already been merged from the same input files and deployment config
+    :param manifest: manifest dictionary
+    :param segment: segment name e.g. ru44-2025-098-0-0
+    :param input_files: list of full paths to the segment raw netcdf files
+    :param config_file: full path to deployment.yml
+    :return: True if the segment inputs and config are unchanged since the segment was last merged
+    """
+    entry = manifest['segments'].get(segment)
+    if not entry:
+        return False
+
+    if sorted(os.path.basename(f) for f in input_files) != sorted(entry['inputs'].keys()):
+        return False
+
+    for f in input_files:
+        if not signature_matches(f, entry['inputs'][os.path.basename(f)]):
+            return False
+
+    return signature_matches(config_file, entry['config'])
+
+
+def segment_entry(input_files, config_file, output_file, previous=None):
+    """
+    Build the manifest entry of a merged segment: the inputs, deployment config and output file
+    :param input_files: list of full paths to the segment raw netcdf files
+    :param config_file: full path to deployment.yml
+    :param output_file: full path to the merged file, None if no file was written for the segment
+    :param previous: optional earlier manifest entry, whose hashes are reused for the files whose size and mtime
+    are unchanged (see file_signature)
+    :return: manifest entry dictionary
+    """
+    previous = previous or dict(inputs=dict(), config=None)
+    return dict(
+        inputs={os.path.basename(f): file_signature(f, previous['inputs'].get(os.path.basename(f)))
+                for f in input_files},
+        config=file_signature(config_file, previous['config']),
+        output=output_file,
+        merged=datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    )
+
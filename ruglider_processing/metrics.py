@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import resource
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+METRICS_VERSION = 1
+
+
+def reset_peak_rss():
+    # start a new peak resident memory measurement: on Linux writing 5 to clear_refs resets the peak (VmHWM) to the
+    # current resident memory. Returns False where the peak can't be reset (it's then the process lifetime maximum).
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+
+    return True
+
+
+def peak_rss_mb():
+    # peak resident set size of this process in MB since the last reset_peak_rss (VmHWM on Linux), otherwise the
+    # process lifetime maximum (ru_maxrss is in kilobytes on Linux, bytes on macOS)
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return maxrss / 1024 / 1024
+    return maxrss / 1024
+
+
+def metrics_path(deployment_location, mode):
+    # one metrics file per deployment and dataset mode, e.g. ../proc-logs/ru44-20250325T0438-rt-metrics.jsonl
+    deployment = os.path.basename(os.path.normpath(deployment_location))
+    return os.path.join(deployment_location, 'proc-logs', f'{deployment}-{mode}-metrics.jsonl')
+
+
+def new_metrics(stage, segment=None):
+    """
+    Start a metrics record for one unit of work of a pipeline stage (e.g. merging one segment). The peak memory
+    measurement of the process is reset, so the record's peak memory is that of this unit of work.
+    :param stage: pipeline stage e.g. 'convert' or 'merge'
+    :param segment: optional segment name
+    :return: metrics dictionary, add phase timings with timed_phase and close it with finish_metrics
+    """
+    return dict(stage=stage,
+                segment=segment,
+                start=time.time(),
+                phases=dict(),
+                rows=None,
+                files=0,
+                bytes_read=0,
+                bytes_written=0,
+                peak_reset=reset_peak_rss())
+
+
+@contextmanager
+def timed_phase(metrics, phase):
+    """
+    Time a block of code and add the elapsed seconds to a phase of a metrics record, e.g.
+    with timed_phase(metrics, 'write'):
+        ds.to_netcdf(outname)
+    :param metrics: metrics dictionary from new_metrics (nothing is recorded if None)
+    :param phase: phase name
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics['phases'][phase] = metrics['phases'].get(phase, 0.) + time.perf_counter() - start
+
+
+def file_bytes(filepaths):
+    # total size of the files that exist
+    return sum(os.path.getsize(f) for f in filepaths if os.path.isfile(f))
+
+
+def finish_metrics(metrics, success=True):
+    """
+    Close a metrics record: total time, throughput and the peak memory of the process that did the work. The peak
+    is recorded as peak_rss_mb when it covers only this unit of work, or as process_peak_rss_mb (the process
+    lifetime maximum, e.g. on macOS) when the peak couldn't be reset in new_metrics.
+    :param metrics: metrics dictionary from new_metrics
+    :param success: whether the unit of work succeeded
+    :return: the metrics dictionary
+    """
+    seconds = time.time() - metrics['start']
+    metrics['success'] = success
+    metrics['seconds'] = round(seconds, 6)
+    metrics['phases'] = {phase: round(t, 6) for phase, t in metrics['phases'].items()}
+    metrics['rows_per_second'] = round(metrics['rows'] / seconds, 3) if metrics['rows'] and seconds > 0 else None
+    metrics['bytes_per_second'] = round(metrics['bytes_read'] / seconds, 3) if seconds > 0 else None
+    metrics['peak_rss_mb' if metrics.pop('peak_reset') else 'process_peak_rss_mb'] = round(peak_rss_mb(), 1)
+    metrics['pid'] = os.getpid()
+
+    return metrics
+
+
+def write_metrics(records, filepath, **labels):
+    """
+    Append metrics records to a JSON lines file, one line per record. Each line is written with a single
+    append so concurrent writers (e.g. the convert and merge steps) don't interleave partial lines.
+    :param records: list of metrics dictionaries from finish_metrics
+    :param filepath: full path to the metrics file (see metrics_path)
+    :param labels: fields added to every record, e.g. deployment and mode
+    """
+    if len(records) == 0:
+        return
+
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        for record in records:
+            line = dict(version=METRICS_VERSION, timestamp=timestamp, **labels, **record)
+            os.write(fd, (json.dumps(line, sort_keys=True) + '\n').encode())
+    finally:
+        os.close(fd)
+
+
+def _prometheus_labels(labels):
+    return ','.join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+def write_prometheus_textfile(records, textfile_dir, stage, **labels):
+    """
+    Summarize the metrics of one run of a stage in a node-exporter textfile collector file
+    (textfile_dir/ruglider_<stage>_<labels>.prom), replaced atomically on every run
+    :param records: list of metrics dictionaries from finish_metrics
+    :param textfile_dir: node-exporter textfile collector directory
+    :param stage: pipeline stage e.g. 'convert' or 'merge'
+    :param labels: labels identifying the run, e.g. deployment and mode
+    """
+    labels = dict(labels, stage=stage)
+    rows = sum(r['rows'] or 0 for r in records)
+    seconds = sum(r['seconds'] for r in records)
+    phases = dict()
+    for r in records:
+        for phase, t in r['phases'].items():
+            phases[phase] = phases.get(phase, 0.) + t
+
+    metrics = [
+        ('ruglider_units', 'gauge', 'Units of work (segments or conversion batches) processed in the last run',
+         [(dict(status='success'), sum(1 for r in records if r['success'])),
+          (dict(status='failed'), sum(1 for r in records if not r['success']))]),
+        ('ruglider_seconds', 'gauge', 'Total processing time of the last run', [(dict(), seconds)]),
+        ('ruglider_phase_seconds', 'gauge', 'Processing time of each phase in the last run',
+         [(dict(phase=phase), t) for phase, t in sorted(phases.items())]),
+        ('ruglider_rows', 'gauge', 'Rows written in the last run', [(dict(), rows)]),
+        ('ruglider_rows_per_second', 'gauge', 'Rows written per second of processing time in the last run',
+         [(dict(), rows / seconds if seconds > 0 else 0)]),
+        ('ruglider_bytes_read', 'gauge', 'Bytes read in the last run', [(dict(), sum(r['bytes_read'] for r in records))]),
+        ('ruglider_bytes_written', 'gauge', 'Bytes written in the last run',
+         [(dict(), sum(r['bytes_written'] for r in records))]),
+        ('ruglider_peak_rss_megabytes', 'gauge', 'Largest peak resident memory of the processes in the last run',
+         [(dict(), max([r.get('peak_rss_mb', r.get('process_peak_rss_mb', 0)) for r in records], default=0))]),
+        ('ruglider_last_run_timestamp_seconds', 'gauge', 'Time the last run finished', [(dict(), time.time())])
+    ]
+
+    lines = []
+    for name, metric_type, description, samples in metrics:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for sample_labels, value in samples:
+            lines.append(f'{name}{{{_prometheus_labels(dict(labels, **sample_labels))}}} {value}')
+
+    filename = '_'.join(['ruglider', stage] + [str(v) for k, v in sorted(labels.items()) if k != 'stage'])
+    filepath = os.path.join(textfile_dir, f'{filename}.prom')
+
+    # write to a temporary file in the same directory and rename so node-exporter never reads a partial file
+    tmpfile = os.path.join(textfile_dir, f'.{filename}.prom.{os.getpid()}.tmp')
+    with open(tmpfile, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmpfile, filepath)
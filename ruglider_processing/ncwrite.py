@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+import numpy as np
+import xarray as xr
+from netCDF4 import Dataset, default_fillvals
+# the encoding profiles are plain python (no netCDF/xarray imports) so the command line can list them quickly
+from ruglider_processing.encoding import ENCODING_PROFILES, variable_encoding_settings
+
+
+# rows per chunk of char array variables when neither the encoding profile nor the write sets a chunk size
+DEFAULT_STRING_CHUNKSIZE = 4096
+
+
+def build_encoding(encoding_dict, ds, variable, settings=None, source=None, chunk_size=None):
+    """
+    Define the netCDF encoding for one variable
+    :param encoding_dict: encoding dictionary to add the variable encoding to
+    :param ds: xarray dataset
+    :param variable: variable name
+    :param settings: optional encoding profile from resolve_encoding_profile (default profile if not provided)
+    :param source: optional source sensor name of the variable, used to match per-variable overrides
+    :param chunk_size: optional number of rows per write (see write_netcdf_chunked). time is then an unlimited
+    dimension, which netCDF would otherwise chunk one row at a time, so every time variable gets explicit chunks.
+    """
+    if settings is None:
+        settings = ENCODING_PROFILES['default']
+    varsettings = variable_encoding_settings(settings, variable, source)
+    zlib = varsettings['complevel'] > 0
+
+    # set the fill value using netCDF4.default_fillvals
+    if variable == 'time':
+        encoding_dict[variable] = {
+            'zlib': zlib,
+            'complevel': varsettings['complevel'],
+            'dtype': np.float64,
+            '_FillValue': default_fillvals['f8'],
+            'units': 'seconds since 1970-01-01T00:00:00Z',
+            'calendar': 'gregorian'
+            }
+    elif ds[variable].dtype.kind == 'U':
+        # store strings (e.g. the per-row source_file and trajectory) as fixed-width char arrays
+        # (CF string layout, string dimension added by xarray) so they can be compressed. Readers
+        # decode them back to the same strings as the previous variable-length string variables.
+        encoding_dict[variable] = {
+            'zlib': zlib,
+            'complevel': varsettings['complevel'],
+            'shuffle': True,
+            'dtype': 'S1'
+        }
+        if ds[variable].dims == ('time',) and ds.sizes['time'] > 0:
+            # chunk along time and the whole string length (the string dimension is the longest encoded value)
+            strlen = max(1, np.char.encode(np.unique(ds[variable].values), 'utf-8').dtype.itemsize)
+            rows = varsettings['chunksize'] or chunk_size or DEFAULT_STRING_CHUNKSIZE
+            encoding_dict[variable]['chunksizes'] = (min(rows, ds.sizes['time']), strlen)
+        return
+    else:
+        encoding_type = f'{ds[variable].dtype.kind}{ds[variable].dtype.itemsize}'
+        try:
+            fillvalue = default_fillvals[encoding_type]
+        except KeyError:
+            fillvalue = ""
+            zlib = False
+        encoding_dict[variable] = {
+            'zlib': zlib,
+            'complevel': varsettings['complevel'],
+            'dtype': ds[variable].dtype,
+            '_FillValue': fillvalue
+        }
+        if ds[variable].dtype.kind == 'f' and varsettings['least_significant_digit'] is not None:
+            encoding_dict[variable]['least_significant_digit'] = varsettings['least_significant_digit']
+
+    if zlib:
+        encoding_dict[variable]['shuffle'] = varsettings['shuffle']
+
+    # chunk 1-D timeseries variables along time
+    rows = varsettings['chunksize'] or chunk_size
+    if rows and ds[variable].dims == ('time',) and ds.sizes['time'] > 0:
+        encoding_dict[variable]['chunksizes'] = (min(rows, ds.sizes['time']),)
+
+
+def build_dataset_encoding(ds, settings=None, sources=None, chunk_size=None):
+    """
+    Define the netCDF encoding for all data variables and coordinates in a dataset
+    :param ds: xarray dataset
+    :param settings: optional encoding profile from resolve_encoding_profile
+    :param sources: optional dictionary of netcdf variable name: source sensor name (deployment.yml netcdf_variables)
+    :param chunk_size: optional number of rows per write, when the dataset is written with write_netcdf_chunked
+    :return: encoding dictionary
+    """
+    sources = sources or dict()
+    encoding = dict()
+    for v in ds.data_vars:
+        build_encoding(encoding, ds, v, settings, sources.get(v), chunk_size)
+    
+    for v in ds.coords:
+        build_encoding(encoding, ds, v, settings, sources.get(v), chunk_size)
+
+    return encoding
+
+
+def constant_dataarray(value, template):
+    """
+    Build a data array that repeats one value along the dimensions of a template data array without allocating
+    a full-length array (the values are a read-only broadcast view), e.g. for per-row source_file and trajectory
+    :param value: value to repeat
+    :param template: data array with the dimensions/coordinates to use (e.g. ds['time'])
+    :return: data array
+    """
+    v = np.broadcast_to(np.array(value), np.shape(template))
+
+    return xr.DataArray(v, coords=template.coords, dims=template.dims)
+
+
+def write_netcdf_chunked(ds, outname, encoding, chunk_size, dim='time'):
+    """
+    Write a dataset to a netCDF file in chunks of rows along a dimension. The first chunk is written with xarray to
+    create the file (with dim as the unlimited dimension) and the remaining chunks are CF-encoded and appended one
+    at a time, so the encoded copy of the data that to_netcdf builds never exceeds one chunk. The dataset itself
+    is still held in memory, so peak memory still grows with the number of rows.
+    :param ds: xarray dataset to write
+    :param outname: full path to the output file
+    :param encoding: variable encoding dictionary (see build_encoding)
+    :param chunk_size: number of rows to write at a time
+    :param dim: dimension to write in chunks
+    """
+    nrows = ds.sizes[dim]
+    ds.isel({dim: slice(0, chunk_size)}).to_netcdf(outname, 'w', encoding=encoding, unlimited_dims=[dim])
+
+    with Dataset(outname, 'a') as nc:
+        for start in range(chunk_size, nrows, chunk_size):
+            end = min(start + chunk_size, nrows)
+            for name, variable in ds.isel({dim: slice(start, end)}).variables.items():
+                if dim not in variable.dims:
+                    continue
+                variable = variable.copy(deep=False)
+                variable.encoding = dict(encoding.get(name, ds[name].encoding))
+                encoded = xr.conventions.encode_cf_variable(variable, name=name)
+                idx = tuple(slice(start, end) if d == dim else slice(None) for d in encoded.dims)
+                nc.variables[name][idx] = np.asarray(encoded.values)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+import os
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# deployment names e.g. ru44-20250306T0038: glider-trajectory
+DEPLOYMENT_REGEX = re.compile(r'^(.*)-(\d{8}T\d{4})')
+DEPLOYMENT_NAME_REGEX = re.compile(r'^(.*)-(\d{8}T\d{4})$')
+
+
+@lru_cache(maxsize=None)
+def trajectory_datetime(trajectory):
+    # parse a deployment trajectory date e.g. 20250306T0038, cached since the same deployments are looked up
+    # by every processing step (raises ValueError for an invalid date)
+    return datetime.strptime(trajectory, '%Y%m%dT%H%M').replace(tzinfo=timezone.utc)
+
+
+def find_glider_deployment_datapath(logger, deployment, deployments_root, mode):
+    """
+    Find the glider deployment binary data path
+    :param logger: logger object
+    :param deployment: glider deployment/trajectory name e.g. ru44-20250306T0038
+    :param deployments_root: root directory for glider deployments
+    :return: deployment_location
+    """
+    match = DEPLOYMENT_REGEX.search(deployment)
+    if match:
+        try:
+            (glider, trajectory) = match.groups()
+            try:
+                trajectory_dt = trajectory_datetime(trajectory)
+            except ValueError as e:
+                logger.error('Error parsing trajectory date {:s}: {:}'.format(trajectory, e))
+                trajectory_dt = None
+                deployment_location = None
+
+            if trajectory_dt:
+                trajectory = '{:s}-{:s}'.format(glider, trajectory_dt.strftime('%Y%m%dT%H%M'))
+                deployment_name = os.path.join('{:0.0f}'.format(trajectory_dt.year), trajectory)
+
+                # Create fully-qualified path to the deployment location
+                deployment_location = os.path.join(deployments_root, deployment_name)
+                if mode == 'delayed':
+                    modemap = 'debd'
+                elif mode == 'rt':
+                    modemap = 'stbd'
+                else:
+                    logger.warning('{:s} invalid mode provided: {:s}'.format(trajectory, mode))
+                if os.path.isdir(deployment_location):
+                    # Set the deployment raw netcdf data path
+                    nc_outpath = os.path.join(deployment_location, 'data', 'in', 'rawnc', modemap)
+
+                    # Set the deployment output file directory
+                    outdir = os.path.join(deployment_location, 'data', 'out', mode, 'qc_queue')
+                    if not os.path.isdir(nc_outpath):
+                        logger.warning(f'{trajectory} data directory not found: {nc_outpath}')
+                        nc_outpath = None
+                        deployment_location = None
+                        outdir = None
+                else:
+                    logger.warning(f'Deployment location does not exist: {deployment_location}')
+                    nc_outpath = None
+                    deployment_location = None
+                    outdir = None
+
+        except ValueError as e:
+            logger.error(f'Error parsing invalid deployment name {deployment}: {e}')
+            nc_outpath = None
+            deployment_location = None
+            outdir = None
+    else:
+        logger.error(f'Cannot pull glider name from {deployment}')
+        nc_outpath = None
+        deployment_location = None
+        outdir = None
+
+    return nc_outpath, outdir, deployment_location
+
+
+def find_glider_deployment_location(logger, deployment, deployments_root):
+    """
+    Find the glider deployment location
+    :param logger: logger object
+    :param deployment: glider deployment/trajectory name e.g. ru44-20250306T0038
+    :param deployments_root: root directory for glider deployments
+    :return: deployment_location
+    """
+    match = DEPLOYMENT_REGEX.search(deployment)
+    if match:
+        try:
+            (glider, trajectory) = match.groups()
+            try:
+                trajectory_dt = trajectory_datetime(trajectory)
+            except ValueError as e:
+                logger.error('Error parsing trajectory date {:s}: {:}'.format(trajectory, e))
+                trajectory_dt = None
+                data_path = None
+                deployment_location = None
+
+            if trajectory_dt:
+                trajectory = '{:s}-{:s}'.format(glider, trajectory_dt.strftime('%Y%m%dT%H%M'))
+                deployment_name = os.path.join('{:0.0f}'.format(trajectory_dt.year), trajectory)
+
+                # Create fully-qualified path to the deployment location
+                deployment_location = os.path.join(deployments_root, deployment_name)
+
+                if os.path.isdir(deployment_location):
+                    logger.info(f'Deployment location found: {deployment_location}')
+                else:
+                    logger.warning(f'Deployment location does not exist: {deployment_location}')
+                    deployment_location = None
+
+        except ValueError as e:
+            logger.error(f'Error parsing invalid deployment name {deployment}: {e}')
+            deployment_location = None
+    else:
+        logger.error(f'Cannot pull glider name from {deployment}')
+        deployment_location = None
+
+    return deployment_location
+
+
+def find_glider_deployments_rootdir(logger, test):
+    # Find the glider deployments root directory
+    if test:
+        envvar = 'GLIDER_DATA_HOME_TEST'
+    else:
+        envvar = 'GLIDER_DATA_HOME'
+
+    data_home = os.getenv(envvar)
+
+    if not data_home:
+        logger.error('{:s} not set'.format(envvar))
+        return 1, 1
+    elif not os.path.isdir(data_home):
+        logger.error('Invalid {:s}: {:s}'.format(envvar, data_home))
+        return 1, 1
+
+    deployments_root = os.path.join(data_home, 'deployments')
+    if not os.path.isdir(deployments_root):
+        logger.warning('Invalid deployments root: {:s}'.format(deployments_root))
+        return 1, 1
+
+    return data_home, deployments_root
+
+
+def find_deployments(deployments_root):
+    """
+    Find all glider deployments under the deployments root directory (deployments_root/YYYY/glider-YYYYmmddTHHMM)
+    :param deployments_root: root directory for glider deployments
+    :return: sorted list of deployment names
+    """
+    deployments = []
+    with os.scandir(deployments_root) as years:
+        for year in years:
+            if not (year.is_dir() and year.name.isdigit()):
+                continue
+            with os.scandir(year.path) as entries:
+                deployments.extend(entry.name for entry in entries
+                                   if entry.is_dir() and DEPLOYMENT_NAME_REGEX.match(entry.name))
+
+    return sorted(deployments)
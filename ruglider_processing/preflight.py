@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# thresholds below which a segment isn't merged (0 disables a check), and what happens to the segment:
+# skip (recorded in the merge manifest without an output file and removed from the queue, it's checked again if
+# its raw files change e.g. when the other half of an rt segment arrives) or defer (left in the queue).
+# All checks are off by default, so every segment is merged unless a deployment opts in.
+PREFLIGHT_DEFAULTS = dict(min_rows=0, min_duration=0, min_gps_fixes=0, action='skip')
+PREFLIGHT_ACTIONS = ['skip', 'defer']
+
+# raw netcdf time variables, in order of preference
+TIME_VARIABLES = ['time', 'sci_m_present_time', 'm_present_time']
+
+# seconds per time unit, for time variables with units e.g. 'seconds since 1970-01-01'
+TIME_UNIT_SECONDS = dict(seconds=1, second=1, s=1, minutes=60, minute=60, hours=3600, hour=3600, days=86400, day=86400)
+
+# Slocum fill value for sensors without a valid reading (e.g. m_gps_lat between fixes)
+SLOCUM_FILL = 69696969
+
+
+def resolve_preflight_settings(overrides=None, config=None):
+    """
+    Build the pre-flight settings from the defaults, optional settings from the deployment.yml 'preflight'
+    section and command line overrides, e.g.
+    preflight:
+      min_rows: 10
+      min_duration: 120
+      min_gps_fixes: 1
+      action: defer
+    :param overrides: optional dictionary of settings that override config (None values are ignored)
+    :param config: optional dictionary of pre-flight settings (deployment.yml 'preflight' section)
+    :return: dictionary of pre-flight settings
+    """
+    settings = dict(PREFLIGHT_DEFAULTS)
+    for source in [config or dict(), overrides or dict()]:
+        unknown = set(source.keys()) - set(PREFLIGHT_DEFAULTS.keys())
+        if unknown:
+            raise ValueError(f'Unknown preflight settings: {", ".join(sorted(unknown))}')
+        settings.update({k: v for k, v in source.items() if v is not None})
+
+    if settings['action'] not in PREFLIGHT_ACTIONS:
+        raise ValueError(f'Unknown preflight action {settings["action"]}, options are: {", ".join(PREFLIGHT_ACTIONS)}')
+
+    return settings
+
+
+def inspect_raw_file(filepath, gps_variable=None):
+    """
+    Summarize a raw netcdf file without loading its data: the number of rows is read from the file header and
+    the time range from the first and last time values. GPS fixes are only counted (by reading the one GPS
+    variable) if gps_variable is given.
+    :param filepath: full path to a raw *.s/dbd.nc or *.t/ebd.nc file
+    :param gps_variable: optional GPS latitude variable name e.g. m_gps_lat
+    :return: dictionary of rows, time_min, time_max (seconds, None if there is no time variable) and gps_fixes
+    """
+    # imported here so the command line can import PREFLIGHT_ACTIONS without loading netCDF4
+    import numpy as np
+    from netCDF4 import Dataset
+
+    summary = dict(rows=0, time_min=None, time_max=None, gps_fixes=0)
+    with Dataset(filepath, 'r') as nc:
+        timevar = next((v for v in TIME_VARIABLES if v in nc.variables), None)
+        if timevar is not None and nc.variables[timevar].ndim == 1:
+            variable = nc.variables[timevar]
+            summary['rows'] = len(nc.dimensions[variable.dimensions[0]])
+            if summary['rows'] > 0:
+                # the raw files are in time order, so only the first and last values are read unless they are missing
+                values = np.array([np.nan if np.ma.is_masked(v) else float(v) for v in (variable[0], variable[-1])])
+                if np.isnan(values).any():
+                    values = np.ma.filled(variable[:].astype(float), np.nan)
+                if not np.isnan(values).all():
+                    scale = TIME_UNIT_SECONDS.get(str(getattr(variable, 'units', 'seconds')).split(' ')[0].lower(), 1)
+                    summary['time_min'] = float(np.nanmin(values)) * scale
+                    summary['time_max'] = float(np.nanmax(values)) * scale
+        elif len(nc.dimensions) > 0:
+            summary['rows'] = max(len(d) for d in nc.dimensions.values())
+
+        if gps_variable and gps_variable in nc.variables and summary['rows'] > 0:
+            lat = np.ma.filled(nc.variables[gps_variable][:].astype(float), np.nan)
+            summary['gps_fixes'] = int(np.count_nonzero(np.isfinite(lat) & (np.abs(lat) < SLOCUM_FILL)))
+
+    return summary
+
+
+def check_segment(input_files, settings, gps_variable='m_gps_lat'):
+    """
+    Check if a segment is worth merging from the headers of its raw netcdf files
+    :param input_files: list of full paths to the segment raw netcdf files
+    :param settings: pre-flight settings from resolve_preflight_settings
+    :param gps_variable: GPS latitude variable name (deployment.yml latitude source)
+    :return: None if the segment passes all checks, otherwise the reason it doesn't
+    """
+    if settings['min_rows'] <= 0 and settings['min_duration'] <= 0 and settings['min_gps_fixes'] <= 0:
+        return None
+    if len(input_files) == 0:
+        return 'no raw files'
+
+    summaries = [inspect_raw_file(f, gps_variable if settings['min_gps_fixes'] > 0 else None) for f in input_files]
+
+    rows = max(s['rows'] for s in summaries)
+    if rows < settings['min_rows']:
+        return f'{rows} rows (minimum {settings["min_rows"]})'
+
+    if settings['min_duration'] > 0:
+        starts = [s['time_min'] for s in summaries if s['time_min'] is not None]
+        ends = [s['time_max'] for s in summaries if s['time_max'] is not None]
+        duration = max(ends) - min(starts) if starts else 0
+        if duration < settings['min_duration']:
+            return f'{duration:.0f} seconds long (minimum {settings["min_duration"]})'
+
+    if settings['min_gps_fixes'] > 0:
+        fixes = sum(s['gps_fixes'] for s in summaries)
+        if fixes < settings['min_gps_fixes']:
+            return f'{fixes} GPS fixes (minimum {settings["min_gps_fixes"]})'
+
+    return None
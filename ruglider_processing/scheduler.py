@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+import os
+import time
+import heapq
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from ruglider_processing.locks import lock_path, acquire_lock, release_lock, lock_owner
+from ruglider_processing.deployindex import queued_files
+from ruglider_processing.metrics import write_metrics
+from ruglider_processing.loggers import stop_logging
+
+# jobs with a lower priority number are started first: real-time processing before bulk delayed-mode processing
+MODE_PRIORITY = dict(rt=0, delayed=1)
+
+# delayed-mode jobs run at a lower CPU priority, so a real-time job running at the same time (in this run, a cron
+# run or the watch daemon) gets the CPU first. A process can't raise its priority again, so a worker that runs
+# a delayed-mode job only runs delayed-mode jobs afterwards (they are started after all rt jobs).
+MODE_NICENESS = dict(rt=0, delayed=10)
+
+
+def jobs_path(deployment_location, mode):
+    # one job status file per deployment and dataset mode, e.g. ../proc-logs/ru44-20250325T0438-rt-jobs.jsonl
+    deployment = os.path.basename(os.path.normpath(deployment_location))
+    return os.path.join(deployment_location, 'proc-logs', f'{deployment}-{mode}-jobs.jsonl')
+
+
+def queue_depth(deployment_location, mode):
+    """
+    Count the files of a dataset mode waiting in a deployment's binary and raw netcdf queue directories
+    :param deployment_location: full path to the deployment directory
+    :param mode: dataset mode (rt or delayed)
+    :return: number of queued files
+    """
+    return sum(queued_files(os.path.join(deployment_location, 'data', 'in', queue, 'queue'))[mode]
+               for queue in ['binary', 'rawnc'])
+
+
+def new_job(deployment, mode, deployment_location, **fields):
+    """
+    Create a job that processes one deployment dataset mode
+    :param deployment: glider deployment name e.g. ru44-20250306T0038
+    :param mode: dataset mode (rt or delayed)
+    :param deployment_location: full path to the deployment directory
+    :param fields: additional fields passed to the function that runs the job
+    :return: job dictionary
+    """
+    return dict(fields, deployment=deployment, mode=mode, deployment_location=deployment_location,
+                priority=MODE_PRIORITY[mode], queue_depth=queue_depth(deployment_location, mode),
+                submitted=time.time())
+
+
+def _run_locked(job, run, lock_timeout):
+    # runs in the worker: take the deployment lock, then run the job at the priority of its dataset mode
+    started = time.time()
+    niceness = MODE_NICENESS[job['mode']] - os.nice(0)
+    if niceness > 0:
+        os.nice(niceness)
+
+    lockfile = lock_path(job['deployment_location'], job['mode'])
+    if not acquire_lock(lockfile, lock_timeout):
+        return dict(status='locked', lock_owner=lock_owner(lockfile), started=started, finished=time.time(),
+                    pid=os.getpid())
+    try:
+        status = 'failed' if run(job) else 'done'
+    except Exception as e:
+        status = f'error: {e}'
+    finally:
+        release_lock(lockfile)
+        # the job's log files are complete once its status is reported
+        stop_logging()
+
+    return dict(status=status, started=started, finished=time.time(), pid=os.getpid())
+
+
+def _record(job, result, logger):
+    # job status record: queue depth and position at submission, time spent waiting for a worker and running
+    record = dict(deployment=job['deployment'], mode=job['mode'], priority=job['priority'],
+                  queue_depth=job['queue_depth'], jobs_ahead=job['jobs_ahead'], status=result['status'],
+                  wait_seconds=round(result['started'] - job['submitted'], 3),
+                  run_seconds=round(result['finished'] - result['started'], 3), pid=result['pid'])
+    if 'lock_owner' in result:
+        record['lock_owner'] = result['lock_owner']
+    try:
+        write_metrics([record], jobs_path(job['deployment_location'], job['mode']))
+    except OSError as e:
+        logger.warning(f'Failed to write the job status of {job["deployment"]} {job["mode"]}: {e}')
+
+    message = (f'{job["deployment"]} {job["mode"]}: {result["status"]} after waiting {record["wait_seconds"]:.1f} s '
+               f'and running {record["run_seconds"]:.1f} s ({job["queue_depth"]} queued files)')
+    if result['status'] == 'locked':
+        logger.warning(f'{message}, locked by pid {result["lock_owner"]}')
+    elif result['status'] == 'done':
+        logger.info(message)
+    else:
+        logger.error(message)
+
+    return record
+
+
+def schedule_jobs(jobs, run, workers, logger, lock_timeout=0):
+    """
+    Run deployment jobs in priority order (all rt jobs before delayed-mode jobs, then in the order they were
+    submitted) on a bounded pool of worker processes. Each job holds the lock of its deployment dataset mode
+    while it runs, and a job whose deployment is locked by another process is skipped. A status record of every
+    job (queue depth, jobs ahead of it, wait and run time, status) is appended to ../proc-logs/<deployment>-<mode>-jobs.jsonl.
+    :param jobs: list of jobs from new_job
+    :param run: function that runs a job, called with the job dictionary in the worker, returns a truthy value
+    if the job failed (e.g. the exit status of a processing script's main). It must be importable by the workers.
+    :param workers: number of jobs that run at the same time, 1 runs the jobs one at a time in this process
+    :param logger: logger object
+    :param lock_timeout: seconds a job waits for another process to release its deployment lock
+    :return: list of job status records in the order the jobs finished
+    """
+    queue = []
+    for i, job in enumerate(sorted(jobs, key=lambda j: j['priority'])):
+        job['jobs_ahead'] = i
+        heapq.heappush(queue, (job['priority'], i, job))
+
+    records = []
+    if workers <= 1 or len(jobs) <= 1:
+        while queue:
+            job = heapq.heappop(queue)[2]
+            logger.info(f'Starting {job["deployment"]} {job["mode"]}')
+            records.append(_record(job, _run_locked(job, run, lock_timeout), logger))
+        return records
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        running = dict()
+        while queue or running:
+            # start the highest priority jobs as workers become free
+            while queue and len(running) < workers:
+                job = heapq.heappop(queue)[2]
+                logger.info(f'Starting {job["deployment"]} {job["mode"]}')
+                running[executor.submit(_run_locked, job, run, lock_timeout)] = job
+            done, __ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # e.g. the worker process was killed
+                    now = time.time()
+                    result = dict(status=f'error: {e}', started=now, finished=now, pid=None)
+                records.append(_record(job, result, logger))
+
+    return records
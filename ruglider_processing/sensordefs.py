@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+import os
+import json
+import hashlib
+from ruglider_processing.config import file_content_hash
+
+INDEX_VERSION = 2
+
+# sensor attributes copied from the sensor definitions into deployment.yml netcdf_variables
+SENSOR_ATTRS = ['axis', 'units', 'long_name', 'standard_name', 'valid_min', 'valid_max', 'fill_value']
+
+# sensor definition indexes built in this process: content hash of the json files: index
+# (deployments usually share identical copies of the sensor definitions, so a fleet is indexed once)
+_index_cache = dict()
+
+
+def _content_hash(filepaths):
+    h = hashlib.sha256()
+    for filepath in filepaths:
+        h.update(file_content_hash(filepath).encode())
+
+    return h.hexdigest()
+
+
+def index_path(sensordefs_files):
+    # sensor definition index cache, next to the first sensor definitions file
+    # e.g. ../config/proc/.sensor_defs.index.json
+    return os.path.join(os.path.dirname(os.path.abspath(sensordefs_files[0])), '.sensor_defs.index.json')
+
+
+def build_sensor_index(sensordefs):
+    """
+    Build the sensor definition index: the netcdf variable name and the deployment.yml attributes of each sensor
+    :param sensordefs: sensor definitions dictionary (contents of sensor_defs-*.json), later definitions
+    override earlier ones
+    :return: dictionary of sensor: {'nc_var_name': name, 'attrs': {attribute: value}}
+    """
+    index = dict()
+    for sensor, sensor_info in sensordefs.items():
+        try:
+            index[sensor] = dict(nc_var_name=sensor_info['nc_var_name'],
+                                 attrs={k: v for k, v in sensor_info['attrs'].items() if k in SENSOR_ATTRS})
+        except (KeyError, TypeError, AttributeError):
+            # incomplete definition, the sensor is added to deployment.yml without attributes
+            continue
+
+    return index
+
+
+def load_sensor_index(sensordefs_files, cache=True):
+    """
+    Load the combined sensor definition index for a list of sensor_defs json files (later files override earlier
+    ones, e.g. [sensor_defs-raw.json, sensor_defs-sci_profile.json]). The json files are only parsed when their
+    contents change: the index is cached in memory by content hash (shared by all deployments with the same
+    definitions) and, optionally, in a json cache file next to the json files.
+    :param sensordefs_files: list of full paths to sensor_defs json files
+    :param cache: read/write the json index cache file (see index_path)
+    :return: dictionary of sensor: {'nc_var_name': name, 'attrs': {attribute: value}} (shared, don't modify it)
+    """
+    content_hash = _content_hash(sensordefs_files)
+    if content_hash in _index_cache:
+        return _index_cache[content_hash]
+
+    index = None
+    indexfile = index_path(sensordefs_files)
+    if cache and os.path.isfile(indexfile):
+        try:
+            with open(indexfile, 'r') as f:
+                cached = json.load(f)
+            if cached.get('version') == INDEX_VERSION and cached.get('content_hash') == content_hash:
+                index = cached['index']
+        except (OSError, ValueError, AttributeError, KeyError):
+            index = None
+
+    if index is None:
+        sensordefs = dict()
+        for filepath in sensordefs_files:
+            with open(filepath, 'r') as file:
+                sensordefs.update(json.load(file))
+        index = build_sensor_index(sensordefs)
+
+        if cache:
+            # write the index atomically, it's only a cache so failures (e.g. read-only config directory) are ignored
+            tmpfile = f'{indexfile}.{os.getpid()}.tmp'
+            try:
+                with open(tmpfile, 'w') as f:
+                    json.dump(dict(version=INDEX_VERSION, content_hash=content_hash, index=index), f,
+                              separators=(',', ':'))
+                os.replace(tmpfile, indexfile)
+            except OSError:
+                if os.path.exists(tmpfile):
+                    os.remove(tmpfile)
+
+    _index_cache[content_hash] = index
+
+    return index
+
+
+def source_variable_map(netcdf_variables):
+    """
+    Build a reverse map of source sensor to netcdf variable name
+    :param netcdf_variables: deployment.yml netcdf_variables dictionary
+    :return: dictionary of source: netcdf variable name
+    """
+    return {attributes.get('source'): var for var, attributes in netcdf_variables.items()
+            if isinstance(attributes, dict) and attributes.get('source') is not None}
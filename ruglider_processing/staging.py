@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+
+# ioctl request to clone a file's extents (copy-on-write) on Linux filesystems that support it (btrfs, xfs)
+FICLONE = 0x40049409
+
+STAGING_METHODS = ['link', 'reflink', 'copy']
+
+
+def new_staging_stats():
+    # bytes staged by each method, bytes_avoided is the data that didn't have to be copied
+    return dict(files=0, bytes=0, bytes_avoided=0, link=0, reflink=0, copy=0)
+
+
+def _reflink(src, tmp):
+    if not sys.platform.startswith('linux'):
+        raise OSError('reflinks are only supported on Linux')
+    import fcntl
+    with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, tmp)
+
+
+def stage_file(src, dst, method='link', stats=None):
+    """
+    Stage a file in another directory without copying its data when possible. The file is created under a
+    temporary name in the destination directory and renamed into place, so readers never see a partial file and
+    an existing destination file is replaced atomically. Methods are tried in order, falling back to the next one
+    (e.g. across filesystems): 'link' tries a hardlink, then a reflink, then a copy; 'reflink' tries a
+    copy-on-write reflink, then a copy; 'copy' always copies. Hardlinked files share their data, so staged files
+    must be replaced (written to a new file and renamed), never modified in place.
+    :param src: full path to the source file
+    :param dst: full path to the destination file
+    :param method: preferred staging method, one of STAGING_METHODS
+    :param stats: optional dictionary from new_staging_stats, updated with the method used and bytes staged
+    :return: method used ('link', 'reflink' or 'copy')
+    """
+    if method not in STAGING_METHODS:
+        raise ValueError(f'Unknown staging method {method}, options are: {", ".join(STAGING_METHODS)}')
+
+    tmp = f'{dst}.{os.getpid()}.tmp'
+    used = None
+    try:
+        if method == 'link':
+            try:
+                os.link(src, tmp)
+                used = 'link'
+            except OSError:
+                pass
+        if used is None and method in ['link', 'reflink']:
+            try:
+                _reflink(src, tmp)
+                used = 'reflink'
+            except OSError:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        if used is None:
+            shutil.copy2(src, tmp)
+            used = 'copy'
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    if stats is not None:
+        nbytes = os.path.getsize(dst)
+        stats['files'] += 1
+        stats['bytes'] += nbytes
+        stats[used] += nbytes
+        if used != 'copy':
+            stats['bytes_avoided'] += nbytes
+
+    return used
+
+
+def format_staging_stats(stats):
+    mb = 1024 * 1024
+    return (f'{stats["files"]} files ({stats["bytes"] / mb:.1f} MB): {stats["link"] / mb:.1f} MB hardlinked, '
+            f'{stats["reflink"] / mb:.1f} MB reflinked, {stats["copy"] / mb:.1f} MB copied, '
+            f'{stats["bytes_avoided"] / mb:.1f} MB of copying avoided')
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify event masks (linux/inotify.h): a file finished writing or was moved/renamed into the directory
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    libname = ctypes.util.find_library('c')
+    if not libname:
+        return None
+    try:
+        libc = ctypes.CDLL(libname, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+
+    return libc
+
+
+def inotify_available():
+    return _libc() is not None
+
+
+def _watch_inotify(libc, dirpaths, timeout):
+    fd = libc.inotify_init1(IN_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    try:
+        watches = dict()
+        for dirpath in dirpaths:
+            wd = libc.inotify_add_watch(fd, os.fsencode(dirpath), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {dirpath}')
+            watches[wd] = dirpath
+
+        while True:
+            readable, __, __ = select.select([fd], [], [], timeout)
+            events = []
+            if readable:
+                buffer = os.read(fd, 65536)
+                offset = 0
+                while offset < len(buffer):
+                    wd, mask, cookie, namelength = _EVENT_HEADER.unpack_from(buffer, offset)
+                    offset += _EVENT_HEADER.size
+                    name = buffer[offset:offset + namelength].rstrip(b'\0')
+                    offset += namelength
+                    if wd in watches and name:
+                        events.append((watches[wd], os.fsdecode(name)))
+            yield events
+    finally:
+        os.close(fd)
+
+
+def _snapshot(dirpath):
+    snapshot = dict()
+    with os.scandir(dirpath) as entries:
+        for entry in entries:
+            if entry.is_file():
+                st = entry.stat()
+                snapshot[entry.name] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+
+def _watch_polling(dirpaths, timeout):
+    # a file is reported once it is new or changed and its size/mtime were stable between two scans
+    previous = {dirpath: _snapshot(dirpath) for dirpath in dirpaths}
+    reported = {dirpath: dict(previous[dirpath]) for dirpath in dirpaths}
+    while True:
+        time.sleep(timeout)
+        events = []
+        for dirpath in dirpaths:
+            current = _snapshot(dirpath)
+            for name, signature in current.items():
+                if previous[dirpath].get(name) == signature and reported[dirpath].get(name) != signature:
+                    events.append((dirpath, name))
+                    reported[dirpath][name] = signature
+            reported[dirpath] = {name: sig for name, sig in reported[dirpath].items() if name in current}
+            previous[dirpath] = current
+        yield events
+
+
+def watch_directories(dirpaths, timeout=10, polling=False):
+    """
+    Watch directories for new files. Uses inotify on Linux (files are reported when they are closed after
+    writing or moved into the directory), otherwise (or if polling=True) the directories are scanned every
+    timeout seconds and files are reported once their size and mtime are stable between two scans.
+    Files that exist when the watch starts are not reported.
+    :param dirpaths: list of directories to watch
+    :param timeout: maximum number of seconds to wait before yielding (inotify) or polling interval
+    :param polling: use the polling watcher even if inotify is available
+    :return: generator that yields a list of (directory, file name) events, possibly empty, at least every
+    timeout seconds so the caller can run periodic checks
+    """
+    libc = None if polling else _libc()
+    if libc is not None:
+        return _watch_inotify(libc, dirpaths, timeout)
+
+    return _watch_polling(dirpaths, timeout)
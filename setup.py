@@ -4,6 +4,12 @@ setup(
     name='ruglider_processing',
     version='0.0.1',
     packages=find_packages(),
+    # the processing scripts are installed as modules so the ruglider command can run them
+    py_modules=['generate_deploymentyaml', 'convert_binary_to_raw_nc', 'merge_raw_nc_to_timeseries', 'watch_rt_queue',
+                'query_profile_catalog'],
+    entry_points={
+        'console_scripts': ['ruglider=ruglider_processing.cli:main']
+    },
     url='https://github.com/lgarzio/ruglider_processing',
     author='Lori Garzio',
     author_email='lgarzio@marine.rutgers.edu',
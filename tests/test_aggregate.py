@@ -0,0 +1,38 @@
+import os
+import numpy as np
+import pytest
+
+xr = pytest.importorskip('xarray')
+aggregate = pytest.importorskip('ruglider_processing.aggregate')
+ncwrite = pytest.importorskip('ruglider_processing.ncwrite')
+
+
+def make_segment(outdir, seg, hour, rows=100):
+    # synthetic merged segment file (one hour long) with the per-row source_file char array the merge step writes
+    t = (1.7e9 + hour * 3600 + np.arange(rows) * 3600 / rows).astype('datetime64[ms]')
+    ds = xr.Dataset({'temperature': ('time', np.random.default_rng(hour).normal(size=rows))}, coords={'time': t})
+    ds['source_file'] = ncwrite.constant_dataarray(f'{seg}.sbd', ds['time'])
+    filepath = os.path.join(outdir, f'{seg}_stbd.nc')
+    ds.to_netcdf(filepath, encoding=ncwrite.build_dataset_encoding(ds))
+
+    return dict(output=filepath, merged='2025-01-01T00:00:00Z')
+
+
+def test_segment_table_keeps_source_file(tmp_path):
+    segments = [f'ru44-2025-098-{i}-0' for i in range(3)]
+    manifest = dict(segments={seg: make_segment(tmp_path, seg, i + 1) for i, seg in enumerate(segments)})
+    store = str(tmp_path / 'ru44-20250325T0438-rt-timeseries.nc')
+    aggregate.update_store(store, manifest, 'ru44-20250325T0438')
+
+    # re-merge the middle segment in place, then add a segment out of time order so the store is rebuilt from
+    # the old store's rows and segment table
+    manifest['segments'][segments[1]]['merged'] = '2025-01-02T00:00:00Z'
+    aggregate.update_store(store, manifest, 'ru44-20250325T0438')
+    manifest['segments']['ru44-2025-097-0-0'] = make_segment(tmp_path, 'ru44-2025-097-0-0', 0)
+    aggregate.update_store(store, manifest, 'ru44-20250325T0438')
+
+    table = aggregate.read_segment_table(store)
+    assert [e['source_file'] for e in table] == [f'{seg}.sbd' for seg in ['ru44-2025-097-0-0'] + segments]
+    with xr.open_dataset(store) as ds:
+        assert 'source_file' not in ds
+        assert list(ds['segment_source_file'].values.astype(str)) == [e['source_file'] for e in table]
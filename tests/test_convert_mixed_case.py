@@ -0,0 +1,45 @@
+import os
+import logging
+import pytest
+from ruglider_processing.dirindex import index_directory, files_with_suffix, count_suffix, suffix_case
+
+convert = pytest.importorskip('convert_binary_to_raw_nc')
+
+
+def touch(dirpath, names):
+    for name in names:
+        with open(os.path.join(dirpath, name), 'w') as f:
+            f.write('x')
+
+
+def test_files_with_suffix_case_sensitive(tmp_path):
+    touch(tmp_path, ['ru44-2025-098-0-0.sbd', 'ru44-2025-098-0-1.SBD', 'ru44-2025-098-0-0.tbd'])
+    index = index_directory(tmp_path)
+
+    assert files_with_suffix(index, 'sbd') == ['ru44-2025-098-0-0.sbd', 'ru44-2025-098-0-1.SBD']
+    assert files_with_suffix(index, 'sbd', case_sensitive=True) == ['ru44-2025-098-0-0.sbd']
+    assert files_with_suffix(index, 'SBD', case_sensitive=True) == ['ru44-2025-098-0-1.SBD']
+    assert count_suffix(index, 'sbd', case_sensitive=True) == 1
+
+
+def test_finish_deployment_keeps_other_case_binaries(tmp_path):
+    # pyglider converted the lowercase files, the uppercase segment must stay in the queue for the next run
+    binarydir, outdir, rawncdir = (tmp_path / d for d in ['binary', 'queue', 'rawnc'])
+    for d in [binarydir, outdir, rawncdir]:
+        d.mkdir()
+    touch(binarydir, ['ru44-2025-098-0-0.sbd', 'ru44-2025-098-0-0.tbd', 'ru44-2025-098-0-1.SBD',
+                      'ru44-2025-098-0-1.TBD'])
+    touch(outdir, ['ru44-2025-098-0-0.sbd.nc', 'ru44-2025-098-0-0.tbd.nc'])
+
+    binary_index = index_directory(binarydir)
+    scisuffix = suffix_case(binary_index, 'tbd')
+    glidersuffix = suffix_case(binary_index, 'sbd')
+    job = dict(deployment='ru44-20250325T0438', logging=logging.getLogger('test'), binarydir=str(binarydir),
+               binary_index=binary_index, outdir=str(outdir), rawncdir=str(rawncdir),
+               deployment_location=str(tmp_path), scisuffix=scisuffix, glidersuffix=glidersuffix,
+               scicount=count_suffix(binary_index, scisuffix, case_sensitive=True),
+               flightcount=count_suffix(binary_index, glidersuffix, case_sensitive=True),
+               journal=str(tmp_path / 'journal.jsonl'))
+    convert.finish_deployment(job, 'delayed')
+
+    assert sorted(os.listdir(binarydir)) == ['ru44-2025-098-0-1.SBD', 'ru44-2025-098-0-1.TBD']
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from ruglider_processing.metrics import new_metrics, finish_metrics
+
+xr = pytest.importorskip('xarray')
+ncwrite = pytest.importorskip('ruglider_processing.ncwrite')
+
+
+def synthetic_segment(nrows):
+    t = (1.7e9 + np.arange(nrows)).astype('datetime64[s]')
+    ds = xr.Dataset({'temperature': ('time', np.random.default_rng(0).normal(size=nrows))}, coords={'time': t})
+    ds['source_file'] = ncwrite.constant_dataarray('ru44-2025-098-0-0.sbd', ds['time'])
+    return ds
+
+
+def test_chunked_write_matches_single_write(tmp_path):
+    ds = synthetic_segment(10000)
+    encoding = ncwrite.build_dataset_encoding(ds, chunk_size=1000)
+    ds.to_netcdf(tmp_path / 'single.nc', encoding=ncwrite.build_dataset_encoding(ds))
+    ncwrite.write_netcdf_chunked(ds, str(tmp_path / 'chunked.nc'), encoding, 1000)
+
+    with xr.open_dataset(tmp_path / 'single.nc') as single, xr.open_dataset(tmp_path / 'chunked.nc') as chunked:
+        xr.testing.assert_identical(single, chunked)
+
+
+def test_chunked_write_does_not_bound_the_dataset(tmp_path):
+    # chunked mode only bounds the encoded copy made for the write: the dataset (as pyglider returns it) is held in
+    # memory, so the peak of a segment still includes all of its rows
+    metrics = new_metrics('merge', 'ru44-2025-098-0-0')
+    ds = synthetic_segment(4_000_000)
+    ncwrite.write_netcdf_chunked(ds, str(tmp_path / 'chunked.nc'), ncwrite.build_dataset_encoding(ds, chunk_size=1000),
+                                 100000)
+    record = finish_metrics(metrics)
+    if 'peak_rss_mb' not in record:
+        pytest.skip('the peak memory of a unit of work can only be measured on Linux')
+
+    assert record['peak_rss_mb'] >= (ds['temperature'].nbytes + ds['time'].nbytes) / 1024 / 1024
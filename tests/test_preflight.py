@@ -0,0 +1,10 @@
+from ruglider_processing.preflight import PREFLIGHT_DEFAULTS, check_segment
+
+
+def test_disabled_checks_pass_before_inspecting_files():
+    # with every check disabled a segment is never rejected, even without raw files of this mode
+    assert check_segment([], dict(PREFLIGHT_DEFAULTS)) is None
+
+
+def test_enabled_checks_reject_missing_raw_files():
+    assert check_segment([], dict(PREFLIGHT_DEFAULTS, min_rows=10)) == 'no raw files'
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+"""
+Watch the real-time binary queue (../data/in/binary/queue) of one or more glider deployments and
+convert and merge each segment as soon as both halves (*.sbd and *.tbd) have arrived, or once a
+single file has waited longer than the single-file timeout. Runs until interrupted, keeping the
+imports and parsed deployment configuration loaded between segments.
+"""
+
+import os
+import argparse
+import sys
+import time
+import convert_binary_to_raw_nc as convert
+import merge_raw_nc_to_timeseries as merge
+import ruglider_processing.paths as paths
+from ruglider_processing.cli import add_watch_arguments
+from ruglider_processing.config import load_deployment_config
+from ruglider_processing.dirindex import index_directory, split_filename, files_with_suffix
+from ruglider_processing.loggers import logfile_basename, setup_logger, configure_logging
+from ruglider_processing.locks import lock_path, held_lock, lock_owner
+from ruglider_processing.watch import watch_directories, inotify_available
+
+# seconds before a failed segment is tried again, doubled after every failure up to the maximum
+RETRY_BACKOFF = 60
+RETRY_BACKOFF_MAX = 3600
+
+
+def queued_segment_files(index, seg, suffixes):
+    # binary files of one segment currently in the queue, from an index of the queue directory
+    return files_with_suffix({seg: index.get(seg, dict())}, suffixes)
+
+
+def queued_raw_files(merge_job, seg):
+    # raw netcdf files of one segment still in the raw netcdf queue (a segment that failed to merge is left there)
+    return [f for f in (f'{seg}.{merge_job["scisuffix"]}.nc', f'{seg}.{merge_job["glidersuffix"]}.nc')
+            if os.path.isfile(os.path.join(merge_job['queuedir'], f))]
+
+
+def new_pending(now):
+    # state of a segment waiting to be processed
+    return dict(first_seen=now, converted=False, deferred=False, attempts=0, retry_at=now)
+
+
+def process_segment(deployment, seg, files, cacdir, args, loglevel, state):
+    """
+    Convert one segment from the binary queue and merge it
+    :param deployment: dictionary with the convert and merge jobs for the deployment
+    :param seg: segment name
+    :param files: binary file names of the segment
+    :param state: pending segment state (see new_pending), a segment that was already converted is only merged.
+    state['deferred'] is set if the pre-flight check deferred the segment.
+    :return: True if the segment was converted and merged successfully or deferred, False if it failed
+    """
+    logging = deployment['merge']['logging']
+    if not state['converted']:
+        logging.info(f'Segment {seg}: processing {", ".join(files)}')
+        if not convert.convert_segment(deployment['convert'], seg, files, cacdir, 'rt', args.metrics_textfile_dir,
+                                       args.staging):
+            return False
+        state['converted'] = True
+    else:
+        logging.info(f'Segment {seg}: merging again')
+
+    # pick up any changes to deployment.yml (the parsed config is cached until the file changes)
+    merge_job = deployment['merge']
+    merge_job['deployment_meta'] = load_deployment_config(merge_job['deploymentyaml'])
+
+    outputcount = merge.merge_queued_segments(merge_job, [seg], chunk_size=args.chunk_size, loglevel=loglevel,
+                                              metrics_textfile_dir=args.metrics_textfile_dir, aggregate=args.aggregate)
+    logging.info(f'Segment {seg}: created {outputcount} merged *.nc files')
+
+    # a deferred segment isn't ready yet rather than failed, its raw files stay in the queue
+    state['deferred'] = seg in merge_job['deferred']
+
+    return state['deferred'] or len(queued_raw_files(merge_job, seg)) == 0
+
+
+def main(args):
+    loglevel = args.loglevel.upper()
+    test = args.test
+    mode = 'rt'
+
+    logFile_base = logfile_basename()
+    logging_base = setup_logger('logging_base', loglevel, logFile_base)
+
+    data_home, deployments_root = paths.find_glider_deployments_rootdir(logging_base, test)
+    if not isinstance(deployments_root, str):
+        return 1
+
+    # Find the cache file directory
+    cacdir = os.path.join(data_home, 'cac')
+    if not os.path.isdir(cacdir):
+        logging_base.error(f'cache file directory not found: {cacdir}')
+        return 1
+
+    # set up the convert and merge jobs once, they're reused for every segment
+    deployments = dict()
+    for deployment in args.deployments:
+        convert_job = convert.prepare_deployment(logging_base, deployment, deployments_root, mode, loglevel)
+        merge_job = merge.prepare_merge(logging_base, deployment, deployments_root, mode, loglevel, args.encoding_profile,
+                                        merge.preflight_overrides(args))
+        if convert_job is None or merge_job is None:
+            continue
+        suffixes = [convert_job['scisuffix'].lower(), convert_job['glidersuffix'].lower()]
+        deployments[convert_job['binarydir']] = dict(convert=convert_job, merge=merge_job, suffixes=suffixes,
+                                                     pending=dict(),
+                                                     lockfile=lock_path(merge_job['deployment_location'], mode))
+
+    if len(deployments) == 0:
+        logging_base.error('No deployments to watch')
+        return 1
+
+    watcher = 'polling' if args.polling or not inotify_available() else 'inotify'
+    logging_base.info(f'Watching {len(deployments)} rt binary queue directories ({watcher})')
+
+    # segments that are already waiting in the queues
+    now = time.monotonic()
+    for binarydir, deployment in deployments.items():
+        for f in files_with_suffix(index_directory(binarydir), deployment['suffixes']):
+            deployment['pending'].setdefault(split_filename(f)[0], new_pending(now))
+
+    try:
+        for events in watch_directories(list(deployments.keys()), timeout=args.poll, polling=args.polling):
+            now = time.monotonic()
+            for dirpath, filename in events:
+                seg, suffix = split_filename(filename)
+                if suffix in deployments[dirpath]['suffixes']:
+                    state = deployments[dirpath]['pending'].setdefault(seg, new_pending(now))
+                    if state['deferred']:
+                        # new data for a deferred segment, convert and check it again right away
+                        state.update(converted=False, deferred=False, retry_at=now)
+
+            # process segments with both halves in the queue, or a single file that has waited too long. A segment
+            # that fails stays pending and is tried again after a backoff (a converted segment is only merged again).
+            # A segment deferred by the pre-flight check stays pending until more of it arrives, and is checked
+            # again every RETRY_BACKOFF seconds in the meantime.
+            for binarydir, deployment in deployments.items():
+                if len(deployment['pending']) == 0:
+                    continue
+                index = index_directory(binarydir)
+                for seg, state in sorted(deployment['pending'].items()):
+                    files = queued_segment_files(index, seg, deployment['suffixes'])
+                    if len(files) == 0 and not state['converted']:
+                        del deployment['pending'][seg]
+                        continue
+                    ready = (state['converted'] or len(files) == len(deployment['suffixes'])
+                             or now - state['first_seen'] >= args.single_timeout)
+                    if not ready or now < state['retry_at']:
+                        continue
+                    # another process (e.g. a manual rt reprocess) holds the deployment lock, the segment stays
+                    # pending until the next check
+                    with held_lock(deployment['lockfile']) as acquired:
+                        if not acquired:
+                            deployment['merge']['logging'].debug(f'Segment {seg}: deployment is locked by pid '
+                                                                 f'{lock_owner(deployment["lockfile"])}, waiting')
+                            continue
+                        try:
+                            success = process_segment(deployment, seg, files, cacdir, args, loglevel, state)
+                        except Exception as e:
+                            deployment['merge']['logging'].error(f'Segment {seg}: processing failed: {e}',
+                                                                 exc_info=True)
+                            success = False
+                        if success and state['deferred']:
+                            state['retry_at'] = time.monotonic() + RETRY_BACKOFF
+                            continue
+                        if success:
+                            del deployment['pending'][seg]
+                            continue
+                        delay = min(RETRY_BACKOFF * 2 ** state['attempts'], RETRY_BACKOFF_MAX)
+                        state['attempts'] += 1
+                        state['retry_at'] = time.monotonic() + delay
+                        deployment['merge']['logging'].warning(f'Segment {seg}: attempt {state["attempts"]} failed, '
+                                                               f'trying again in {delay} s')
+    except KeyboardInterrupt:
+        logging_base.info('Stopped watching rt binary queue directories')
+
+    return 0
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    add_watch_arguments(arg_parser)
+
+    parsed_args = arg_parser.parse_args()
+    configure_logging(parsed_args.log_root, parsed_args.log_format)
+
+    sys.exit(main(parsed_args))